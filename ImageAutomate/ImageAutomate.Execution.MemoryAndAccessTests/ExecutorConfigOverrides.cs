@@ -0,0 +1,53 @@
+using System.Globalization;
+using System.Reflection;
+
+namespace ImageAutomate.Execution.MemoryAndAccessTests;
+
+/// <summary>
+/// Applies executor settings from environment variables so RunMemoryTests.py can sweep them
+/// without recompiling. Each public settable property of <see cref="ExecutorConfiguration"/>
+/// can be set with <c>IA_EXECUTOR_&lt;PropertyName&gt;</c>, e.g. <c>IA_EXECUTOR_MaxDegreeOfParallelism=4</c>.
+/// </summary>
+public static class ExecutorConfigOverrides
+{
+    public const string Prefix = "IA_EXECUTOR_";
+
+    /// <summary>
+    /// Overwrites properties of <paramref name="config"/> that have an environment override.
+    /// </summary>
+    /// <exception cref="InvalidOperationException">An override value cannot be parsed.</exception>
+    public static ExecutorConfiguration Apply(ExecutorConfiguration config)
+    {
+        foreach (var property in typeof(ExecutorConfiguration).GetProperties(BindingFlags.Public | BindingFlags.Instance))
+        {
+            if (!property.CanWrite)
+                continue;
+
+            var value = Environment.GetEnvironmentVariable(Prefix + property.Name);
+            if (string.IsNullOrEmpty(value))
+                continue;
+
+            try
+            {
+                property.SetValue(config, Parse(property.PropertyType, value));
+            }
+            catch (FormatException ex)
+            {
+                throw new InvalidOperationException($"Invalid value '{value}' for {Prefix}{property.Name}.", ex);
+            }
+        }
+        return config;
+    }
+
+    private static object Parse(Type type, string value)
+    {
+        if (type == typeof(TimeSpan))
+        {
+            // Plain numbers are seconds; anything else uses TimeSpan's own format (00:00:30)
+            return double.TryParse(value, NumberStyles.Float, CultureInfo.InvariantCulture, out var seconds)
+                ? TimeSpan.FromSeconds(seconds)
+                : TimeSpan.Parse(value, CultureInfo.InvariantCulture);
+        }
+        return Convert.ChangeType(value, type, CultureInfo.InvariantCulture);
+    }
+}
@@ -23,12 +23,19 @@ public abstract class PerformanceTestBase
     protected abstract int ExpectedTotalItems { get; }
     protected abstract int BatchSize { get; }
 
+    /// <summary>
+    /// Executor settings for a test: the variant's batch size, then any IA_EXECUTOR_* overrides.
+    /// </summary>
+    protected ExecutorConfiguration CreateConfiguration()
+        => ExecutorConfigOverrides.Apply(new ExecutorConfiguration { MaxShipmentSize = BatchSize });
+
     [Fact]
     public async Task Topology_Chain()
     {
         // Source -> Passthrough -> Sink
+        var config = CreateConfiguration();
         var source = CreateSource("Source");
-        source.MaxShipmentSize = BatchSize;
+        source.MaxShipmentSize = config.MaxShipmentSize;
         var pass = new PassthroughBlock("Pass");
         var sink = new MockSink("Sink");
 
@@ -39,7 +46,6 @@ public abstract class PerformanceTestBase
         _graph.AddEdge(source, source.Outputs[0], pass, pass.Inputs[0]);
         _graph.AddEdge(pass, pass.Outputs[0], sink, sink.Inputs[0]);
 
-        var config = new ExecutorConfiguration { MaxShipmentSize = BatchSize };
         await _executor.ExecuteAsync(_graph, config, CancellationToken.None);
 
         Assert.Equal(ExpectedTotalItems, sink.ReceivedItems.Count);
@@ -50,8 +56,9 @@ public abstract class PerformanceTestBase
     public async Task Topology_FanOut()
     {
         // Source -> Splitter(2) -> [PassA, PassB] -> Merger(2) -> Sink
+        var config = CreateConfiguration();
         var source = CreateSource("Source");
-        source.MaxShipmentSize = BatchSize;
+        source.MaxShipmentSize = config.MaxShipmentSize;
         var split = new MultiOutputBlock("Split", 2);
         var passA = new PassthroughBlock("A");
         var passB = new PassthroughBlock("B");
@@ -75,7 +82,6 @@ public abstract class PerformanceTestBase
 
         _graph.AddEdge(merge, merge.Outputs[0], sink, sink.Inputs[0]);
 
-        var config = new ExecutorConfiguration { MaxShipmentSize = BatchSize };
         await _executor.ExecuteAsync(_graph, config, CancellationToken.None);
 
         // Expected: Source produces N. Split broadcasts N to A and N to B.
@@ -92,15 +98,15 @@ public abstract class PerformanceTestBase
         // But here we adhere to the configured BatchSize.
         // This test logic is same as Chain but explicitly named to indicate intent.
 
+        var config = CreateConfiguration();
         var source = CreateSource("Source");
-        source.MaxShipmentSize = BatchSize;
+        source.MaxShipmentSize = config.MaxShipmentSize;
         var sink = new MockSink("Sink");
 
         _graph.AddBlock(source);
         _graph.AddBlock(sink);
         _graph.AddEdge(source, source.Outputs[0], sink, sink.Inputs[0]);
 
-        var config = new ExecutorConfiguration { MaxShipmentSize = BatchSize };
         await _executor.ExecuteAsync(_graph, config, CancellationToken.None);
 
         Assert.Equal(ExpectedTotalItems, sink.ReceivedItems.Count);
@@ -112,8 +118,9 @@ public abstract class PerformanceTestBase
     {
         // Explicitly test that we can access pixels of output items.
         // This targets the potential bug where input disposal affects output if not cloned properly.
+        var config = CreateConfiguration();
         var source = CreateSource("Source");
-        source.MaxShipmentSize = BatchSize;
+        source.MaxShipmentSize = config.MaxShipmentSize;
         var pass = new PassthroughBlock("Pass"); // Passthrough might return input instance if implemented lazily?
         // Our mock Passthrough DOES clone. But let's assume a block might not, or we want to test Engine behavior.
         // In the Engine, if a block returns an item, it goes to Warehouse.
@@ -129,7 +136,6 @@ public abstract class PerformanceTestBase
         _graph.AddEdge(source, source.Outputs[0], pass, pass.Inputs[0]);
         _graph.AddEdge(pass, pass.Outputs[0], sink, sink.Inputs[0]);
 
-        var config = new ExecutorConfiguration { MaxShipmentSize = BatchSize };
         await _executor.ExecuteAsync(_graph, config, CancellationToken.None);
 
         Assert.NotEmpty(sink.ReceivedItems);
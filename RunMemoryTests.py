@@ -1,176 +1,417 @@
-import subprocess
-import xml.etree.ElementTree as ET
 import os
 import sys
 import argparse
-import signal
-import time
-import threading
-import psutil
+import asyncio
+import shutil
 import csv
-import glob
+import tempfile
+import time
+import itertools
+
+from testtools import (cgroup, discovery, gcprofiles, history, host, leak, livefeed, orchestrator, procmem, regression,
+                       scaling, selection, sharding, sweep, threadprof, timeseries, trx, variants)
 
 # Configuration
-TRX_FILE = os.path.abspath("memory_test_temp.trx")
 CSV_FILE = os.path.abspath("memory_stats.csv")
-
-# Global state for monitoring
-monitor_active = False
-current_pid = None
-memory_samples = []
-
-def signal_handler(sig, frame):
-    print("\n\nStopping...")
-    cleanup()
-    sys.exit(0)
-
-def cleanup():
-    if os.path.exists(TRX_FILE):
-        try:
-            os.remove(TRX_FILE)
-        except OSError:
-            pass
-
-def monitor_memory(pid, interval=0.1):
-    global monitor_active, memory_samples
-    try:
-        process = psutil.Process(pid)
-        while monitor_active:
-            try:
-                # Get RSS memory in MB
-                mem = process.memory_info().rss / (1024 * 1024)
-                memory_samples.append(mem)
-
-                # Also check children? Dotnet test might spawn child processes (testhost)
-                # For simplicity, we monitor the main process tree peak?
-                # Usually testhost is a child.
-                children = process.children(recursive=True)
-                for child in children:
-                    try:
-                        mem += child.memory_info().rss / (1024 * 1024)
-                    except (psutil.NoSuchProcess, psutil.AccessDenied):
-                        pass
-
-                # Correct sample to include children sum
-                memory_samples[-1] = mem
-
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                break
-            time.sleep(interval)
-    except psutil.NoSuchProcess:
-        pass
-
-def get_all_tests(project_path):
+SWEEP_CSV_FILE = os.path.abspath("sweep_pareto.csv")
+SCALING_CSV_FILE = os.path.abspath("scaling.csv")
+GC_CSV_FILE = os.path.abspath("gc_profiles.csv")
+PROJECT_PATH = "ImageAutomate/ImageAutomate.Execution.MemoryAndAccessTests/ImageAutomate.Execution.MemoryAndAccessTests.csproj"
+
+class MemorySession:
+    """Per-invocation state: arguments, optional cgroup manager, scratch directory and
+    the configuration point (extra environment) the current launches run under."""
+
+    def __init__(self, args, cgroup_manager=None):
+        self.args = args
+        self.cgroup_manager = cgroup_manager
+        self.trx_dir = tempfile.mkdtemp(prefix="memtests_")
+        # Launches of this session, for attributing CPU time only to launches that ran alone
+        self.launcher = orchestrator.Launcher()
+        self.launches = 0
+        self.env = {}
+        self.config_label = "default"
+        self.gc_label = "default"
+        self.cpus = None
+        self.variants = variants.load_variants(os.path.join(os.path.dirname(args.project), "TestVariants.cs"))
+        self.history = None
+        if args.history_db:
+            self.history = history.HistoryWriter(args.history_db, "RunMemoryTests", " ".join(sys.argv[1:]),
+                                                 os.path.dirname(os.path.abspath(args.project)))
+        self.feed = None
+        if args.events or args.metrics_port is not None:
+            self.feed = livefeed.LiveFeed("RunMemoryTests", args.events, args.metrics_port)
+
+    def next_trx_path(self):
+        self.launches += 1
+        return os.path.join(self.trx_dir, f"run_{self.launches}.trx")
+
+def cleanup(session):
+    if session.history:
+        session.history.close()
+    if session.feed:
+        session.feed.close()
+    if os.path.isdir(session.trx_dir):
+        shutil.rmtree(session.trx_dir, ignore_errors=True)
+
+def get_all_tests(project_path, configuration, refresh=False):
     print("Discovering tests...")
-    cmd = ["dotnet", "test", project_path, "--list-tests"]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-
-    tests = []
-    capture = False
-    for line in result.stdout.splitlines():
-        if "The following Tests are available:" in line:
-            capture = True
-            continue
-        if capture and line.strip():
-            tests.append(line.strip())
+    try:
+        tests = discovery.discover_tests(project_path, configuration, refresh)
+    except host.BuildError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
     print(f"Found {len(tests)} tests.")
     return tests
 
-def run_test_and_monitor(project_path, test_name):
-    global monitor_active, memory_samples
+def build_command(args, tests, trx_path):
+    if args.warm_host:
+        # Serial collections so each sample belongs to exactly one running test
+        return host.assembly_test_command(args.assembly, trx_path, host.batch_filter(tests), serial=True)
 
-    cmd = [
-        "dotnet", "test", project_path,
-        "--filter", f"FullyQualifiedName={test_name}",
-        "--logger", f"trx;LogFileName={TRX_FILE}"
+    return [
+        "dotnet", "test", args.project,
+        "--configuration", args.configuration,
+        "--filter", f"FullyQualifiedName={tests[0]}",
+        "--logger", f"trx;LogFileName={trx_path}"
     ]
 
-    memory_samples = []
-    monitor_active = True
-
-    # Start process
-    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
-
-    # Start monitor thread
-    monitor_thread = threading.Thread(target=monitor_memory, args=(proc.pid,))
-    monitor_thread.start()
-
-    # Wait for completion
-    proc.wait()
-
-    # Stop monitor
-    monitor_active = False
-    monitor_thread.join()
-
-    # Parse result
-    passed = False
-    error_msg = ""
-    if os.path.exists(TRX_FILE):
-        passed, error_msg = parse_trx_result(TRX_FILE)
-        os.remove(TRX_FILE)
-
-    # Calculate stats
-    if memory_samples:
-        min_mem = min(memory_samples)
-        max_mem = max(memory_samples)
-        avg_mem = sum(memory_samples) / len(memory_samples)
+def memory_row(test_name, passed, error_msg, samples, roles, tree_max, cg_stats, duration):
+    if samples:
+        min_mem = min(samples)
+        max_mem = max(samples)
+        avg_mem = sum(samples) / len(samples)
     else:
         min_mem = max_mem = avg_mem = 0
 
+    # Retained memory between shipment cycles should stay flat
+    growth = leak.assess([leak.post_cycle_baselines(samples)])
+
     return {
         "Test": test_name,
         "Result": "Pass" if passed else "Fail",
         "MinMB": min_mem,
         "MaxMB": max_mem,
         "AvgMB": avg_mem,
-        "Samples": len(memory_samples),
+        "DurationS": duration,
+        "Samples": len(samples),
+        "CliMaxMB": roles.get(procmem.ROLE_CLI, 0.0),
+        "BuildMaxMB": roles.get(procmem.ROLE_BUILD, 0.0),
+        "TreeMaxMB": tree_max,
+        "CgroupPeakMB": cg_stats.get('peak', ''),
+        "OomKills": cg_stats.get('oom_kill', ''),
+        "MaxEvents": cg_stats.get('max', ''),
+        "LeakVerdict": growth.verdict,
+        "LeakBytesPerCycle": round(growth.bytes_per_step),
+        "LeakP": round(growth.p_value, 4),
         "Error": error_msg
     }
 
-def parse_trx_result(trx_path):
+async def run_test_and_monitor(session, tests):
+    """Runs one host launch covering `tests` and returns one stats row per test."""
+    args = session.args
+    trx_path = session.next_trx_path()
+
+    state = orchestrator.RunState(build_command(args, tests, trx_path), label=tests[0], cpus=session.cpus)
+    if session.env:
+        state.env = dict(os.environ, **session.env)
+    test_cgroup = None
+    if session.cgroup_manager:
+        test_cgroup = session.cgroup_manager.new_test_cgroup(args.memory_max)
+        state.preexec_fn = test_cgroup.enter
+        state.env = cgroup.env_for_cgroup(state.env)
+
+    trace = None
+    if args.trace_dir:
+        trace = timeseries.TraceWriter(
+            timeseries.trace_path(args.trace_dir, tests[0], session.launches),
+            meta={'tests': tests, 'interval_ms': args.sample_interval_ms})
+        state.sample_sink = trace.append_sample
+    launch = session.feed.launch(tests[0]) if session.feed else None
+    if launch:
+        state.sample_sink = livefeed.chain(state.sample_sink, launch.sample)
+
+    profiler = None
+    if args.profile_threads:
+        profiler = threadprof.ThreadProfiler(args.thread_interval_ms / 1000)
+        state.thread_profiler = profiler
+
+    # Kernel-tracked peak and limit events cover the whole launch (all tests of a warm-host batch)
+    cg_stats = {}
+    try:
+        await session.launcher.run(state, args.sample_interval_ms / 1000)
+        if test_cgroup:
+            peak = test_cgroup.peak_mb()
+            events = test_cgroup.events()
+            cg_stats = {
+                'peak': peak if peak is not None else '',
+                'oom_kill': events.get('oom_kill', 0),
+                'max': events.get('max', 0),
+            }
+    finally:
+        if trace:
+            trace.close()
+        if launch:
+            launch.close(os.path.exists(trx_path))
+        if test_cgroup:
+            test_cgroup.destroy()
+
+    memory_samples = state.samples
+
+    # Parse result
+    outcomes = {}
+    parse_error = ""
+    if os.path.exists(trx_path):
+        outcomes, parse_error = parse_trx_results(trx_path)
+        os.remove(trx_path)
+    elif state.stderr_tail:
+        parse_error = state.stderr_tail[-1]
+
+    # MinMB/MaxMB/AvgMB track the testhost only; CLI and build node peaks are reported separately
+    engine = procmem.engine_series(memory_samples)
+    all_samples = [mb for (_, mb) in engine]
+    roles = procmem.role_peaks(memory_samples)
+    tree_max = max((s.pss for s in memory_samples), default=0.0)
+    if len(tests) > 1:
+        windows = {name: (o['start'], o['end']) for name, o in outcomes.items()}
+        attributed = host.attribute_samples(engine, windows)
+    else:
+        attributed = {}
+
+    rows = []
+    for test_name in tests:
+        outcome = outcomes.get(test_name)
+        if outcome is None:
+            error = parse_error or "No result produced"
+            if cg_stats.get('oom_kill'):
+                error = f"OOM killed (memory.max={args.memory_max} bytes)"
+            rows.append(memory_row(test_name, False, error, all_samples, roles, tree_max, cg_stats, state.wall_time or 0.0))
+            continue
+        # TRX duration excludes host startup; fall back to the launch's wall time
+        duration = outcome['duration'] if outcome['duration'] is not None else state.wall_time or 0.0
+        rows.append(memory_row(test_name, outcome['passed'], outcome['error'], attributed.get(test_name, all_samples), roles, tree_max, cg_stats, duration))
+
+    if profiler:
+        profiler.write(timeseries.trace_path(args.thread_profile_dir, tests[0], session.launches, threadprof.SUFFIX),
+                       meta={'tests': tests})
+        timeline = profiler.timeline()
+        for row in rows:
+            outcome = outcomes.get(row['Test'])
+            # Warm-host batches: each test gets its own TRX window of the timeline
+            window = (outcome['start'], outcome['end']) if len(tests) > 1 and outcome and outcome['start'] else (None, None)
+            add_thread_summary(row, threadprof.summarize(timeline, *window))
+
+    # Launch-level: with several tests per host these cover the whole batch
+    metric = procmem.memory_metric(memory_samples)
+    for row in rows:
+        row['MemMetric'] = metric
+        row['WallS'] = round(state.wall_time, 4) if state.wall_time is not None else ''
+        row['CpuS'] = round(state.cpu_time, 4) if state.cpu_time is not None else ''
+    return rows
+
+def add_throughput(row, variant_map):
+    """Images/s and megapixels/s from the variant's ExpectedTotalItems and resolution (passing runs only)."""
+    images, megapixels = None, None
+    if row['Result'] == "Pass":
+        images, megapixels = variants.throughput(variants.variant_for_test(row['Test'], variant_map), row['DurationS'])
+    row['ImagesPerS'] = round(images, 3) if images is not None else ''
+    row['MPixPerS'] = round(megapixels, 3) if megapixels is not None else ''
+
+def add_thread_summary(row, summary):
+    if summary is None:
+        summary = {'busy_threads': 0.0, 'peak_busy': 0.0, 'idle_gaps': 0, 'idle_total': 0.0, 'longest_gap': 0.0, 'hot': []}
+    row['BusyThreads'] = round(summary['busy_threads'], 2)
+    row['PeakBusyThreads'] = round(summary['peak_busy'], 2)
+    row['IdleGaps'] = summary['idle_gaps']
+    row['IdleS'] = round(summary['idle_total'], 3)
+    row['LongestIdleS'] = round(summary['longest_gap'], 3)
+    row['HotThreads'] = threadprof.format_hot(summary['hot'])
+
+def parse_trx_results(trx_path):
+    """Returns ({testName: {'passed', 'error', 'start', 'end', 'duration'}}, parse_error)."""
+    outcomes = {}
     try:
-        tree = ET.parse(trx_path)
-        root = tree.getroot()
-        # Namespace handling is annoying in ET, ignore it by using endswith match in logic
-
-        passed = True
-        error_msg = ""
-
-        for elem in root.iter():
-            if elem.tag.endswith('UnitTestResult'):
-                outcome = elem.get('outcome')
-                if outcome != 'Passed':
-                    passed = False
-                    # Try to find error message
-                    for output in elem.iter():
-                        if output.tag.endswith('Message'):
-                            error_msg = output.text
-                            break
-        return passed, error_msg
+        for result in trx.iter_results(trx_path):
+            outcomes[result.test_name] = {
+                'passed': result.outcome == 'Passed',
+                'error': result.message,
+                'start': result.start,
+                'end': result.end,
+                'duration': result.duration,
+            }
+        return outcomes, ""
     except Exception as e:
-        return False, str(e)
+        return outcomes, str(e)
+
+async def run_batches(session, batches, total_tests, results, run_number=1):
+    orchestrator.install_interrupt_handler(asyncio.current_task())
+
+    header = f"{'Test Name':<60} | {'Result':<6} | {'Max MB':<8} | {'Avg MB':<8} | {'Dur s':<7} | {'CPU s':<7} | {'img/s':<8}"
+    if session.cgroup_manager:
+        header += f" | {'Peak MB':<8} | {'OOM':<3}"
+    print(header)
+    print("-" * max(90, len(header)))
+
+    done = 0
+    for batch in batches:
+        print(f"Running ({done+1}/{total_tests}): {batch[0][-50:]}...", end='\r')
+        for stats in await run_test_and_monitor(session, batch):
+            stats['Run'] = run_number
+            stats['Config'] = session.config_label
+            stats['GcProfile'] = session.gc_label
+            stats['Cores'] = len(session.cpus) if session.cpus else ''
+            add_throughput(stats, session.variants)
+            results.append(stats)
+            if session.history:
+                session.history.add_memory_row(stats)
+            if session.feed:
+                session.feed.test_finished(stats['Test'], stats['Result'] == "Pass", stats['DurationS'], stats['MaxMB'],
+                                           stats['Error'], run=run_number, config=session.config_label,
+                                           gc=session.gc_label, cores=stats['Cores'] or None)
+            done += 1
+
+            # Print row
+            test = stats['Test']
+            name_display = (test[:57] + '..') if len(test) > 57 else test
+            cpu = stats['CpuS']
+            row = (f"{name_display:<60} | {stats['Result']:<6} | {stats['MaxMB']:<8.2f} | {stats['AvgMB']:<8.2f}"
+                   f" | {stats['DurationS']:<7.2f} | {cpu if cpu == '' else f'{cpu:.2f}':<7} | {stats['ImagesPerS']:<8}")
+            if session.cgroup_manager:
+                peak = stats['CgroupPeakMB']
+                row += f" | {peak if peak == '' else f'{peak:.2f}':<8} | {stats['OomKills']:<3}"
+            if 'BusyThreads' in stats:
+                row += f"  [busy {stats['BusyThreads']:.1f} thr, idle {stats['IdleS']:.2f}s in {stats['IdleGaps']} gaps]"
+            if stats['LeakVerdict'] == leak.VERDICT_LEAK:
+                row += f"  [LEAK ~{stats['LeakBytesPerCycle'] / 1024:.0f} KB/cycle, p={stats['LeakP']}]"
+            print(row)
 
 def main():
-    signal.signal(signal.SIGINT, signal_handler)
-
-    project_path = "ImageAutomate/ImageAutomate.Execution.MemoryAndAccessTests/ImageAutomate.Execution.MemoryAndAccessTests.csproj"
-
-    tests = get_all_tests(project_path)
+    parser = argparse.ArgumentParser(description="Memory & Access Test Runner")
+    parser.add_argument('--project', type=str, default=PROJECT_PATH, help='Path to the test project file')
+    parser.add_argument('-c', '--configuration', type=str, default='Debug', help='Build configuration')
+    parser.add_argument('--warm-host', action='store_true', help='Build once, then run the compiled test assembly directly')
+    parser.add_argument('--sample-interval-ms', type=float, default=100, help='Memory sampling interval in milliseconds (min 5)')
+    parser.add_argument('--trace-dir', type=str, default='', help='Write each launch\'s full memory time series (.iatrace) here')
+    parser.add_argument('--profile-threads', action='store_true', help='Sample per-thread CPU of the testhost and summarize busy threads, idle gaps and hot threads (Linux)')
+    parser.add_argument('--thread-interval-ms', type=float, default=10, help='Thread sampling interval in milliseconds')
+    parser.add_argument('--repeat', type=int, default=1, help='Run the whole matrix this many times (repeated samples for noise estimation)')
+    parser.add_argument('--baseline', type=str, nargs='+', default=[], help='Baseline CSV files, directories or globs to compare against; '
+                             'noise is estimated from repeated samples, so use several files or --repeat 2 or more')
+    parser.add_argument('--regression-sigma', type=float, default=3.0, help='Standard errors a median must rise by to count as a regression')
+    parser.add_argument('--history-dir', type=str, default='', help='Also archive this run\'s CSV here with a timestamp')
+    parser.add_argument('--history-db', type=str, nargs='?', const=history.DEFAULT_DB, default='', metavar='PATH',
+                        help=f'Record every result in a SQLite history database (default {os.path.basename(history.DEFAULT_DB)}); '
+                             f'query it with python -m testtools.history')
+    parser.add_argument('--sweep', type=sweep.parse_axis, action='append', default=[],
+                        help='Executor setting to sweep, e.g. MaxDegreeOfParallelism=1,2,4 (repeatable; runs the full grid)')
+    parser.add_argument('--gc-profile', type=gcprofiles.parse_profile, action='append', dest='gc_profiles', default=[],
+                        help=f'Run under a .NET GC profile: a preset ({", ".join(gcprofiles.PRESETS)}) or '
+                             f'name:server=1,concurrent=0,heaps=4,hard-limit=8G,conserve=5 (repeatable)')
+    parser.add_argument('--scaling', type=str, nargs='?', const='', default=None, metavar='CORES',
+                        help='Rerun tests pinned to 1, 2, 4 ... N CPUs (or the given comma list) and report speedup (Linux)')
+    parser.add_argument('--refresh-discovery', action='store_true', help='Ignore the cached test list and discover again')
+    parser.add_argument('--tests-per-host', type=int, default=1, help='With --warm-host, number of tests run per testhost launch')
+    parser.add_argument('--changed-since', type=str, default='', metavar='REF',
+                        help='Only run test classes that changes since the merge base with REF can affect (full suite for core files)')
+    parser.add_argument('--shard', type=sharding.parse_shard, default=None, metavar='I/N',
+                        help='Run only shard I of N of the tests, balanced by historical durations')
+    parser.add_argument('--shard-durations', type=str, nargs='+', default=None, metavar='PATH',
+                        help='History databases or result CSVs to balance shards with (default: the history database); '
+                             'every shard must use the same files')
+    parser.add_argument('--events', type=str, default='', metavar='PATH',
+                        help='Append a JSONL event per finished test and per memory sample window to PATH (or unix:SOCKET)')
+    parser.add_argument('--metrics-port', type=int, default=None, metavar='PORT',
+                        help='Serve live progress, ETA, memory and pass/fail counters in Prometheus format on 127.0.0.1:PORT (0: any free port)')
+    parser.add_argument('--cgroup', action='store_true', help='Run each test launch in its own cgroup v2 and report memory.peak/memory.events (Linux)')
+    parser.add_argument('--memory-max', type=str, default='', help='Hard memory.max budget per test launch, e.g. 16G (implies --cgroup)')
+    args = parser.parse_args()
+
+    if args.trace_dir:
+        os.makedirs(args.trace_dir, exist_ok=True)
+    if args.profile_threads:
+        if not sys.platform.startswith("linux"):
+            print("Error: --profile-threads needs /proc (Linux).")
+            sys.exit(1)
+        args.thread_profile_dir = args.trace_dir or os.path.abspath("thread_profiles")
+        os.makedirs(args.thread_profile_dir, exist_ok=True)
+
+    cgroup_manager = None
+    args.memory_max = cgroup.parse_size(args.memory_max) if args.memory_max else None
+    if args.cgroup or args.memory_max:
+        if sys.platform.startswith("linux"):
+            cgroup_manager = cgroup.CgroupManager.create()
+        else:
+            print("Warning: --cgroup is only supported on Linux. Falling back to sampling only.")
+
+    core_counts = [None]
+    if args.scaling is not None:
+        if not hasattr(os, "sched_setaffinity"):
+            print("Error: --scaling needs CPU affinity support (Linux).")
+            sys.exit(1)
+        try:
+            core_counts = scaling.parse_core_counts(args.scaling)
+        except argparse.ArgumentTypeError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        cpu_order = scaling.cpu_order(scaling.available_cpus())
+
+    tests = get_all_tests(args.project, args.configuration, args.refresh_discovery)
+    if args.changed_since:
+        affected = selection.from_git(args.changed_since)
+        tests = selection.select(affected, tests)
+        print(f"Change selection: {affected.reason}; {'full suite' if affected.full else f'{len(tests)} affected test(s)'}")
+        if not tests:
+            print("No affected tests to run.")
+            sys.exit(0)
+    if args.shard:
+        # Every matrix point reruns the same tests, so balancing one pass balances the whole matrix
+        durations = sharding.load_durations(args.shard_durations or [args.history_db or history.DEFAULT_DB])
+        overhead = 0.0 if args.warm_host else sharding.LAUNCH_OVERHEAD_S
+        tests, estimate = sharding.select(tests, args.shard, durations, overhead)
+
+    batches = [[test] for test in tests]
+    if args.warm_host:
+        try:
+            print("Building test project...")
+            args.assembly = host.prepare_assembly(args.project, args.configuration)
+        except host.BuildError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        batches = host.chunked(tests, args.tests_per_host)
 
+    try:
+        session = MemorySession(args, cgroup_manager)
+    except OSError as e:
+        print(f"Error: cannot start the live feed: {e}")
+        sys.exit(1)
+    points = sweep.grid(args.sweep)
     results = []
-
-    print(f"{'Test Name':<60} | {'Result':<6} | {'Max MB':<8} | {'Avg MB':<8}")
-    print("-" * 90)
-
-    for i, test in enumerate(tests):
-        print(f"Running ({i+1}/{len(tests)}): {test[-50:]}...", end='\r')
-        stats = run_test_and_monitor(project_path, test)
-        results.append(stats)
-
-        # Print row
-        name_display = (test[:57] + '..') if len(test) > 57 else test
-        print(f"{name_display:<60} | {stats['Result']:<6} | {stats['MaxMB']:<8.2f} | {stats['AvgMB']:<8.2f}")
+    # Full matrix: executor configuration x GC profile x core count
+    matrix = list(itertools.product(points, args.gc_profiles or [None], core_counts))
+    if session.feed:
+        session.feed.start(planned=len(batches) * len(matrix) * max(1, args.repeat), tests=len(tests),
+                           matrix_points=len(matrix), repeat=max(1, args.repeat))
+        if session.feed.url:
+            print(f"Live metrics: {session.feed.url}")
+    try:
+        for index, (point, gc_profile, cores) in enumerate(matrix, 1):
+            session.env = dict(sweep.point_env(point), **(gc_profile.env if gc_profile else {}))
+            session.config_label = sweep.point_label(point)
+            session.gc_label = gc_profile.name if gc_profile else "default"
+            session.cpus = scaling.cpus_for(cores, cpu_order) if cores else None
+            if len(matrix) > 1:
+                parts = [session.config_label, f"GC={session.gc_label}"] + ([f"{cores} CPU(s)"] if cores else [])
+                print(f"\n=== Matrix point {index}/{len(matrix)}: {', '.join(parts)} ===")
+            for run_number in range(1, max(1, args.repeat) + 1):
+                if args.repeat > 1:
+                    print(f"\n--- Repetition {run_number}/{args.repeat} ---")
+                asyncio.run(run_batches(session, batches, len(tests), results, run_number))
+    except (asyncio.CancelledError, KeyboardInterrupt):
+        print("\n\nStopping...")
+        cleanup(session)
+        sys.exit(0)
+    cleanup(session)
 
     # Global Stats
     all_max = max([r['MaxMB'] for r in results]) if results else 0
@@ -182,7 +423,11 @@ def main():
 
     # Save CSV
     with open(CSV_FILE, 'w', newline='') as csvfile:
-        fieldnames = ['Test', 'Result', 'MinMB', 'MaxMB', 'AvgMB', 'Samples', 'Error']
+        fieldnames = ['Test', 'Config', 'GcProfile', 'Cores', 'Run', 'Result', 'MinMB', 'MaxMB', 'AvgMB', 'MemMetric',
+                      'DurationS', 'WallS', 'CpuS', 'ImagesPerS', 'MPixPerS', 'Samples', 'CliMaxMB', 'BuildMaxMB', 'TreeMaxMB',
+                      'CgroupPeakMB', 'OomKills', 'MaxEvents', 'LeakVerdict', 'LeakBytesPerCycle', 'LeakP', 'Error']
+        if args.profile_threads:
+            fieldnames[-1:-1] = ['BusyThreads', 'PeakBusyThreads', 'IdleGaps', 'IdleS', 'LongestIdleS', 'HotThreads']
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
 
         writer.writeheader()
@@ -190,6 +435,39 @@ def main():
             writer.writerow(r)
 
     print(f"Detailed results saved to {CSV_FILE}")
+    if args.shard:
+        sharding.write_manifest("RunMemoryTests", args.shard, tests, estimate, {'memory_stats': CSV_FILE}, runs=args.repeat)
+
+    if args.sweep:
+        print("\n" + "=" * 90)
+        print("Sweep: Pareto-optimal configurations (throughput vs peak memory)")
+        sweep.report(sweep.summarize(results, session.variants), SWEEP_CSV_FILE)
+        print(f"\nAll sweep points saved to {SWEEP_CSV_FILE}")
+
+    if args.gc_profiles:
+        print("\n" + "=" * 90)
+        print("GC profiles (median peak MB and duration per profile)")
+        gcprofiles.report(results, args.gc_profiles, GC_CSV_FILE)
+        print(f"\nGC profile comparison saved to {GC_CSV_FILE}")
+
+    if args.scaling is not None:
+        print("\n" + "=" * 90)
+        print("CPU scaling (speedup and efficiency against the smallest core count)")
+        scaling.report(scaling.analyze(results), SCALING_CSV_FILE)
+        print(f"\nScaling curves saved to {SCALING_CSV_FILE}")
+
+    if args.history_dir:
+        os.makedirs(args.history_dir, exist_ok=True)
+        archived = os.path.join(args.history_dir, f"memory_stats_{time.strftime('%Y%m%d_%H%M%S')}.csv")
+        shutil.copyfile(CSV_FILE, archived)
+        print(f"Archived to {archived}")
+
+    if args.baseline:
+        print("\n" + "=" * 90)
+        print("Regression check against baseline")
+        status = regression.gate(regression.load_rows(args.baseline), results, sigmas=args.regression_sigma)
+        if status:
+            sys.exit(status)
 
 if __name__ == "__main__":
     main()
@@ -1,165 +1,138 @@
-import subprocess
 import xml.etree.ElementTree as ET
 import os
 import sys
 import argparse
-import signal
+import asyncio
 import shutil
 import time
-import threading
 import csv
+import tempfile
 
-# Optional psutil for memory monitoring
-try:
-    import psutil
-except ImportError:
-    psutil = None
+from testtools import (adaptive, discovery, history, host, leak, livefeed, orchestrator, procmem, selection, sharding, threadprof,
+                       timeseries, trx, variants)
 
 # Configuration
-TRX_FILE = os.path.abspath("temp_test_results.trx")
 FAIL_LOG_FILE = os.path.abspath("failed_tests.log")
 
-# Global State
-results = {}  
-run_count = 0
-failed = False
-monitor_active = False
-memory_samples = []
+class StressSession:
+    """Aggregated outcomes and counters of one runner invocation."""
+
+    def __init__(self, args):
+        self.args = args
+        self.results = {}
+        self.run_count = 0
+        self.failed = False
+        # Resolution and item counts of the memory-test variants, for throughput figures
+        self.variants = variants.load_variants(os.path.join(os.path.dirname(args.project), "TestVariants.cs")) if args.project else {}
+        # Every queue item gets its own TRX file so concurrent runs never clobber each other
+        self.trx_dir = tempfile.mkdtemp(prefix="runtests_")
+        # Launches of this session, for attributing CPU time only to launches that ran alone
+        self.launcher = orchestrator.Launcher()
+        # Adaptive mode: the scheduler and why each test stopped
+        self.scheduler = None
+        self.adaptive_status = {}
+        self.history = None
+        if args.history_db:
+            self.history = history.HistoryWriter(args.history_db, "RunTests", " ".join(sys.argv[1:]),
+                                                 os.path.dirname(os.path.abspath(args.project or ".")))
+        self.feed = None
+        if args.events or args.metrics_port is not None:
+            self.feed = livefeed.LiveFeed("RunTests", args.events, args.metrics_port)
 
 def log_status(*args, **kwargs):
     """Helper to print to STDERR (console) instead of STDOUT (file pipe)"""
     print(*args, file=sys.stderr, **kwargs)
 
-def signal_handler(sig, frame):
-    log_status("\n\nStopping... Generating report.")
-    print_report()
-    cleanup()
-    sys.exit(0)
+def cleanup(session):
+    if session.history:
+        session.history.close()
+    if session.feed:
+        session.feed.close()
+    if os.path.isdir(session.trx_dir):
+        shutil.rmtree(session.trx_dir, ignore_errors=True)
 
-def cleanup():
-    if os.path.exists(TRX_FILE):
-        try:
-            os.remove(TRX_FILE)
-        except OSError:
-            pass
-
-def monitor_memory_usage(pid, interval=0.1):
-    global monitor_active, memory_samples
-    memory_samples = []
-    
-    if not psutil:
-        return
-
-    try:
-        process = psutil.Process(pid)
-        while monitor_active:
-            try:
-                # Get RSS memory in MB
-                mem = process.memory_info().rss / (1024 * 1024)
-                
-                # Check children (e.g., testhost.exe) recursively
-                children = process.children(recursive=True)
-                for child in children:
-                    try:
-                        mem += child.memory_info().rss / (1024 * 1024)
-                    except (psutil.NoSuchProcess, psutil.AccessDenied):
-                        pass
-
-                memory_samples.append(mem)
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                break
-            time.sleep(interval)
-    except psutil.NoSuchProcess:
-        pass
-
-def get_all_tests(project_path):
+def get_all_tests(project_path, configuration, refresh=False):
     log_status("Discovering tests...")
     if not project_path or not os.path.exists(project_path):
         log_status("Error: --project path is required and must exist for test discovery.")
         sys.exit(1)
 
-    cmd = ["dotnet", "test", project_path, "--list-tests"]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-
-    tests = []
-    capture = False
-    for line in result.stdout.splitlines():
-        if "The following Tests are available:" in line:
-            capture = True
-            continue
-        if capture and line.strip():
-            tests.append(line.strip())
+    try:
+        tests = discovery.discover_tests(project_path, configuration, refresh, log=log_status)
+    except host.BuildError as e:
+        log_status(f"Error: {e}")
+        sys.exit(1)
 
     log_status(f"Found {len(tests)} tests.")
     return tests
 
-def parse_trx(file_path, record_failures):
-    global failed
-    current_run_stats = {} # { (class, test): outcome }
+def build_once(args):
+    # Parallel jobs and warm-host runs skip MSBuild, so the project is built exactly once up front
+    # instead of once per invocation (or N concurrent builds fighting over the same obj/ directory).
+    log_status("Building test project...")
+    try:
+        if args.warm_host:
+            args.assembly = host.prepare_assembly(args.project, args.configuration)
+            log_status(f"Using test assembly: {args.assembly}")
+        else:
+            host.build_project(args.project, args.configuration)
+    except host.BuildError as e:
+        log_status(f"Error: {e}")
+        sys.exit(1)
+
+def item_label(test_item):
+    if isinstance(test_item, list):
+        return test_item[0] if len(test_item) == 1 else f"{test_item[0]} (+{len(test_item) - 1})"
+    return test_item if test_item else 'Batch'
+
+def parse_trx(session, file_path, run_number):
+    results = session.results
+    current_run_stats = {} # { (class, test): {'outcome', 'start', 'end', 'duration'} }
 
     try:
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        
-        # Map testId to ClassName
-        test_id_map = {} 
-        for elem in root.iter():
-            if elem.tag.endswith('UnitTest'):
-                test_id = elem.get('id')
-                class_name = "Unknown"
-                for child in elem:
-                    if child.tag.endswith('TestMethod'):
-                        class_name = child.get('className')
-                        break
-                if test_id:
-                    test_id_map[test_id] = class_name
-
-        # Parse Results
-        for elem in root.iter():
-            if elem.tag.endswith('UnitTestResult'):
-                test_id = elem.get('testId')
-                test_name = elem.get('testName')
-                outcome = elem.get('outcome')
-
-                class_name = test_id_map.get(test_id, "UnknownContainer")
-
-                if class_name not in results:
-                    results[class_name] = {}
-                
-                if test_name not in results[class_name]:
-                    results[class_name][test_name] = {'pass': 0, 'fail': 0, 'memory': []}
-
-                if outcome == 'Passed':
-                    results[class_name][test_name]['pass'] += 1
-                elif outcome == 'Failed':
-                    results[class_name][test_name]['fail'] += 1
-                    failed = True
-                    if record_failures:
-                        record_failure_details(elem, class_name, test_name)
-                
-                current_run_stats[(class_name, test_name)] = outcome
+        # Outcomes stream straight into the aggregate as the file is read
+        for result in trx.iter_results(file_path):
+            class_name = result.class_name
+            test_name = result.test_name
+            outcome = result.outcome
+
+            if class_name not in results:
+                results[class_name] = {}
+
+            if test_name not in results[class_name]:
+                results[class_name][test_name] = {'pass': 0, 'fail': 0, 'memory': [], 'durations': [], 'cpu': [], 'threads': []}
+
+            if outcome == 'Passed':
+                results[class_name][test_name]['pass'] += 1
+            elif outcome == 'Failed':
+                results[class_name][test_name]['fail'] += 1
+                session.failed = True
+                if session.args.record_failed_results:
+                    record_failure_details(result, class_name, test_name, run_number)
+
+            if result.duration is not None:
+                results[class_name][test_name]['durations'].append(result.duration)
+
+            current_run_stats[(class_name, test_name)] = {
+                'outcome': outcome,
+                'start': result.start,
+                'end': result.end,
+                'duration': result.duration,
+                'message': result.message,
+            }
 
     except ET.ParseError:
-        log_status(f"[!] XML Parse Error on run {run_count}")
+        log_status(f"[!] XML Parse Error on run {run_number}")
     
     return current_run_stats
 
-def record_failure_details(result_elem, class_name, test_name):
-    error_msg = ""
-    stack_trace = ""
-    for output in result_elem:
-        if output.tag.endswith('Output'):
-            for error_info in output:
-                if error_info.tag.endswith('ErrorInfo'):
-                    for child in error_info:
-                        if child.tag.endswith('Message'):
-                            error_msg = child.text
-                        elif child.tag.endswith('StackTrace'):
-                            stack_trace = child.text
+def record_failure_details(result, class_name, test_name, run_number):
+    error_msg = result.message
+    stack_trace = result.stack_trace
 
     try:
         with open(FAIL_LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(f"--- Run {run_count} Failure ---\n")
+            f.write(f"--- Run {run_number} Failure ---\n")
             f.write(f"Test: {class_name}.{test_name}\n")
             f.write(f"Timestamp: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
             f.write(f"Message:\n{error_msg}\n")
@@ -168,21 +141,39 @@ def record_failure_details(result_elem, class_name, test_name):
     except Exception as e:
         log_status(f"[!] Failed to record failure details: {e}")
 
-def print_report(csv_file=None):
+def print_report(session, csv_file=None):
+    results = session.results
+
     # This remains on STDOUT so it can be piped
-    print(f"\n--- Test Report (Total Runs: {run_count}) ---")
+    print(f"\n--- Test Report (Total Runs: {session.run_count}) ---")
+    if session.scheduler:
+        total_runs, counts = session.scheduler.summary()
+        items = len(session.scheduler.items)
+        line = f"Adaptive: {total_runs} runs of at most {items * session.args.max_runs} (--max-runs {session.args.max_runs})"
+        # --runs is what a fixed stress run of the same tests would have used
+        if session.args.runs > 1:
+            line += f"; a fixed --runs {session.args.runs} would take {items * session.args.runs}"
+        print(f"{line} ({', '.join(f'{n} {status}' for status, n in sorted(counts.items()))})")
     if not results:
         print("No results collected.")
         return
 
     sorted_containers = sorted(results.keys())
+    confidence = session.args.confidence
+    ci_label = f"{confidence:.0%} CI"
     
     # Prepare CSV data
     csv_rows = []
 
     for container in sorted_containers:
         print(f"\nContainer: {container}")
-        header = f"{'Test Case':<60} | {'Pass':<5} | {'Fail':<5} | {'Fail %':<7} | {'Max MB':<8} | {'Avg MB':<8}"
+        header = f"{'Test Case':<60} | {'Pass':<5} | {'Fail':<5} | {'Fail %':<7} | {ci_label:<13} | {'Max MB':<8} | {'Avg MB':<8} | {'Avg s':<7} | {'CPU s':<7} | {'img/s':<8}"
+        if session.args.monitor_memory:
+            header += f" | {'Leak':<6}"
+        if session.args.profile_threads:
+            header += f" | {'Busy thr':<8} | {'Idle s':<7}"
+        if session.args.adaptive:
+            header += f" | {'Stopped':<8}"
         print(header)
         print("-" * len(header))
 
@@ -196,18 +187,49 @@ def print_report(csv_file=None):
         for name, stats in sorted_tests:
             total = stats['pass'] + stats['fail']
             fail_rate = (stats['fail'] / total) * 100 if total > 0 else 0.0
+            ci_low, ci_high = adaptive.wilson_interval(stats['fail'], total, confidence)
+            ci_text = f"{ci_low * 100:.1f}-{ci_high * 100:.1f}%"
             
             # Memory stats calculation
             mem_max = 0
             mem_avg = 0
+            role_max = {}
             if stats['memory']:
                 all_maxes = [m['max'] for m in stats['memory']]
                 all_avgs = [m['avg'] for m in stats['memory']]
                 mem_max = max(all_maxes) if all_maxes else 0
                 mem_avg = sum(all_avgs) / len(all_avgs) if all_avgs else 0
+                for m in stats['memory']:
+                    for role, mb in m.get('roles', {}).items():
+                        role_max[role] = max(role_max.get(role, 0.0), mb)
+
+            # Wall time from the TRX durations; CPU time is the tree's user+sys per run
+            durations = stats['durations']
+            avg_duration = sum(durations) / len(durations) if durations else 0.0
+            max_duration = max(durations) if durations else 0.0
+            # Unknown (None) when parallel jobs overlapped and memory was not sampled
+            avg_cpu = sum(stats['cpu']) / len(stats['cpu']) if stats['cpu'] else None
+            images, megapixels = variants.throughput(variants.variant_for_class(container, session.variants), avg_duration)
+
+            # Growth of post-cycle baselines within runs, and of retained memory across --runs iterations
+            per_cycle = leak.assess([m.get('baselines', []) for m in stats['memory']])
+            per_run = leak.assess([[m['retained'] for m in stats['memory'] if m.get('retained') is not None]])
+            verdict = leak.worst(per_cycle, per_run)
 
             display_name = (name[:57] + '..') if len(name) > 57 else name
-            row = f"{display_name:<60} | {stats['pass']:<5} | {stats['fail']:<5} | {fail_rate:.1f}%   | {mem_max:<8.2f} | {mem_avg:<8.2f}"
+            row = (f"{display_name:<60} | {stats['pass']:<5} | {stats['fail']:<5} | {fail_rate:.1f}%   | {ci_text:<13}"
+                   f" | {mem_max:<8.2f} | {mem_avg:<8.2f}"
+                   f" | {avg_duration:<7.2f} | {f'{avg_cpu:.2f}' if avg_cpu is not None else '-':<7}"
+                   f" | {f'{images:.2f}' if images is not None else '-':<8}")
+            if session.args.monitor_memory:
+                row += f" | {verdict.verdict:<6}"
+            threads = stats['threads']
+            busy = sum(t['busy_threads'] for t in threads) / len(threads) if threads else 0.0
+            idle = sum(t['idle_total'] for t in threads) / len(threads) if threads else 0.0
+            if session.args.profile_threads:
+                row += f" | {busy:<8.2f} | {idle:<7.2f}"
+            if session.args.adaptive:
+                row += f" | {session.adaptive_status.get(name, ''):<8}"
             
             # Use sys.stdout check to see if we should colorize (don't colorize files)
             if stats['fail'] > 0 and sys.stdout.isatty():
@@ -222,15 +244,45 @@ def print_report(csv_file=None):
                     'Pass': stats['pass'],
                     'Fail': stats['fail'],
                     'FailPercent': f"{fail_rate:.2f}",
+                    'FailCiLow': f"{ci_low * 100:.2f}",
+                    'FailCiHigh': f"{ci_high * 100:.2f}",
                     'MaxMB': f"{mem_max:.2f}",
                     'AvgMB': f"{mem_avg:.2f}",
-                    'Samples': len(stats['memory'])
+                    'Samples': len(stats['memory']),
+                    'CliMaxMB': f"{role_max.get(procmem.ROLE_CLI, 0.0):.2f}",
+                    'BuildMaxMB': f"{role_max.get(procmem.ROLE_BUILD, 0.0):.2f}",
+                    'TesthostMaxMB': f"{role_max.get(procmem.ROLE_TESTHOST, 0.0):.2f}",
+                    'AvgDurationS': f"{avg_duration:.4f}",
+                    'MaxDurationS': f"{max_duration:.4f}",
+                    'AvgCpuS': f"{avg_cpu:.4f}" if avg_cpu is not None else '',
+                    'ImagesPerS': f"{images:.3f}" if images is not None else '',
+                    'MPixPerS': f"{megapixels:.3f}" if megapixels is not None else '',
+                    'LeakVerdict': verdict.verdict,
+                    'LeakBytesPerCycle': round(per_cycle.bytes_per_step),
+                    'LeakBytesPerRun': round(per_run.bytes_per_step),
+                    'LeakP': f"{verdict.p_value:.4f}"
                 })
+                if session.args.adaptive:
+                    csv_rows[-1]['Stopped'] = session.adaptive_status.get(name, '')
+                if session.args.profile_threads:
+                    # The hottest threads of the most CPU-hungry run
+                    heaviest = max(threads, key=lambda t: sum(h[2] for h in t['hot']), default=None)
+                    csv_rows[-1].update({
+                        'BusyThreads': f"{busy:.2f}",
+                        'IdleS': f"{idle:.3f}",
+                        'LongestIdleS': f"{max((t['longest_gap'] for t in threads), default=0.0):.3f}",
+                        'HotThreads': threadprof.format_hot(heaviest['hot']) if heaviest else '',
+                    })
 
     if csv_file and csv_rows:
         try:
             with open(csv_file, 'w', newline='') as f:
-                fieldnames = ['Container', 'Test', 'Pass', 'Fail', 'FailPercent', 'MaxMB', 'AvgMB', 'Samples']
+                fieldnames = ['Container', 'Test', 'Pass', 'Fail', 'FailPercent', 'FailCiLow', 'FailCiHigh', 'MaxMB', 'AvgMB', 'Samples', 'CliMaxMB', 'BuildMaxMB', 'TesthostMaxMB',
+                              'AvgDurationS', 'MaxDurationS', 'AvgCpuS', 'ImagesPerS', 'MPixPerS', 'LeakVerdict', 'LeakBytesPerCycle', 'LeakBytesPerRun', 'LeakP']
+                if session.args.adaptive:
+                    fieldnames.append('Stopped')
+                if session.args.profile_threads:
+                    fieldnames += ['BusyThreads', 'IdleS', 'LongestIdleS', 'HotThreads']
                 writer = csv.DictWriter(f, fieldnames=fieldnames)
                 writer.writeheader()
                 writer.writerows(csv_rows)
@@ -238,32 +290,340 @@ def print_report(csv_file=None):
         except Exception as e:
             log_status(f"Error saving CSV: {e}")
 
-def main():
-    global run_count, failed, monitor_active, memory_samples
+def expand_filter(text):
+    """A bare test name becomes FullyQualifiedName=<name>; anything with an operator is already an expression."""
+    return text if any(op in text for op in ('=', '~', '&', '|')) else f"FullyQualifiedName={text}"
+
+def build_test_command(args, test_item, trx_path, no_build=False):
+    if args.warm_host:
+        if isinstance(test_item, list):
+            active_filter = host.batch_filter(test_item)
+        elif args.filter:
+            active_filter = expand_filter(args.filter)
+        else:
+            active_filter = ""
+        return host.assembly_test_command(args.assembly, trx_path, active_filter, serial=args.monitor_memory)
+
+    cmd = [
+        "dotnet", "test",
+        "--configuration", args.configuration,
+        "--logger", f"trx;LogFileName={trx_path}"
+    ]
+
+    if args.project:
+        cmd.insert(2, args.project)
+
+    if no_build:
+        cmd.append("--no-build")
+
+    # Filter Logic
+    active_filter = ""
+    if test_item:
+        active_filter = f"FullyQualifiedName={test_item}"
+    elif args.filter:
+        active_filter = expand_filter(args.filter)
+
+    if active_filter:
+        cmd.extend(["--filter", active_filter])
+
+    return cmd
+
+async def execute_run(session, test_item, trx_path, no_build):
+    """Runs one `dotnet test` invocation and merges its outcomes.
+    Returns {(class, test): outcome info} for this run, or None if no TRX was produced."""
+    args = session.args
+    session.run_count += 1
+    run_number = session.run_count
+
+    cmd = build_test_command(args, test_item, trx_path, no_build)
+    state = orchestrator.RunState(cmd, label=item_label(test_item))
+
+    trace = None
+    if args.trace_dir and args.monitor_memory:
+        tests = test_item if isinstance(test_item, list) else [test_item or args.filter or 'Batch']
+        trace = timeseries.TraceWriter(
+            timeseries.trace_path(args.trace_dir, item_label(test_item), run_number),
+            meta={'tests': tests, 'run': run_number, 'interval_ms': args.sample_interval_ms})
+        state.sample_sink = trace.append_sample
+    launch = session.feed.launch(item_label(test_item)) if session.feed else None
+    if launch:
+        state.sample_sink = livefeed.chain(state.sample_sink, launch.sample)
+    profiler = None
+    if args.profile_threads:
+        profiler = threadprof.ThreadProfiler(args.thread_interval_ms / 1000)
+        state.thread_profiler = profiler
+    try:
+        await session.launcher.run(state, args.sample_interval_ms / 1000 if args.monitor_memory else None)
+    finally:
+        if trace:
+            trace.close()
+        if launch:
+            launch.close(os.path.exists(trx_path))
+        if profiler:
+            profiler.write(timeseries.trace_path(args.thread_profile_dir, item_label(test_item), run_number, threadprof.SUFFIX),
+                           meta={'run': run_number, 'label': item_label(test_item)})
+
+    if not os.path.exists(trx_path):
+        tail = state.stderr_text().strip()
+        if tail:
+            log_status(f"\n{tail[-2000:]}")
+        return None
+
+    samples = state.samples
+    parsed_tests = parse_trx(session, trx_path, run_number)
+
+    # Max/avg follow the testhost; tests sharing one host get the samples from their own TRX window
+    engine = procmem.engine_series(samples)
+    roles = procmem.role_peaks(samples)
+    attributed = {}
+    if args.monitor_memory and len(parsed_tests) > 1:
+        windows = {key: (info['start'], info['end']) for key, info in parsed_tests.items()}
+        attributed = host.attribute_samples(engine, windows)
+
+    # CPU time is measured per launch; tests sharing a host split it by their TRX durations
+    total_duration = sum(info['duration'] or 0.0 for info in parsed_tests.values())
+    cpu_shares = {}
+    for (c_name, t_name), info in parsed_tests.items():
+        if state.cpu_time is None:
+            break
+        if len(parsed_tests) == 1 or total_duration <= 0:
+            share = 1.0 / len(parsed_tests)
+        else:
+            share = (info['duration'] or 0.0) / total_duration
+        cpu_shares[(c_name, t_name)] = state.cpu_time * share
+        session.results[c_name][t_name]['cpu'].append(cpu_shares[(c_name, t_name)])
+
+    if profiler:
+        timeline = profiler.timeline()
+        for (c_name, t_name), info in parsed_tests.items():
+            window = (info['start'], info['end']) if len(parsed_tests) > 1 and info['start'] else (None, None)
+            summary = threadprof.summarize(timeline, *window)
+            if summary:
+                session.results[c_name][t_name]['threads'].append(summary)
+
+    for key in parsed_tests.keys():
+        test_samples = attributed.get(key, [mb for (_, mb) in engine])
+        mem_stat = {'max': 0, 'avg': 0, 'roles': roles, 'baselines': [], 'retained': None}
+        if args.monitor_memory and test_samples:
+            mem_stat['max'] = max(test_samples)
+            mem_stat['avg'] = sum(test_samples) / len(test_samples)
+            # Post-cycle troughs feed the in-run leak check; the last one is what this run retained
+            mem_stat['baselines'] = leak.post_cycle_baselines(test_samples)
+            tail = test_samples[-max(1, len(test_samples) // 4):]
+            mem_stat['retained'] = mem_stat['baselines'][-1] if mem_stat['baselines'] else min(tail)
+
+        c_name, t_name = key
+        if session.results[c_name][t_name]['memory'] is not None:
+            session.results[c_name][t_name]['memory'].append(mem_stat)
+        parsed_tests[key]['max_mb'] = mem_stat['max']
+
+        info = parsed_tests[key]
+        if session.history and info['outcome'] in ('Passed', 'Failed'):
+            passed = info['outcome'] == 'Passed'
+            images = None
+            if passed:
+                images, _ = variants.throughput(variants.variant_for_class(c_name, session.variants), info['duration'])
+            session.history.add(t_name, passed, iteration=run_number, duration=info['duration'],
+                                max_mb=mem_stat['max'] if args.monitor_memory else None,
+                                avg_mb=mem_stat['avg'] if args.monitor_memory else None,
+                                cpu=cpu_shares.get(key), images_per_s=images,
+                                error=None if passed else info['message'] or info['outcome'])
+        if session.feed and info['outcome'] in ('Passed', 'Failed'):
+            session.feed.test_finished(t_name, info['outcome'] == 'Passed', info['duration'],
+                                       mem_stat['max'] if args.monitor_memory else None, info['message'], run=run_number)
+
+    os.remove(trx_path)
+    return parsed_tests
+
+async def run_test_item(session, index, test_item, total_queue_items, no_build=False):
+    args = session.args
+    trx_path = os.path.join(session.trx_dir, f"job_{index}.trx")
+
+    current_run = 0
+    while True:
+        if not args.run_until_fail and args.runs > 0 and current_run >= args.runs:
+            break
+        if args.run_until_fail and session.failed:
+            break
+
+        current_run += 1
+
+        # Display Status (TO STDERR). Parallel jobs report completions instead.
+        if args.jobs <= 1:
+            status_msg = f"Run {current_run}"
+            if args.discover:
+                status_msg = f"[{index+1}/{total_queue_items}] {item_label(test_item)[-40:]} - {status_msg}"
+
+            log_status(f"{status_msg:<80}", end='\r')
+
+        if await execute_run(session, test_item, trx_path, no_build) is None:
+            label = f"{item_label(test_item)} run {current_run}" if args.jobs > 1 else f"Run {current_run}"
+            log_status(f"\n[!] {label} failed to produce results (crashed?).")
+            break
+
+async def run_queue(session, test_queue, no_build):
+    orchestrator.install_interrupt_handler(asyncio.current_task())
+
+    args = session.args
+    total_queue_items = len(test_queue)
+    slots = asyncio.Semaphore(args.jobs)
+    completed = 0
+
+    async def worker(i, test_item):
+        nonlocal completed
+        async with slots:
+            # Stop if we are in run-until-fail mode and a failure has occurred
+            if args.run_until_fail and session.failed:
+                return
+            await run_test_item(session, i, test_item, total_queue_items, no_build)
+        completed += 1
+        if args.jobs > 1:
+            log_status(f"{f'[{completed}/{total_queue_items}] {item_label(test_item)[-60:]}':<80}", end='\r')
+
+    # The semaphore is FIFO, so with --jobs 1 items still run strictly in queue order
+    await asyncio.gather(*(worker(i, item) for i, item in enumerate(test_queue)))
+
+async def run_adaptive(session, test_queue, no_build):
+    """Runs queue items for as long as the adaptive scheduler finds them worth another iteration."""
+    orchestrator.install_interrupt_handler(asyncio.current_task())
+
+    args = session.args
+    scheduler = session.scheduler
+    changed = asyncio.Condition()
+
+    async def worker():
+        while True:
+            async with changed:
+                index = scheduler.next()
+                while index is None:
+                    if not scheduler.pending():
+                        return
+                    await changed.wait()
+                    index = scheduler.next()
+
+            test_item = test_queue[index]
+            trx_path = os.path.join(session.trx_dir, f"job_{index}.trx")
+            started = time.monotonic()
+            outcomes = await execute_run(session, test_item, trx_path, no_build)
+            seconds = time.monotonic() - started
+            if outcomes is None:
+                # A crashed host counts as a failed iteration of everything it was running
+                log_status(f"\n[!] {item_label(test_item)} failed to produce results (crashed?).")
+                outcomes = {}
+                failed = True
+            else:
+                failed = not outcomes or any(info['outcome'] == 'Failed' for info in outcomes.values())
+
+            async with changed:
+                scheduler.record(index, failed, seconds,
+                                 durations=[info['duration'] for info in outcomes.values() if info['duration'] is not None],
+                                 peaks=[info.get('max_mb') for info in outcomes.values()])
+                changed.notify_all()
+
+            stats = scheduler.items[index]
+            total_runs, counts = scheduler.summary()
+            log_status(f"{f'[{total_runs} runs] {item_label(test_item)[-40:]} #{stats.runs} {stats.status}':<80}", end='\r')
+
+    await asyncio.gather(*(worker() for _ in range(args.jobs)))
+    scheduler.finish()
 
+    # Per-test status for the report: the status of the queue item it ran in
+    for index, test_item in enumerate(test_queue):
+        for test in (test_item if isinstance(test_item, list) else [test_item]):
+            session.adaptive_status[test] = scheduler.items[index].status
+
+def main():
     parser = argparse.ArgumentParser(description="Unified Test Runner & Memory Monitor")
-    parser.add_argument('--runs', type=int, default=1, help='Number of times to run the tests')
+    parser.add_argument('--runs', type=int, default=1, help='Number of times to run the tests (with --adaptive: the fixed count to compare against)')
     parser.add_argument('--run-until-fail', action='store_true', help='Run tests repeatedly until a failure occurs')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='With --discover, repeat each test only until its fail rate is pinned down (see --target-fail-rate)')
+    parser.add_argument('--target-fail-rate', type=float, default=0.05,
+                        help='Adaptive: stop a test once its fail-rate confidence interval is entirely below this')
+    parser.add_argument('--confidence', type=float, default=0.95, help='Confidence level of the fail %% intervals')
+    parser.add_argument('--min-runs', type=int, default=10, help='Adaptive: runs every test gets before it can stop')
+    parser.add_argument('--max-runs', type=int, default=200, help='Adaptive: runs after which a test stops regardless')
+    parser.add_argument('--time-budget', type=adaptive.parse_duration, default=None,
+                        help='Adaptive: total wall time, e.g. 45m or 2h; no run starts that would overrun it')
     parser.add_argument('--filter', type=str, default='', help='Filter for tests')
     parser.add_argument('--project', type=str, default='', help='Path to the test project file')
     parser.add_argument('-c', '--configuration', type=str, default='Debug', help='Build configuration')
     parser.add_argument('--record-failed-results', action='store_true', help='Log failed test output')
-    parser.add_argument('--monitor-memory', action='store_true', help='Enable memory monitoring (requires psutil)')
+    parser.add_argument('--monitor-memory', action='store_true', help='Enable memory monitoring (/proc on Linux, psutil elsewhere)')
+    parser.add_argument('--sample-interval-ms', type=float, default=100, help='Memory sampling interval in milliseconds (min 5)')
+    parser.add_argument('--trace-dir', type=str, default='', help='With --monitor-memory, write each run\'s full memory time series (.iatrace) here')
+    parser.add_argument('--profile-threads', action='store_true', help='Sample per-thread CPU of the testhost and summarize busy threads, idle gaps and hot threads (Linux)')
+    parser.add_argument('--thread-interval-ms', type=float, default=10, help='Thread sampling interval in milliseconds')
     parser.add_argument('--csv', type=str, default='', help='Path to save results CSV')
+    parser.add_argument('--history-db', type=str, nargs='?', const=history.DEFAULT_DB, default='', metavar='PATH',
+                        help=f'Record every test execution in a SQLite history database (default {os.path.basename(history.DEFAULT_DB)}); '
+                             f'query it with python -m testtools.history')
+    parser.add_argument('--events', type=str, default='', metavar='PATH',
+                        help='Append a JSONL event per finished test (and per memory sample window) to PATH (or unix:SOCKET)')
+    parser.add_argument('--metrics-port', type=int, default=None, metavar='PORT',
+                        help='Serve live progress, ETA, memory and pass/fail counters in Prometheus format on 127.0.0.1:PORT (0: any free port)')
     parser.add_argument('--discover', action='store_true', help='Discover all tests in project and run them individually')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of discovered tests to run concurrently (requires --discover)')
+    parser.add_argument('--warm-host', action='store_true', help='Build once, then run the compiled test assembly directly (requires --project)')
+    parser.add_argument('--refresh-discovery', action='store_true', help='Ignore the cached test list and discover again')
+    parser.add_argument('--tests-per-host', type=int, default=1, help='With --warm-host and --discover, number of tests run per testhost launch')
+    parser.add_argument('--changed-since', type=str, default='', metavar='REF',
+                        help='Only run test classes that changes since the merge base with REF can affect (full suite for core files)')
+    parser.add_argument('--shard', type=sharding.parse_shard, default=None, metavar='I/N',
+                        help='With --discover and --csv, run only shard I of N, balanced by historical durations')
+    parser.add_argument('--shard-durations', type=str, nargs='+', default=None, metavar='PATH',
+                        help='History databases or result CSVs to balance shards with (default: the history database); '
+                             'every shard must use the same files')
 
     args = parser.parse_args()
 
-    signal.signal(signal.SIGINT, signal_handler)
-
-    if args.monitor_memory and not psutil:
-        log_status("Warning: --monitor-memory requested but 'psutil' module is not installed. Memory tracking disabled.")
+    if args.monitor_memory and not procmem.available():
+        log_status("Warning: --monitor-memory requested but neither /proc nor 'psutil' is available. Memory tracking disabled.")
         args.monitor_memory = False
 
     if args.discover and not args.project:
         log_status("Error: --discover requires --project")
         sys.exit(1)
 
+    if args.jobs < 1:
+        log_status("Error: --jobs must be at least 1")
+        sys.exit(1)
+
+    if args.jobs > 1 and not args.discover:
+        log_status("Warning: --jobs only applies to --discover mode. Running sequentially.")
+        args.jobs = 1
+
+    if args.warm_host and not args.project:
+        log_status("Error: --warm-host requires --project")
+        sys.exit(1)
+
+    if args.shard and not args.discover:
+        log_status("Error: --shard requires --discover")
+        sys.exit(1)
+    if args.shard and not args.csv:
+        # The merge step reads each shard's results from the CSV
+        log_status("Error: --shard requires --csv")
+        sys.exit(1)
+
+    if args.adaptive:
+        if not args.discover or args.run_until_fail:
+            log_status("Error: --adaptive requires --discover and cannot be combined with --run-until-fail")
+            sys.exit(1)
+        if not 0 < args.target_fail_rate < 1 or not 0 < args.confidence < 1:
+            log_status("Error: --target-fail-rate and --confidence must be between 0 and 1")
+            sys.exit(1)
+        args.min_runs = max(1, min(args.min_runs, args.max_runs))
+
+    if args.trace_dir:
+        os.makedirs(args.trace_dir, exist_ok=True)
+
+    if args.profile_threads:
+        if not sys.platform.startswith("linux"):
+            log_status("Error: --profile-threads needs /proc (Linux).")
+            sys.exit(1)
+        args.thread_profile_dir = args.trace_dir or os.path.abspath("thread_profiles")
+        os.makedirs(args.thread_profile_dir, exist_ok=True)
+
     if args.record_failed_results and os.path.exists(FAIL_LOG_FILE):
         try:
             os.remove(FAIL_LOG_FILE)
@@ -271,102 +631,90 @@ def main():
             pass
 
     # Determine execution list
+    affected = None
+    if args.changed_since:
+        affected = selection.from_git(args.changed_since)
+        log_status(f"Change selection: {affected.reason}; "
+                   f"{'full suite' if affected.full else f'{len(affected.classes)} affected test class(es)'}")
+
     test_queue = []
     if args.discover:
-        test_queue = get_all_tests(args.project)
+        test_queue = get_all_tests(args.project, args.configuration, args.refresh_discovery)
+        if affected:
+            test_queue = selection.select(affected, test_queue)
+            log_status(f"Selected {len(test_queue)} test(s).")
+        if args.shard:
+            durations = sharding.load_durations(args.shard_durations or [args.history_db or history.DEFAULT_DB])
+            overhead = 0.0 if args.warm_host else sharding.LAUNCH_OVERHEAD_S
+            test_queue, estimate = sharding.select(test_queue, args.shard, durations, overhead, log=log_status)
     else:
         test_queue = [None] # Single batch run
-
-    log_status(f"Mode: {'Run Until Fail' if args.run_until_fail else f'Run {args.runs} times'}")
+        expression = selection.filter_expression(affected) if affected else ''
+        if expression:
+            args.filter = f"({expand_filter(args.filter)})&({expression})" if args.filter else expression
+        elif expression is None:
+            test_queue = []
+
+    if not test_queue:
+        log_status("No tests to run.")
+        if args.shard:
+            sharding.write_manifest("RunTests", args.shard, [], 0.0, {}, runs=0, confidence=args.confidence)
+        sys.exit(0)
+
+    if args.warm_host and args.discover:
+        test_queue = host.chunked(test_queue, args.tests_per_host)
+
+    if args.adaptive:
+        log_status(f"Mode: Adaptive (fail rate < {args.target_fail_rate:.1%} at {args.confidence:.0%} confidence, "
+                   f"{args.min_runs}-{args.max_runs} runs per test, ~{adaptive.runs_to_clear(args.target_fail_rate, args.confidence)} "
+                   f"to clear a stable test{f', budget {args.time_budget:.0f}s' if args.time_budget else ''})")
+    else:
+        log_status(f"Mode: {'Run Until Fail' if args.run_until_fail else f'Run {args.runs} times'}")
     log_status(f"Monitoring Memory: {'Yes' if args.monitor_memory else 'No'}")
+    if args.warm_host:
+        log_status(f"Warm Host: {args.tests_per_host if args.discover else 'all'} test(s) per launch")
+    if args.jobs > 1:
+        log_status(f"Parallel Jobs: {args.jobs}")
     log_status("Starting execution...")
 
-    total_queue_items = len(test_queue)
-    
-    for i, test_item in enumerate(test_queue):
-        # Stop if we are in run-until-fail mode and a failure has occurred (global flag)
-        if args.run_until_fail and failed:
-            break
+    no_build = args.jobs > 1 or args.warm_host
+    if no_build:
+        build_once(args)
 
-        current_run = 0
-        while True:
-            if not args.run_until_fail and args.runs > 0 and current_run >= args.runs:
-                break
-            if args.run_until_fail and failed:
-                break
-
-            current_run += 1
-            run_count += 1
-            
-            # Build Command
-            cmd = [
-                "dotnet", "test",
-                "--configuration", args.configuration,
-                "--logger", f"trx;LogFileName={TRX_FILE}"
-            ]
-            
-            if args.project:
-                cmd.insert(2, args.project)
-
-            # Filter Logic
-            active_filter = ""
-            if test_item:
-                active_filter = f"FullyQualifiedName={test_item}"
-            elif args.filter:
-                active_filter = f"FullyQualifiedName={args.filter}" if '=' not in args.filter else args.filter
-            
-            if active_filter:
-                cmd.extend(["--filter", active_filter])
-
-            # Display Status (TO STDERR)
-            status_msg = f"Run {current_run}"
-            if args.discover:
-                status_msg = f"[{i+1}/{total_queue_items}] {test_item[-40:] if test_item else 'Batch'} - {status_msg}"
-            
-            log_status(f"{status_msg:<80}", end='\r')
-
-            # Execution with optional monitoring
-            monitor_thread = None
-            proc = None
-            
-            monitor_active = args.monitor_memory
-            memory_samples = []
-
-            try:
-                # Use Popen to allow background monitoring
-                proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
-                
-                if args.monitor_memory:
-                    monitor_thread = threading.Thread(target=monitor_memory_usage, args=(proc.pid,))
-                    monitor_thread.start()
-                
-                proc.wait()
-            finally:
-                monitor_active = False
-                if monitor_thread:
-                    monitor_thread.join()
-
-            # Process Results
-            mem_stat = {'max': 0, 'avg': 0}
-            if args.monitor_memory and memory_samples:
-                mem_stat['max'] = max(memory_samples)
-                mem_stat['avg'] = sum(memory_samples) / len(memory_samples)
-
-            if os.path.exists(TRX_FILE):
-                parsed_tests = parse_trx(TRX_FILE, args.record_failed_results)
-                os.remove(TRX_FILE)
-                
-                for (c_name, t_name) in parsed_tests.keys():
-                    if results[c_name][t_name]['memory'] is not None:
-                         results[c_name][t_name]['memory'].append(mem_stat)
-            else:
-                log_status(f"\n[!] Run {current_run} failed to produce results (crashed?).")
-                break
+    try:
+        session = StressSession(args)
+    except OSError as e:
+        log_status(f"Error: cannot start the live feed: {e}")
+        sys.exit(1)
+    if session.feed:
+        # Run-until-fail and adaptive runs have no fixed length; a time budget still gives an ETA
+        planned = None if args.run_until_fail or args.adaptive else len(test_queue) * max(0, args.runs)
+        deadline = time.time() + args.time_budget if args.adaptive and args.time_budget else None
+        session.feed.start(planned=planned or None, deadline=deadline, items=len(test_queue), jobs=args.jobs)
+        if session.feed.url:
+            log_status(f"Live metrics: {session.feed.url}")
+    try:
+        if args.adaptive:
+            session.scheduler = adaptive.Scheduler(len(test_queue), args.target_fail_rate, args.confidence,
+                                                   args.min_runs, args.max_runs, args.time_budget)
+            asyncio.run(run_adaptive(session, test_queue, no_build))
+        else:
+            asyncio.run(run_queue(session, test_queue, no_build))
+    except (asyncio.CancelledError, KeyboardInterrupt):
+        log_status("\n\nStopping... Generating report.")
+        print_report(session)
+        cleanup(session)
+        sys.exit(0)
 
     # Clean up the stderr status line
     log_status("")
-    print_report(args.csv)
-    cleanup()
+    print_report(session, args.csv)
+    cleanup(session)
+
+    if args.shard:
+        sharding.write_manifest("RunTests", args.shard, [t for item in test_queue for t in (item if isinstance(item, list) else [item])],
+                                estimate, {'results': args.csv, 'failures': FAIL_LOG_FILE if args.record_failed_results else None},
+                                runs=session.run_count, confidence=args.confidence)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
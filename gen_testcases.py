@@ -1,38 +1,344 @@
 import os
-import random
-from PIL import Image
-import numpy as np
+import sys
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-def generate_images():
-    configs = [
-        ("480p", 640, 480),
-        ("720p", 1280, 720),
-        ("1080p", 1920, 1080),
-        ("2160p", 3840, 2160)
-    ]
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
-    base_dir = "Testcases"
+from testtools import rawimage
 
-    if not os.path.exists(base_dir):
-        os.makedirs(base_dir)
+DEFAULT_RESOLUTIONS = [
+    ("480p", 640, 480),
+    ("720p", 1280, 720),
+    ("1080p", 1920, 1080),
+    ("2160p", 3840, 2160)
+]
 
-    for name, width, height in configs:
+DEFAULT_PROFILE = "noise"
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+def parse_resolution(spec):
+    """'name=WxH', 'WxH' or one of the default names."""
+    for name, width, height in DEFAULT_RESOLUTIONS:
+        if spec == name:
+            return name, width, height
+    name, _, size = spec.rpartition("=")
+    try:
+        width, height = (int(v) for v in size.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Bad resolution '{spec}', expected name=WxH")
+    return name or f"{height}p", width, height
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Content profiles. Each takes (rng, width, height) and returns an (H, W, 3|4) uint8 array,
+# built with whole-array NumPy operations so a 2160p image costs a few passes, not a pixel loop.
+
+def _grid(height, width):
+    y = np.arange(height, dtype=np.float32)[:, None] / max(height - 1, 1)
+    x = np.arange(width, dtype=np.float32)[None, :] / max(width - 1, 1)
+    return y, x
+
+def _to_uint8(values):
+    return np.clip(values, 0, 255).astype(np.uint8)
+
+def _normalize(field):
+    lo, hi = np.percentile(field, (1, 99))
+    return np.clip((field - lo) / max(hi - lo, 1e-6), 0, 1)
+
+def _spectral_field(rng, width, height, beta):
+    """Gaussian noise with a 1/f^beta power spectrum, the usual stand-in for natural image statistics."""
+    fy = np.fft.fftfreq(height).astype(np.float32)[:, None]
+    fx = np.fft.rfftfreq(width).astype(np.float32)[None, :]
+    radius = np.sqrt(fx * fx + fy * fy)
+    radius[0, 0] = 1.0
+    spectrum = np.fft.rfft2(rng.standard_normal((height, width), dtype=np.float32))
+    spectrum *= radius ** (-beta / 2)
+    spectrum[0, 0] = 0
+    return _normalize(np.fft.irfft2(spectrum, s=(height, width)).astype(np.float32))
+
+def profile_noise(rng, width, height):
+    return rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+def profile_gradient(rng, width, height):
+    y, x = _grid(height, width)
+    angle = rng.uniform(0, 2 * np.pi)
+    t = x * np.cos(angle) + y * np.sin(angle)
+    t = (t - t.min()) / max(t.max() - t.min(), 1e-6)
+    # A soft radial term so the gradient is not perfectly planar
+    cy, cx = rng.uniform(0, 1, 2)
+    r = np.sqrt((x - cx) ** 2 + (y - cy) ** 2)
+    t = 0.8 * t + 0.2 * (r / r.max())
+    start, end = rng.uniform(0, 255, (2, 3)).astype(np.float32)
+    return _to_uint8(start + t[..., None] * (end - start))
+
+def profile_fractal(rng, width, height):
+    # Shared luminance plus weaker, smoother chroma, like a photo rather than three unrelated channels
+    luma = _spectral_field(rng, width, height, rng.uniform(1.8, 2.4))
+    chroma = np.stack([_spectral_field(rng, width, height, 2.8) - 0.5 for _ in range(2)], axis=-1)
+    tint = rng.uniform(0.15, 0.35)
+    rgb = np.stack([
+        luma + tint * chroma[..., 0],
+        luma - tint * 0.5 * (chroma[..., 0] + chroma[..., 1]),
+        luma + tint * chroma[..., 1],
+    ], axis=-1)
+    return _to_uint8(rgb * 255)
+
+def profile_text(rng, width, height):
+    scale = max(1, height // 360)
+    glyph_h, glyph_w, cell_h, cell_w = 7, 5, 11, 6
+    glyphs = rng.random((64, glyph_h, glyph_w)) < 0.4
+    glyphs[0] = False  # space
+
+    rows = -(-height // (cell_h * scale))
+    cols = -(-width // (cell_w * scale))
+    codes = rng.integers(1, 64, (rows, cols))
+    codes[rng.random((rows, cols)) < 0.18] = 0                    # word breaks
+    codes[:, :2] = 0                                              # margins
+    codes[rng.random(rows) < 0.15] = 0                            # paragraph gaps
+    line_ends = rng.integers(cols // 2, cols, rows)
+    codes[np.arange(cols)[None, :] >= line_ends[:, None]] = 0     # ragged right edge
+
+    cells = np.zeros((rows, cols, cell_h, cell_w), dtype=bool)
+    cells[:, :, 2:2 + glyph_h, :glyph_w] = glyphs[codes]
+    ink = cells.transpose(0, 2, 1, 3).reshape(rows * cell_h, cols * cell_w)
+    ink = ink.repeat(scale, axis=0).repeat(scale, axis=1)[:height, :width]
+
+    # Line art: random straight strokes rasterized by sampling points along each segment
+    segments = rng.integers(8, 24)
+    ends = rng.uniform(0, 1, (segments, 4)) * [width - 1, height - 1, width - 1, height - 1]
+    steps = int(np.hypot(width, height))
+    t = np.linspace(0, 1, steps, dtype=np.float32)[None, :]
+    xs = (ends[:, 0:1] + t * (ends[:, 2:3] - ends[:, 0:1])).astype(np.int64)
+    ys = (ends[:, 1:2] + t * (ends[:, 3:4] - ends[:, 1:2])).astype(np.int64)
+    for offset in range(scale):
+        ink[np.clip(ys + offset, 0, height - 1), xs] = True
+
+    paper = rng.uniform(225, 255, 3).astype(np.float32)
+    pen = rng.uniform(0, 60, 3).astype(np.float32)
+    return _to_uint8(np.where(ink[..., None], pen, paper))
+
+def profile_flat(rng, width, height):
+    # Voronoi cells computed on a coarse grid and scaled up: a handful of large uniform regions
+    block = max(1, min(width, height) // 270)
+    small_h, small_w = -(-height // block), -(-width // block)
+    seeds = rng.integers(6, 24)
+    points = rng.uniform(0, 1, (seeds, 2)) * [small_h, small_w]
+    yy, xx = np.mgrid[0:small_h, 0:small_w].astype(np.float32)
+    distance = (yy[None] - points[:, 0, None, None]) ** 2 + (xx[None] - points[:, 1, None, None]) ** 2
+    labels = distance.argmin(axis=0)
+    labels = labels.repeat(block, axis=0).repeat(block, axis=1)[:height, :width]
+    colors = rng.integers(0, 256, (seeds, 3), dtype=np.uint8)
+    return colors[labels]
+
+def profile_alpha(rng, width, height):
+    rgb = profile_fractal(rng, width, height)
+    # Mostly fully opaque or fully transparent, with soft edges and a translucent band between
+    coverage = _spectral_field(rng, width, height, 3.0)
+    alpha = np.clip((coverage - 0.35) * 4, 0, 1)
+    y, x = _grid(height, width)
+    alpha = np.where((y > 0.4) & (y < 0.6), alpha * 0.5, alpha)
+    alpha = np.broadcast_to(alpha, (height, width))
+    return np.concatenate([rgb, _to_uint8(alpha * 255)[..., None]], axis=-1)
+
+PROFILES = {
+    "noise": profile_noise,
+    "gradient": profile_gradient,
+    "fractal": profile_fractal,
+    "text": profile_text,
+    "flat": profile_flat,
+    "alpha": profile_alpha,
+}
+
+def parse_profile(spec):
+    """'gradient+text' for every resolution, or '1080p=fractal+alpha' for one."""
+    name, _, profiles = spec.rpartition("=")
+    profiles = [p for p in profiles.split("+") if p]
+    unknown = [p for p in profiles if p not in PROFILES]
+    if unknown or not profiles:
+        raise argparse.ArgumentTypeError(f"Unknown profile in '{spec}'; choose from {', '.join(PROFILES)}")
+    return name, profiles
+
+def profiles_for(resolution, profile_specs):
+    """Per-resolution specs win over global ones; default is noise."""
+    chosen = [DEFAULT_PROFILE]
+    for name, profiles in profile_specs:
+        if not name:
+            chosen = profiles
+    for name, profiles in profile_specs:
+        if name == resolution:
+            chosen = profiles
+    return chosen
+
+def image_params(width, height, index, seed, compress_level, file_format="png", profile=DEFAULT_PROFILE):
+    # Everything that determines the file's bytes; a manifest entry only counts if these match
+    params = {
+        "width": width,
+        "height": height,
+        "index": index,
+        "seed": seed,
+        "generator": profile,
+        "format": file_format,
+    }
+    if file_format == "png":
+        params["compress_level"] = compress_level
+    return params
+
+def render(params):
+    # Per-image stream: the same (seed, size, index) always gives the same pixels
+    rng = np.random.default_rng([params["seed"], params["width"], params["height"], params["index"]])
+    return PROFILES[params["generator"]](rng, params["width"], params["height"])
+
+def is_current(path, entry, params, verify=False):
+    """True if `path` still holds what `entry` describes. Size and mtime decide unless `verify`;
+    the file is only hashed when its mtime moved (or the entry predates mtime tracking)."""
+    if not entry or entry.get("params") != params:
+        return False
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    if st.st_size != entry.get("size"):
+        return False
+    if not verify and st.st_mtime_ns == entry.get("mtime_ns"):
+        return True
+    return file_sha256(path) == entry.get("sha256")
+
+def manifest_entry(path, params, sha256=None):
+    st = os.stat(path)
+    return {"params": params, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha256 or file_sha256(path)}
+
+def write_image(path, params, data):
+    tmp_path = path + ".tmp"
+    if params["format"] == "raw":
+        rawimage.write_raw(tmp_path, data)
+    else:
+        from PIL import Image
+        Image.fromarray(data, 'RGBA' if data.shape[2] == 4 else 'RGB').save(tmp_path, format="PNG", compress_level=params["compress_level"])
+    os.replace(tmp_path, path)
+
+def generate_one(outputs, verify=False):
+    """Renders one image into every stale output.
+    outputs: [(path, params, manifest entry)], all with the same pixels.
+    Returns [(path, manifest entry, skipped)]."""
+    data = None
+    results = []
+    for path, params, entry in outputs:
+        if is_current(path, entry, params, verify):
+            # Refresh the stamp so a file that only needed hashing (touched, or an old entry) is not hashed again
+            results.append((path, manifest_entry(path, params, entry["sha256"]), True))
+            continue
+        if data is None:
+            data = render(params)
+        write_image(path, params, data)
+        results.append((path, manifest_entry(path, params), False))
+    return results
+
+def load_manifest(base_dir):
+    path = os.path.join(base_dir, MANIFEST_FILE)
+    try:
+        with open(path, "r") as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest.get("files", {})
+    except (OSError, ValueError):
+        pass
+    return {}
+
+def save_manifest(base_dir, files):
+    path = os.path.join(base_dir, MANIFEST_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": MANIFEST_VERSION, "files": dict(sorted(files.items()))}, f, indent=1)
+    os.replace(tmp_path, path)
+
+def generate_images(base_dir="Testcases", resolutions=DEFAULT_RESOLUTIONS, count=100, seed=0,
+                    compress_level=6, jobs=None, force=False, raw=False, profile_specs=(), verify=False):
+    os.makedirs(base_dir, exist_ok=True)
+    manifest = {} if force else load_manifest(base_dir)
+
+    formats = [("png", ".png")] + ([("raw", rawimage.EXTENSION)] if raw else [])
+    tasks = []
+    for name, width, height in resolutions:
         dir_path = os.path.join(base_dir, name)
-        if not os.path.exists(dir_path):
-            os.makedirs(dir_path)
+        os.makedirs(dir_path, exist_ok=True)
+        # Several profiles for one resolution are interleaved by index; the manifest says which is which
+        profiles = profiles_for(name, profile_specs)
+        for i in range(count):
+            profile = profiles[i % len(profiles)]
+            tasks.append([
+                (f"{name}/image_{i:03d}{extension}", image_params(width, height, i, seed, compress_level, file_format, profile))
+                for file_format, extension in formats
+            ])
 
-        print(f"Generating 100 images for {name} ({width}x{height})...")
+    total = sum(len(outputs) for outputs in tasks)
+    print(f"Generating {total} files across {len(resolutions)} resolutions...")
+
+    generated = skipped = 0
+    if not verify:
+        # Unchanged size and mtime are checked here with a stat, so an up-to-date corpus never reaches the pool
+        stale = [outputs for outputs in tasks
+                 if not all(is_current(os.path.join(base_dir, rel_path), manifest.get(rel_path), params)
+                            for rel_path, params in outputs)]
+        skipped = total - sum(len(outputs) for outputs in stale)
+        tasks = stale
+    try:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {
+                pool.submit(generate_one, [
+                    (os.path.join(base_dir, rel_path), params, manifest.get(rel_path)) for rel_path, params in outputs
+                ], verify): [rel_path for rel_path, _ in outputs]
+                for outputs in tasks
+            }
+            done = skipped
+            for future in as_completed(futures):
+                for rel_path, (_, entry, was_skipped) in zip(futures[future], future.result()):
+                    manifest[rel_path] = entry
+                    done += 1
+                    if was_skipped:
+                        skipped += 1
+                    else:
+                        generated += 1
+                    print(f"({done}/{total}) {rel_path}{' (up to date)' if was_skipped else ''}", end='\r')
+    finally:
+        # Keep whatever finished, so an interrupted run resumes where it stopped
+        save_manifest(base_dir, manifest)
 
-        for i in range(100):
-            # Generate random noise
-            # Create a numpy array of random bytes
-            data = np.random.randint(0, 255, (height, width, 3), dtype=np.uint8)
-            img = Image.fromarray(data, 'RGB')
+    print(f"\nDone. Generated {generated}, skipped {skipped} up-to-date files.")
 
-            filename = f"image_{i:03d}.png"
-            img.save(os.path.join(dir_path, filename))
+def main():
+    parser = argparse.ArgumentParser(description='Generate the image corpus under Testcases/')
+    parser.add_argument('--output', type=str, default='Testcases', help='Output directory')
+    parser.add_argument('--count', type=int, default=100, help='Images per resolution')
+    parser.add_argument('--resolution', type=parse_resolution, action='append', dest='resolutions',
+                        help='Resolution as name=WxH or a default name (480p, 720p, 1080p, 2160p); repeatable')
+    parser.add_argument('--compress-level', type=int, default=6, choices=range(10), metavar='0-9',
+                        help='PNG zlib level (1 is much faster for CI corpora)')
+    parser.add_argument('--seed', type=int, default=0, help='Base seed; each image derives its own stream from it')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--profile', type=parse_profile, action='append', dest='profiles', default=[],
+                        help=f'Content profiles joined by +, optionally for one resolution (1080p=fractal+text); '
+                             f'repeatable. Available: {", ".join(PROFILES)}')
+    parser.add_argument('--raw', action='store_true', help='Also write memory-mappable .iaraw copies (see testtools/rawimage.py)')
+    parser.add_argument('--force', action='store_true', help='Ignore the manifest and regenerate everything')
+    parser.add_argument('--verify', action='store_true',
+                        help='Re-hash existing files instead of trusting an unchanged size and mtime')
+    args = parser.parse_args()
 
-    print("Done.")
+    generate_images(args.output, args.resolutions or DEFAULT_RESOLUTIONS, args.count, args.seed,
+                    args.compress_level, args.jobs, args.force, args.raw, args.profiles, args.verify)
 
 if __name__ == "__main__":
     try:
@@ -40,6 +346,6 @@ if __name__ == "__main__":
         import PIL
     except ImportError:
         print("Please install numpy and pillow: pip install numpy pillow")
-        exit(1)
+        sys.exit(1)
 
-    generate_images()
+    main()
@@ -0,0 +1,81 @@
+import argparse
+
+import pytest
+
+from testtools import adaptive
+
+def test_wilson_interval_known_values():
+    low, high = adaptive.wilson_interval(0, 10)
+    assert low == pytest.approx(0.0)
+    assert high == pytest.approx(0.2775, abs=1e-4)
+    low, high = adaptive.wilson_interval(5, 10)
+    assert (low, high) == pytest.approx((0.2366, 0.7634), abs=1e-4)
+    assert adaptive.wilson_interval(0, 0) == (0.0, 1.0)
+
+def test_runs_to_clear_matches_the_interval():
+    runs = adaptive.runs_to_clear(0.05)
+    assert adaptive.wilson_interval(0, runs)[1] < 0.05
+    assert adaptive.wilson_interval(0, runs - 1)[1] >= 0.05
+
+def test_robust_cv():
+    assert adaptive.robust_cv([1.0, 1.0]) == 0.0
+    assert adaptive.robust_cv([10.0, 10.0, 10.0, 10.0]) == 0.0
+    # One wild sample barely moves the robust spread
+    assert adaptive.robust_cv([10.0, 11.0, 9.0, 10.0, 1000.0]) == pytest.approx(0.14826)
+
+def run(scheduler, fails, limit=1000):
+    while scheduler.pending() and limit:
+        index = scheduler.next()
+        if index is None:
+            break
+        scheduler.record(index, fails(index), 1.0)
+        limit -= 1
+
+def test_scheduler_covers_min_runs_first():
+    scheduler = adaptive.Scheduler(3, min_runs=2)
+    order = []
+    for _ in range(6):
+        index = scheduler.next()
+        order.append(index)
+        scheduler.record(index, False, 1.0)
+    assert order == [0, 1, 2, 0, 1, 2]
+
+def test_scheduler_clears_passing_and_flags_flaky_items():
+    scheduler = adaptive.Scheduler(2, target=0.05, min_runs=10, max_runs=200)
+    counter = {"runs": 0}
+
+    def fails(index):
+        counter["runs"] += 1
+        return index == 1 and counter["runs"] % 2 == 0
+
+    run(scheduler, fails)
+    assert scheduler.items[0].status == adaptive.STATUS_CLEARED
+    assert scheduler.items[0].runs == adaptive.runs_to_clear(0.05)
+    assert scheduler.items[1].status == adaptive.STATUS_FLAKY
+    total, counts = scheduler.summary()
+    assert total == sum(s.runs for s in scheduler.items)
+    assert counts == {adaptive.STATUS_CLEARED: 1, adaptive.STATUS_FLAKY: 1}
+
+def test_scheduler_stops_at_max_runs():
+    scheduler = adaptive.Scheduler(1, target=0.05, min_runs=5, max_runs=20)
+    # Fails 5% of the time: never clearly above or below the target
+    run(scheduler, lambda _: scheduler.items[0].runs % 20 == 0)
+    assert scheduler.items[0].status == adaptive.STATUS_MAX_RUNS
+    assert scheduler.items[0].runs == 20
+
+def test_parse_duration():
+    assert adaptive.parse_duration("90") == 90.0
+    assert adaptive.parse_duration("30m") == 1800.0
+    assert adaptive.parse_duration("2h") == 7200.0
+    with pytest.raises(argparse.ArgumentTypeError):
+        adaptive.parse_duration("soon")
+
+def test_scheduler_clears_after_an_early_failure():
+    scheduler = adaptive.Scheduler(1, target=0.05, min_runs=10, max_runs=500)
+    scheduler.record(scheduler.next(), True, 1.0)
+    run(scheduler, lambda _: False)
+    stats = scheduler.items[0]
+    assert stats.status == adaptive.STATUS_CLEARED
+    assert stats.failures == 1
+    assert stats.runs < 500
+    assert adaptive.wilson_interval(1, stats.runs)[1] < 0.05 <= adaptive.wilson_interval(1, stats.runs - 1)[1]
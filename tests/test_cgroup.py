@@ -0,0 +1,71 @@
+import io
+import os
+
+import pytest
+
+from testtools import cgroup
+
+MOUNTINFO = """22 1 0:21 / /proc rw,nosuid,nodev,noexec,relatime shared:12 - proc proc rw
+25 1 0:23 / /sys/fs/cgroup rw,nosuid,nodev,noexec,relatime shared:4 - cgroup2 cgroup2 rw,nsdelegate
+"""
+PROC_CGROUP = "0::/user.slice/user-1000.slice/runner.scope\n"
+
+@pytest.mark.parametrize("text,size", [
+    ("1073741824", 1 << 30), ("16G", 16 << 30), ("512M", 512 << 20), ("512mb", 512 << 20), ("1.5K", 1536),
+])
+def test_parse_size(text, size):
+    assert cgroup.parse_size(text) == size
+
+@pytest.fixture
+def proc_files(monkeypatch):
+    files = {"/proc/self/mountinfo": MOUNTINFO, "/proc/self/cgroup": PROC_CGROUP}
+    real_open = open
+
+    def fake_open(path, *args, **kwargs):
+        return io.StringIO(files[path]) if path in files else real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr(cgroup, "open", fake_open, raising=False)
+    return files
+
+def test_finds_mount_and_own_cgroup(proc_files):
+    assert cgroup._cgroup2_mount() == "/sys/fs/cgroup"
+    assert cgroup._own_cgroup() == "/user.slice/user-1000.slice/runner.scope"
+    proc_files["/proc/self/mountinfo"] = MOUNTINFO.splitlines()[0] + "\n"
+    assert cgroup._cgroup2_mount() is None
+
+def test_test_cgroup_reads_peak_and_events(tmp_path):
+    test = cgroup.TestCgroup(str(tmp_path / "ia-test-1"), memory_max=512 * cgroup.MB)
+    assert (tmp_path / "ia-test-1" / "memory.max").read_text() == str(512 * cgroup.MB)
+    assert test.peak_mb() is None
+    (tmp_path / "ia-test-1" / "memory.peak").write_text(f"{300 * cgroup.MB}\n")
+    (tmp_path / "ia-test-1" / "memory.events").write_text("low 0\nhigh 0\nmax 12\noom 1\noom_kill 1\n")
+    assert test.peak_mb() == 300.0
+    assert test.events() == {"low": 0, "high": 0, "max": 12, "oom": 1, "oom_kill": 1}
+
+@pytest.fixture
+def hierarchy(tmp_path, proc_files, monkeypatch):
+    proc_files["/proc/self/mountinfo"] = MOUNTINFO.replace("/sys/fs/cgroup", str(tmp_path))
+    scope = tmp_path / "user.slice" / "user-1000.slice" / "runner.scope"
+    scope.mkdir(parents=True)
+    (scope / "cgroup.controllers").write_text("cpu io memory pids\n")
+    (scope / "cgroup.subtree_control").write_text("\n")
+    (scope / "cgroup.procs").write_text("")
+    return scope
+
+def test_parent_moves_runner_into_a_leaf_before_enabling_memory(hierarchy):
+    manager = cgroup.CgroupManager.create(log=pytest.fail)
+    assert manager.parent == str(hierarchy)
+    assert (hierarchy / "cgroup.subtree_control").read_text() == "+memory"
+    assert (hierarchy / f"ia-runner-{os.getpid()}" / "cgroup.procs").read_text() == str(os.getpid())
+    child = manager.new_test_cgroup()
+    assert os.path.isdir(child.path) and os.path.dirname(child.path) == str(hierarchy)
+
+def test_missing_memory_controller_falls_back(hierarchy):
+    (hierarchy / "cgroup.controllers").write_text("cpu pids\n")
+    messages = []
+    assert cgroup.CgroupManager.create(log=messages.append) is None
+    assert "memory controller not delegated" in messages[0]
+
+def test_env_for_cgroup_disables_build_servers():
+    env = cgroup.env_for_cgroup({"PATH": "/usr/bin"})
+    assert env == {"PATH": "/usr/bin", "MSBUILDDISABLENODEREUSE": "1", "DOTNET_CLI_USE_MSBUILD_SERVER": "0"}
@@ -0,0 +1,69 @@
+import os
+import subprocess
+
+import pytest
+
+from testtools import discovery
+
+LISTING = "Build started\nThe following Tests are available:\n    Ns.Class.TestA\n    Ns.Class.TestB\n"
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.setattr(discovery, "CACHE_FILE", str(tmp_path / "cache.json"))
+    source = tmp_path / "Fake.Tests"
+    output = source / "bin" / "Debug" / "net8.0"
+    output.mkdir(parents=True)
+    (source / "Fake.Tests.csproj").write_text('<Project><ItemGroup><None Include="cases.json" /></ItemGroup></Project>')
+    (source / "Tests.cs").write_text("class Tests {}")
+    (source / "cases.json").write_text("[]")
+    (source / "unrelated.json").write_text("{}")
+    for name in ("Fake.Tests.dll", "Dependency.dll", "Fake.Tests.deps.json"):
+        (output / name).write_bytes(name.encode())
+    # Outputs newer than every source
+    for path in output.iterdir():
+        os.utime(path, ns=(2_000_000_000_000_000_000, 2_000_000_000_000_000_000))
+    return str(source / "Fake.Tests.csproj"), output
+
+@pytest.fixture
+def listings(monkeypatch):
+    calls = []
+
+    def run(command, **kwargs):
+        calls.append(command)
+        return subprocess.CompletedProcess(command, 0, stdout=LISTING, stderr="")
+
+    monkeypatch.setattr(discovery.subprocess, "run", run)
+    monkeypatch.setattr(discovery.host, "build_project", lambda *a: pytest.fail("unexpected build"))
+    return calls
+
+def test_parse_list_output():
+    assert discovery.parse_list_output(LISTING) == ["Ns.Class.TestA", "Ns.Class.TestB"]
+    assert discovery.parse_list_output("error: no tests\n") == []
+
+def test_cache_hit_does_not_hash(project, listings, monkeypatch):
+    path, _ = project
+    assert discovery.discover_tests(path, log=lambda _: None) == ["Ns.Class.TestA", "Ns.Class.TestB"]
+    monkeypatch.setattr(discovery, "assembly_key", lambda _: pytest.fail("hashed on an unchanged stamp"))
+    assert discovery.discover_tests(path, log=lambda _: None) == ["Ns.Class.TestA", "Ns.Class.TestB"]
+    assert len(listings) == 1
+
+def test_touched_but_identical_assembly_is_rehashed_not_relisted(project, listings):
+    path, output = project
+    discovery.discover_tests(path, log=lambda _: None)
+    os.utime(output / "Dependency.dll", ns=(2_000_000_000_000_000_001, 2_000_000_000_000_000_001))
+    discovery.discover_tests(path, log=lambda _: None)
+    assert len(listings) == 1
+    (output / "Dependency.dll").write_bytes(b"changed")
+    os.utime(output / "Dependency.dll", ns=(2_000_000_000_000_000_002, 2_000_000_000_000_000_002))
+    discovery.discover_tests(path, log=lambda _: None)
+    assert len(listings) == 2
+
+def test_only_build_inputs_make_the_assembly_stale(project):
+    path, output = project
+    source = os.path.dirname(path)
+    newest = discovery._newest_source_mtime(path)
+    later = newest + 100
+    os.utime(os.path.join(source, "unrelated.json"), (later, later))
+    assert discovery._newest_source_mtime(path) == newest
+    os.utime(os.path.join(source, "cases.json"), (later, later))
+    assert discovery._newest_source_mtime(path) == later
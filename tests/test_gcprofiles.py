@@ -0,0 +1,43 @@
+import argparse
+
+import pytest
+
+from testtools import gcprofiles
+
+def test_presets():
+    assert gcprofiles.parse_profile("default") == gcprofiles.GcProfile("default", {})
+    assert gcprofiles.parse_profile("server-nonconcurrent").env == {"DOTNET_gcServer": "1", "DOTNET_gcConcurrent": "0"}
+
+def test_custom_profile_writes_numbers_in_hex():
+    profile = gcprofiles.parse_profile("srv12:server=1, heaps=12, hard-limit=8G, conserve=5")
+    assert profile.name == "srv12"
+    assert profile.env == {
+        "DOTNET_gcServer": "1",
+        "DOTNET_GCHeapCount": "C",
+        "DOTNET_GCHeapHardLimit": "200000000",
+        "DOTNET_GCConserveMemory": "5",
+    }
+
+@pytest.mark.parametrize("spec", ["nope", "x:server=2", "x:conserve=10", "x:heaps", "x:pinned=1", "x:heaps=four"])
+def test_rejects_bad_profiles(spec):
+    with pytest.raises(argparse.ArgumentTypeError):
+        gcprofiles.parse_profile(spec)
+
+def test_is_oom():
+    assert gcprofiles.is_oom({"OomKills": "1"})
+    assert gcprofiles.is_oom({"OomKills": "", "Error": "System.OutOfMemoryException: ..."})
+    assert not gcprofiles.is_oom({"OomKills": "0", "Error": "Assert.Equal() Failure"})
+
+def test_report(tmp_path, capsys):
+    def row(profile, result, max_mb, duration, oom=""):
+        return {"Test": "Ns.Class.Test", "GcProfile": profile, "Result": result, "MaxMB": max_mb,
+                "DurationS": duration, "OomKills": oom}
+
+    rows = [row("default", "Pass", "900", "2.0"), row("default", "Pass", "1000", "3.0"),
+            row("server", "Fail", "1500", "9.0", oom="1"), row("server", "Pass", "1300", "1.5")]
+    path = tmp_path / "gc.csv"
+    gcprofiles.report(rows, [gcprofiles.parse_profile("default"), gcprofiles.parse_profile("server")], str(path))
+    out = capsys.readouterr().out
+    assert "server  | 1/2 pass |   1400.00 MB |     1.50 s  OOM x1" in out
+    assert path.read_text().splitlines()[1:] == ["Ns.Class.Test,default,2,2,0,950.0,2.5",
+                                                 "Ns.Class.Test,server,2,1,1,1400.0,1.5"]
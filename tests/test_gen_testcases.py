@@ -0,0 +1,75 @@
+import argparse
+import os
+
+import numpy as np
+import pytest
+
+import gen_testcases as gen
+
+def test_parse_profile():
+    assert gen.parse_profile("gradient+text") == ("", ["gradient", "text"])
+    assert gen.parse_profile("1080p=fractal+alpha") == ("1080p", ["fractal", "alpha"])
+
+@pytest.mark.parametrize("spec", ["sparkles", "noise+sparkles", "720p=", ""])
+def test_parse_profile_rejects_unknown(spec):
+    with pytest.raises(argparse.ArgumentTypeError):
+        gen.parse_profile(spec)
+
+def test_profiles_for_prefers_resolution_specs():
+    specs = [("1080p", ["fractal"]), ("", ["gradient", "text"])]
+    assert gen.profiles_for("1080p", specs) == ["fractal"]
+    assert gen.profiles_for("480p", specs) == ["gradient", "text"]
+    assert gen.profiles_for("480p", []) == [gen.DEFAULT_PROFILE]
+
+def test_image_params():
+    assert gen.image_params(64, 48, 3, 7, 1, profile="flat") == {
+        "width": 64, "height": 48, "index": 3, "seed": 7, "generator": "flat", "format": "png", "compress_level": 1,
+    }
+    # The zlib level does not change raw bytes, so it is not part of their identity
+    assert "compress_level" not in gen.image_params(64, 48, 3, 7, 1, "raw")
+
+@pytest.mark.parametrize("profile", list(gen.PROFILES))
+def test_render_is_deterministic(profile):
+    params = gen.image_params(64, 48, 2, 11, 6, profile=profile)
+    first = gen.render(params)
+    channels = 4 if profile == "alpha" else 3
+    assert first.shape == (48, 64, channels)
+    assert first.dtype == np.uint8
+    assert np.array_equal(first, gen.render(params))
+    assert not np.array_equal(first, gen.render(dict(params, index=3)))
+
+def test_is_current_follows_size_mtime_and_hash(tmp_path):
+    path = str(tmp_path / "image.iaraw")
+    params = gen.image_params(16, 8, 0, 0, 6, "raw", "gradient")
+    gen.write_image(path, params, gen.render(params))
+    entry = gen.manifest_entry(path, params)
+    assert gen.is_current(path, entry, params)
+    assert not gen.is_current(path, entry, dict(params, seed=1))
+    assert not gen.is_current(path, None, params)
+
+    # Touched but unchanged: the hash still matches
+    os.utime(path, ns=(1, 1))
+    assert gen.is_current(path, entry, params)
+
+    with open(path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xff]))
+    os.utime(path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+    # Same size and mtime is trusted unless asked to verify
+    assert gen.is_current(path, entry, params)
+    assert not gen.is_current(path, entry, params, verify=True)
+
+def test_generate_images_skips_up_to_date_files(tmp_path, capsys):
+    base = str(tmp_path / "corpus")
+    specs = [gen.parse_profile("flat+text")]
+    gen.generate_images(base, [("tiny", 32, 24)], count=3, jobs=1, profile_specs=specs)
+    manifest = gen.load_manifest(base)
+    assert sorted(manifest) == ["tiny/image_000.png", "tiny/image_001.png", "tiny/image_002.png"]
+    assert [manifest[f"tiny/image_{i:03d}.png"]["params"]["generator"] for i in range(3)] == ["flat", "text", "flat"]
+
+    capsys.readouterr()
+    gen.generate_images(base, [("tiny", 32, 24)], count=3, jobs=1, profile_specs=specs)
+    assert "Generated 0, skipped 3" in capsys.readouterr().out
+    assert gen.load_manifest(base) == manifest
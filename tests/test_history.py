@@ -0,0 +1,81 @@
+import sqlite3
+
+import pytest
+
+from testtools import history
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    commits = iter([("a" * 40, "main", 0), ("b" * 40, "main", 1), ("b" * 40, "main", 0)])
+    monkeypatch.setattr(history, "git_state", lambda directory=None: next(commits))
+    return str(tmp_path / "history.db")
+
+def record(path, runner, rows):
+    with history.HistoryWriter(path, runner, command="test") as writer:
+        for test, passed, duration, max_mb in rows:
+            writer.add(test, passed, duration=duration, max_mb=max_mb)
+        return writer.run_id
+
+def fill(path):
+    record(path, "RunTests", [("Ns.A.Slow", True, 9.0, 100.0), ("Ns.A.Flaky", False, 1.0, 50.0),
+                              ("Ns.A.Flaky", True, 1.0, 50.0)])
+    record(path, "RunMemoryTests", [("Ns.A.Slow", True, 11.0, 400.0), ("Ns.A.Big", True, 2.0, 900.0)])
+    record(path, "RunTests", [("Ns.A.Slow", True, 10.0, 110.0), ("Ns.A.Flaky", True, 1.0, 50.0)])
+    return history.connect(path)
+
+def test_results_are_buffered_until_flush(db, monkeypatch):
+    monkeypatch.setattr(history, "FLUSH_ROWS", 3)
+    monkeypatch.setattr(history, "FLUSH_SECONDS", 3600)
+    writer = history.HistoryWriter(db, "RunTests")
+    reader = sqlite3.connect(db)
+    count = lambda: reader.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+    writer.add("Ns.A.T", True)
+    writer.add("Ns.A.T", True)
+    assert count() == 0
+    writer.add("Ns.A.T", False)
+    assert count() == 3
+    writer.add("Ns.A.T", True)
+    writer.close()
+    assert count() == 4
+
+def test_memory_rows_fold_profile_and_cores_into_config(db):
+    with history.HistoryWriter(db, "RunMemoryTests") as writer:
+        writer.add_memory_row({"Test": "Ns.A.T", "Result": "Pass", "Config": "BatchSize=8", "GcProfile": "server",
+                               "Cores": "4", "Run": "2", "DurationS": "1.5", "MaxMB": "300", "AvgMB": "", "CpuS": "",
+                               "ImagesPerS": "3.0", "Error": ""})
+    row = history.connect(db).execute("SELECT config, iteration, passed, duration_s, avg_mb, error FROM results").fetchone()
+    assert row == ("BatchSize=8,GC=server,Cores=4", 2, 1, 1.5, None, None)
+
+def test_resolve_tests(db):
+    conn = fill(db)
+    assert history.resolve_tests(conn, "Ns.A.Slow") == ["Ns.A.Slow"]
+    assert history.resolve_tests(conn, "Flaky") == ["Ns.A.Flaky"]
+    assert history.resolve_tests(conn, "A.") == ["Ns.A.Big", "Ns.A.Flaky", "Ns.A.Slow"]
+
+def test_trend_per_run_and_per_commit(db):
+    conn = fill(db)
+    per_run = history.trend(conn, "Ns.A.Slow")
+    assert [row[1:] for row in per_run] == [(1, 1, 110.0, 110.0, 10.0, 10.0), (1, 1, 400.0, 400.0, 11.0, 11.0),
+                                            (1, 1, 100.0, 100.0, 9.0, 9.0)]
+    assert per_run[0][0].startswith("3 ")
+    per_commit = history.trend(conn, "Ns.A.Slow", by_commit=True)
+    # The second commit was recorded once with a dirty tree
+    assert per_commit == [("b" * 10 + "+", 2, 2, 255.0, 400.0, 10.5, 11.0), ("a" * 10, 1, 1, 100.0, 100.0, 9.0, 9.0)]
+
+def test_top_rankings(db):
+    conn = fill(db)
+    assert [row[0] for row in history.top(conn, "duration")] == ["Ns.A.Slow", "Ns.A.Big", "Ns.A.Flaky"]
+    assert [row[0] for row in history.top(conn, "memory", limit=1)] == ["Ns.A.Big"]
+    assert [(row[0], row[2], row[3]) for row in history.top(conn, "failures")] == [("Ns.A.Flaky", 3, 2 / 3)]
+    # The failure was in the first run only
+    assert history.top(conn, "failures", last_runs=2) == []
+    assert [row[0] for row in history.top(conn, "memory", runner="RunTests")] == ["Ns.A.Slow", "Ns.A.Flaky"]
+    assert [row[2] for row in history.top(conn, "duration", last_runs=1, runner="RunTests")] == [1, 1]
+
+def test_recent_runs(db):
+    conn = fill(db)
+    runs = history.recent_runs(conn)
+    assert [(r[0], r[2], r[3], r[5], r[6]) for r in runs] == [
+        (3, "RunTests", "b" * 10, 2, 2), (2, "RunMemoryTests", "b" * 10 + "+", 2, 2), (1, "RunTests", "a" * 10, 3, 2)]
+    fingerprint, _ = history.host_fingerprint()
+    assert {r[4] for r in runs} == {fingerprint}
@@ -0,0 +1,49 @@
+import os
+import subprocess
+
+import pytest
+
+from testtools import host
+
+def test_batch_filter_and_chunks():
+    assert host.batch_filter(["Ns.A.T0", "Ns.A.T1"]) == "FullyQualifiedName=Ns.A.T0|FullyQualifiedName=Ns.A.T1"
+    assert host.chunked([1, 2, 3, 4, 5], 2) == [[1, 2], [3, 4], [5]]
+    assert host.chunked([1, 2], 0) == [[1], [2]]
+
+def test_assembly_test_command():
+    assert host.assembly_test_command("/out/Fake.Tests.dll", "r.trx", "FullyQualifiedName=Ns.A.T0", serial=True) == [
+        "dotnet", "test", "/out/Fake.Tests.dll", "--logger", "trx;LogFileName=r.trx",
+        "--filter", "FullyQualifiedName=Ns.A.T0", "--", "xUnit.ParallelizeTestCollections=false"]
+    assert host.assembly_test_command("/out/Fake.Tests.dll", "r.trx") == [
+        "dotnet", "test", "/out/Fake.Tests.dll", "--logger", "trx;LogFileName=r.trx"]
+
+def test_attribute_samples_uses_windows_and_nearest_sample():
+    samples = [(10.0, 100.0), (11.0, 300.0), (12.0, 200.0), (20.0, 50.0)]
+    windows = {"long": (10.0, 12.0), "short": (19.2, 19.3), "unknown": (None, None)}
+    assert host.attribute_samples(samples, windows) == {"long": [100.0, 300.0, 200.0], "short": [50.0]}
+    assert host.attribute_samples([], windows) == {}
+
+def completed(stdout="", returncode=0):
+    return lambda cmd, **kwargs: subprocess.CompletedProcess(cmd, returncode, stdout=stdout, stderr="boom")
+
+def test_resolve_test_assembly(tmp_path, monkeypatch):
+    project = tmp_path / "Fake.Tests" / "Fake.Tests.csproj"
+    output = tmp_path / "Fake.Tests" / "bin" / "Release" / "net8.0"
+    output.mkdir(parents=True)
+    project.write_text("<Project />")
+    dll = output / "Fake.Tests.dll"
+    dll.write_bytes(b"")
+
+    monkeypatch.setattr(host.subprocess, "run", completed(f"MSBuild version 17\n{dll}\n"))
+    assert host.resolve_test_assembly(str(project), "Release") == str(dll)
+    # SDKs without -getProperty fail; the bin/ layout is used instead
+    monkeypatch.setattr(host.subprocess, "run", completed(returncode=1))
+    assert host.resolve_test_assembly(str(project), "Release") == str(dll)
+    os.remove(dll)
+    with pytest.raises(host.BuildError):
+        host.resolve_test_assembly(str(project), "Release")
+
+def test_build_failure_raises(monkeypatch):
+    monkeypatch.setattr(host.subprocess, "run", completed(returncode=1))
+    with pytest.raises(host.BuildError, match="boom"):
+        host.build_project("Fake.Tests.csproj", "Debug")
@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from testtools import leak
+
+def sawtooth(cycles, base=100.0, peak=60.0, growth=0.0, noise=0.0, seed=0):
+    """Samples of a process that loads a shipment and releases it `cycles` times, retaining `growth` MB per cycle."""
+    rng = random.Random(seed)
+    values = []
+    for cycle in range(cycles):
+        floor = base + growth * cycle
+        values += [floor + peak * step / 5 + rng.uniform(-noise, noise) for step in range(6)]
+        values += [floor + peak * (1 - step / 3) + rng.uniform(-noise, noise) for step in range(1, 4)]
+    return values
+
+def test_post_cycle_baselines_finds_each_trough():
+    troughs = leak.post_cycle_baselines(sawtooth(5, growth=2.0))
+    assert troughs == pytest.approx([100.0, 102.0, 104.0, 106.0, 108.0])
+
+def test_post_cycle_baselines_needs_a_series():
+    assert leak.post_cycle_baselines([1.0, 2.0]) == []
+    assert leak.post_cycle_baselines([5.0] * 10) == []
+
+def test_theil_sen_ignores_an_outlier():
+    ys = [10.0 + 2.0 * i for i in range(20)]
+    ys[7] = 500.0
+    assert leak.theil_sen_slope(ys) == pytest.approx(2.0)
+
+def test_mann_kendall_direction():
+    assert leak.mann_kendall_p([float(i) for i in range(12)]) < 0.001
+    assert leak.mann_kendall_p([float(-i) for i in range(12)]) > 0.999
+    assert leak.mann_kendall_p([3.0] * 12) == 1.0
+
+def test_fisher_combine():
+    assert leak.fisher_combine([0.5]) == pytest.approx(0.5)
+    assert leak.fisher_combine([]) == 1.0
+    # Two independent weak signals are stronger together
+    assert leak.fisher_combine([0.1, 0.1]) < 0.1
+
+def test_growing_baselines_are_a_leak():
+    result = leak.assess([leak.post_cycle_baselines(sawtooth(12, growth=2.0, noise=0.3))])
+    assert result.verdict == leak.VERDICT_LEAK
+    assert result.bytes_per_step == pytest.approx(2.0 * leak.MB, rel=0.2)
+
+def test_flat_noisy_baselines_are_stable():
+    result = leak.assess([leak.post_cycle_baselines(sawtooth(12, noise=0.3, seed=seed)) for seed in range(3)])
+    assert result.verdict == leak.VERDICT_STABLE
+
+def test_tiny_significant_growth_is_not_a_leak():
+    # Significant but below min_growth_mb over the run
+    result = leak.assess([[100.0 + 0.01 * i for i in range(10)]])
+    assert result.p_value < 0.05
+    assert result.verdict == leak.VERDICT_STABLE
+
+def test_short_series_are_unknown():
+    assert leak.assess([[1.0, 2.0, 3.0]]) == leak.UNKNOWN
+
+def test_worst_prefers_leak():
+    stable = leak.LeakResult(leak.VERDICT_STABLE, 0.0, 0.5, 10)
+    leaking = leak.LeakResult(leak.VERDICT_LEAK, 1.0, 0.01, 10)
+    assert leak.worst(stable, leak.UNKNOWN, leaking) is leaking
@@ -0,0 +1,127 @@
+import json
+import socket
+import urllib.error
+import urllib.request
+
+import pytest
+
+from testtools import livefeed, procmem
+
+def families(text):
+    """{family: (type, [(sample name, labels, value)])}; fails on anything the text format does not allow."""
+    found = {}
+    current = None
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            continue
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            assert name not in found, f"{name} declared twice"
+            found[name] = (kind, [])
+            current = name
+            continue
+        sample, value = line.rsplit(" ", 1)
+        name, labels = sample.split("{", 1)
+        suffixes = ("_sum", "_count") if found[current][0] == "summary" else ("",)
+        assert any(name == current + s for s in suffixes), f"{name} outside its family {current}"
+        found[current][1].append((name, "{" + labels, float(value)))
+    return found
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(livefeed.time, "time", lambda: now[0])
+    return now
+
+def sample(t, rss, pss, testhost, cpu=0.0):
+    return procmem.MemorySample(t, rss, pss, pss, {procmem.ROLE_TESTHOST: testhost}, cpu)
+
+def test_render(clock):
+    metrics = livefeed.LiveMetrics("RunTests")
+    metrics.planned = 4
+    metrics.test_finished(True, 1.5)
+    metrics.test_finished(False, 0.25)
+    metrics.test_finished(True, None)
+    metrics.update_memory("a", 100.0, 80.0, 60.0)
+    metrics.update_memory("b", 50.0, 40.0, 0.0)
+    metrics.launch_finished("b")
+    clock[0] = 1010.0
+
+    text = metrics.render()
+    parsed = families(text)
+    assert parsed["testrun_test_duration_seconds"] == ("summary", [
+        ("testrun_test_duration_seconds_sum", '{runner="RunTests"}', 1.75),
+        ("testrun_test_duration_seconds_count", '{runner="RunTests"}', 2.0)])
+    assert parsed["testrun_tests_total"] == ("counter", [
+        ("testrun_tests_total", '{runner="RunTests",result="passed"}', 2.0),
+        ("testrun_tests_total", '{runner="RunTests",result="failed"}', 1.0)])
+    assert 'testrun_progress_ratio{runner="RunTests"} 0.25' in text
+    # 10 s for one of four launches
+    assert 'testrun_eta_seconds{runner="RunTests"} 30' in text
+    assert f'testrun_pss_bytes{{runner="RunTests"}} {80 * procmem.MB}' in text
+    assert f'testrun_peak_pss_bytes{{runner="RunTests"}} {80 * procmem.MB}' in text
+    assert 'testrun_active_launches{runner="RunTests"} 1' in text
+    assert text.endswith("\n")
+
+def test_render_without_plan_omits_progress(clock):
+    parsed = families(livefeed.LiveMetrics("RunMemoryTests").render())
+    assert "testrun_progress_ratio" not in parsed and "testrun_eta_seconds" not in parsed
+    assert parsed["testrun_test_duration_seconds"][1][1][2] == 0.0
+
+def test_eta_prefers_the_deadline(clock):
+    metrics = livefeed.LiveMetrics("RunTests")
+    metrics.planned, metrics.deadline = 10, 1100.0
+    assert metrics.eta(1040.0) == 60.0
+
+def test_event_stream_windows_memory_and_flushes_per_launch(tmp_path, clock):
+    path = tmp_path / "events.jsonl"
+    feed = livefeed.LiveFeed("RunMemoryTests", events=str(path))
+    feed.start(planned=1, tests=1)
+    launch = feed.launch("Ns.A.T")
+    for i in range(25):
+        launch.sample(sample(1000.0 + i * 0.1, 100.0 + i, 80.0 + i, 50.0, cpu=i * 0.01))
+    feed.test_finished("Ns.A.T", False, duration=2.5, max_mb=104.0, error="Boom\n   at Stack.Trace()")
+    launch.close(ok=False)
+    feed.close()
+
+    events = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [e["event"] for e in events] == ["start", "memory", "memory", "test", "memory", "launch", "end"]
+    first = events[1]
+    assert (first["samples"], first["pss_mb"], first["window_s"]) == (11, 90.0, 1.0)
+    assert events[3]["error"] == "Boom" and events[3]["result"] == "Fail"
+    assert events[5]["ok"] is False
+    assert events[6]["failed"] == 1 and events[6]["launches"] == 1
+
+def test_unix_socket_stream(tmp_path):
+    path = str(tmp_path / "feed.sock")
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+    stream = livefeed.EventStream("unix:" + path)
+    conn, _ = server.accept()
+    stream.emit("start", runner="RunTests")
+    stream.close()
+    data = b""
+    while chunk := conn.recv(4096):
+        data += chunk
+    conn.close()
+    server.close()
+    assert json.loads(data)["runner"] == "RunTests"
+
+def test_metrics_endpoint():
+    feed = livefeed.LiveFeed("RunTests", metrics_port=0)
+    try:
+        with urllib.request.urlopen(feed.url, timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert "testrun_tests_total" in families(response.read().decode())
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(feed.url.replace("/metrics", "/other"), timeout=5)
+    finally:
+        feed.close()
+
+def test_chain():
+    seen = []
+    assert livefeed.chain(None, None) is None
+    assert livefeed.chain(seen.append, None) == seen.append
+    livefeed.chain(seen.append, lambda s: seen.append(s * 2))(3)
+    assert seen == [3, 6]
@@ -0,0 +1,85 @@
+import argparse
+
+import pytest
+
+from testtools import memmodel
+from testtools.variants import Variant
+
+VARIANTS = {
+    "LowRes_Small": Variant("LowRes_Small", "LowRes", "Small", 640, 480, 20, 4),
+    "MidRes_Medium": Variant("MidRes_Medium", "MidRes", "Medium", 1280, 720, 50, 10),
+    "HighRes_Large": Variant("HighRes_Large", "HighRes", "Large", 1920, 1080, 100, 16),
+    "HighRes_Extreme": Variant("HighRes_Extreme", "HighRes", "Extreme", 1920, 1080, 200, 24),
+}
+TRUE_MODEL = memmodel.Model(100.0, 3.0, 0.5, 0)
+
+def row(test, max_mb, config="default", result="Pass", gc="default"):
+    return {"Test": test, "MaxMB": str(max_mb), "Config": config, "Result": result, "GcProfile": gc}
+
+def measured_rows(model=TRUE_MODEL):
+    rows = []
+    for name, variant in VARIANTS.items():
+        mpx = variant.width * variant.height / 1e6
+        for method, width in (("Topology_Chain", 1), ("Topology_FanOut", 2)):
+            peak = memmodel.predict(model, mpx, variant.batch_size, width, variant.items)
+            rows.append(row(f"Ns.{name}.{method}", peak))
+    return rows
+
+def test_effective_batch_prefers_swept_setting():
+    variant = VARIANTS["LowRes_Small"]
+    assert memmodel.effective_batch("default", variant) == 4
+    assert memmodel.effective_batch("MaxDegreeOfParallelism=2,MaxShipmentSize=12", variant) == 12
+    assert memmodel.effective_batch("BatchSize=x", variant) == 4
+
+def test_load_points_takes_median_of_passing_default_gc_rows():
+    test = "Ns.LowRes_Small.Topology_FanOut"
+    rows = [row(test, 100), row(test, 300), row(test, 120), row(test, 900, result="Fail"),
+            row(test, 900, gc="Server"), row("Ns.Unknown.Topology_Chain", 50),
+            row(test, 200, config="MaxShipmentSize=12")]
+    points = memmodel.load_points(rows, VARIANTS)
+    assert [(p.config, p.batch, p.width, p.max_mb) for p in points] == [
+        ("MaxShipmentSize=12", 12, 2, 200.0), ("default", 4, 2, 120.0)]
+
+def test_fit_recovers_the_model():
+    model = memmodel.fit(memmodel.load_points(measured_rows(), VARIANTS))
+    assert (model.baseline, model.in_flight, model.retained) == pytest.approx((100.0, 3.0, 0.5))
+    assert model.points == 8
+    assert memmodel.safety_margin(memmodel.load_points(measured_rows(), VARIANTS)) == pytest.approx(0.0, abs=1e-9)
+
+def test_fit_drops_negative_slopes():
+    model = memmodel.fit(memmodel.load_points(measured_rows(memmodel.Model(500.0, 2.0, -0.1, 0)), VARIANTS))
+    assert model.retained == 0.0
+    assert model.in_flight > 0
+
+def test_fit_needs_enough_points():
+    with pytest.raises(ValueError):
+        memmodel.fit(memmodel.load_points(measured_rows()[:3], VARIANTS))
+
+def test_residuals_sign():
+    points = memmodel.load_points(measured_rows(), VARIANTS)
+    high = TRUE_MODEL._replace(baseline=200.0)
+    errors = memmodel.residuals(high, points)
+    assert all(rel > 0 for _, _, rel in errors)
+    summary = memmodel.error_summary(errors)
+    assert summary["mae_mb"] == pytest.approx(100.0)
+    assert summary["worst_under"] < 0 < summary["worst_over"]
+
+def test_largest_batch():
+    # 90% of 1000 MB, 100 MB baseline, 3 MB/Mpx x 2 Mpx per image in flight -> (900 - 100) / 6
+    model = TRUE_MODEL
+    assert memmodel.largest_batch(model, 2.0, 1, 1000, items=10) == 10
+    assert memmodel.largest_batch(model, 2.0, 1, 1000) == 133
+    assert memmodel.largest_batch(model, 2.0, 1, 1000, margin=0.5) == 83
+    assert memmodel.largest_batch(model, 2.0, 1, 100) == 0
+    assert memmodel.largest_batch(model._replace(in_flight=0.0), 2.0, 1, 1000) is None
+
+def test_parse_resolution_and_topology():
+    assert memmodel.parse_resolution("800x600") == (800, 600)
+    assert memmodel.parse_resolution("4K") == (3840, 2160)
+    assert memmodel.parse_resolution("highres", VARIANTS) == (1920, 1080)
+    assert memmodel.parse_topology("FanOut") == 2
+    assert memmodel.parse_topology("3") == 3
+    with pytest.raises(argparse.ArgumentTypeError):
+        memmodel.parse_resolution("huge")
+    with pytest.raises(argparse.ArgumentTypeError):
+        memmodel.parse_topology("0")
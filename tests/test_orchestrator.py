@@ -0,0 +1,94 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+from testtools import orchestrator
+
+def python(code):
+    return [sys.executable, "-c", code]
+
+def run(state, launcher=None, interval=None):
+    return asyncio.run((launcher or orchestrator.Launcher()).run(state, interval))
+
+def test_captures_output_tails_and_exit_code():
+    code = "import sys\nfor i in range(500): print(i)\nprint('x' * 200000, end='')\nsys.stderr.write('bad\\r\\n')\nsys.exit(3)"
+    state = run(orchestrator.RunState(python(code)))
+    assert state.returncode == 3
+    assert len(state.stdout_tail) == orchestrator.TAIL_LINES
+    # An unterminated 200 kB line is kept in chunks rather than stalling the pipe
+    assert "".join(list(state.stdout_tail)[-4:]).endswith("x" * 1000)
+    assert state.stderr_text() == "bad"
+    assert state.wall_time > 0
+
+def test_cpu_time_of_a_lone_launch():
+    state = run(orchestrator.RunState(python("import time\nend = time.process_time() + 0.3\nwhile time.process_time() < end: pass")))
+    assert not state.overlapped
+    assert 0.2 < state.cpu_time < 5
+
+def test_overlap_is_tracked_per_launcher():
+    async def main():
+        shared = orchestrator.Launcher()
+        a = orchestrator.RunState(python("import time; time.sleep(0.3)"))
+        b = orchestrator.RunState(python("import time; time.sleep(0.1)"))
+        await asyncio.gather(shared.run(a), shared.run(b))
+        # A launch under another session's Launcher is not counted as an overlap
+        c = orchestrator.RunState(python("import time; time.sleep(0.3)"))
+        d = orchestrator.RunState(python("import time; time.sleep(0.1)"))
+        await asyncio.gather(orchestrator.Launcher().run(c), orchestrator.Launcher().run(d))
+        assert not shared.active
+        return a, b, c, d
+
+    a, b, c, d = asyncio.run(main())
+    assert a.overlapped and b.overlapped
+    assert not c.overlapped and not d.overlapped
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/smaps_rollup"), reason="needs /proc sampling")
+def test_samples_memory_into_the_sink():
+    seen = []
+    state = orchestrator.RunState(python("import time; data = bytearray(50 << 20); time.sleep(0.4)"))
+    state.sample_sink = seen.append
+    run(state, interval=0.02)
+    assert len(state.samples) >= 5
+    assert seen == state.samples
+    assert max(s.rss for s in state.samples) > 50
+
+@pytest.mark.skipif(sys.platform == "win32", reason="process groups")
+def test_cancel_kills_the_tree(tmp_path):
+    pid_file = tmp_path / "child.pid"
+    code = ("import subprocess, sys, time\n"
+            f"child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+            f"open({str(pid_file)!r}, 'w').write(str(child.pid))\n"
+            "time.sleep(60)")
+
+    async def main():
+        task = asyncio.create_task(orchestrator.Launcher().run(orchestrator.RunState(python(code))))
+        while not pid_file.exists() or not pid_file.read_text():
+            await asyncio.sleep(0.02)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    child = int(pid_file.read_text())
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        try:
+            os.kill(child, 0)
+        except ProcessLookupError:
+            break
+        time.sleep(0.05)
+    else:
+        pytest.fail("child survived the cancelled launch")
+
+@pytest.mark.skipif(not hasattr(os, "sched_setaffinity"), reason="needs Linux affinity")
+def test_cpus_pin_the_child():
+    before = os.sched_getaffinity(0)
+    cpu = min(before)
+    state = run(orchestrator.RunState(python("import os; print(sorted(os.sched_getaffinity(0)))"), cpus={cpu}))
+    assert state.returncode == 0
+    assert list(state.stdout_tail) == [f"[{cpu}]"]
+    # Only the child is pinned
+    assert os.sched_getaffinity(0) == before
@@ -0,0 +1,101 @@
+import os
+import sys
+
+import pytest
+
+from testtools import procmem
+
+SMAPS_ROLLUP = b"""55d0c0a00000-7ffd6b5f2000 ---p 00000000 00:00 0                          [rollup]
+Rss:              204800 kB
+Pss:              153600 kB
+Pss_Anon:         102400 kB
+Pss_File:          51200 kB
+Shared_Clean:      40960 kB
+Shared_Dirty:      10240 kB
+Private_Clean:     20480 kB
+Private_Dirty:    133120 kB
+Referenced:       204800 kB
+Anonymous:        133120 kB
+Swap:                  0 kB
+SwapPss:               0 kB
+"""
+# The command name contains spaces and a parenthesis; utime, stime, cutime, cstime are 300, 100, 50, 50 ticks
+STAT = (b"4242 (dotnet exec (x)) S 1 4242 4242 0 -1 4194560 5000 0 0 0 300 100 50 50 20 0 30 0 12345 "
+        b"3000000000 51200 18446744073709551615 1 1 0 0 0 0 0 4096 17663 0 0 0 17 3 0 0 0 0 0\n")
+
+def entry_from(tmp_path, data, rollup=True, stat=None):
+    path = tmp_path / "data"
+    path.write_bytes(data)
+    entry = procmem._ProcEntry.__new__(procmem._ProcEntry)
+    entry.role = procmem.ROLE_TESTHOST
+    entry.rollup = rollup
+    entry.fd = os.open(path, os.O_RDONLY)
+    entry.stat_fd = None
+    if stat is not None:
+        (tmp_path / "stat").write_bytes(stat)
+        entry.stat_fd = os.open(tmp_path / "stat", os.O_RDONLY)
+    return entry
+
+def test_reads_rss_pss_uss_from_smaps_rollup(tmp_path):
+    entry = entry_from(tmp_path, SMAPS_ROLLUP)
+    try:
+        # Re-reading the same descriptor gives the same figures
+        for _ in range(2):
+            assert procmem.ProcTreeSampler(0)._read(entry) == (200.0, 150.0, 150.0)
+    finally:
+        entry.close()
+
+def test_statm_fallback_reports_rss_for_all_three(tmp_path):
+    entry = entry_from(tmp_path, b"100000 2560 500 10 0 3000 0\n", rollup=False)
+    try:
+        sampler = procmem.ProcTreeSampler(0)
+        rss = 2560 * sampler.PAGE_SIZE / procmem.MB
+        assert sampler._read(entry) == (rss, rss, rss)
+    finally:
+        entry.close()
+
+def test_cpu_time_includes_reaped_children(tmp_path):
+    entry = entry_from(tmp_path, SMAPS_ROLLUP, stat=STAT)
+    try:
+        assert procmem.ProcTreeSampler(0)._read_cpu(entry) == 500 / procmem.CLOCK_TICKS
+    finally:
+        entry.close()
+
+@pytest.mark.parametrize("cmdline,role", [
+    (["/usr/share/dotnet/dotnet", "exec", "/app/testhost.dll", "--port", "123"], procmem.ROLE_TESTHOST),
+    (["dotnet", "/sdk/MSBuild.dll", "/nodemode:1"], procmem.ROLE_BUILD),
+    (["dotnet", "/sdk/Roslyn/bincore/VBCSCompiler.dll"], procmem.ROLE_BUILD),
+    (["dotnet", "test", "Fake.Tests.csproj"], procmem.ROLE_CLI),
+    (["python3", "helper.py"], procmem.ROLE_OTHER),
+])
+def test_classify(cmdline, role):
+    assert procmem.classify(cmdline) == role
+
+def sample(t, pss, roles):
+    return procmem.MemorySample(t, pss, pss, pss, roles)
+
+def test_engine_series_prefers_testhost():
+    samples = [sample(0.0, 700.0, {procmem.ROLE_CLI: 700.0}),
+               sample(1.0, 1200.0, {procmem.ROLE_CLI: 600.0, procmem.ROLE_TESTHOST: 600.0})]
+    assert procmem.engine_series(samples) == [(1.0, 600.0)]
+    assert procmem.engine_series(samples[:1]) == [(0.0, 700.0)]
+    assert procmem.role_peaks(samples) == {procmem.ROLE_CLI: 700.0, procmem.ROLE_TESTHOST: 600.0}
+
+def test_memory_metric_scope():
+    with_host = [sample(0.0, 1.0, {procmem.ROLE_TESTHOST: 1.0})]
+    without = [sample(0.0, 1.0, {procmem.ROLE_CLI: 1.0})]
+    assert procmem.memory_metric(with_host).endswith("-testhost")
+    assert procmem.memory_metric(without).endswith("-tree")
+    if sys.platform.startswith("linux") and os.path.exists("/proc/self/smaps_rollup"):
+        assert procmem.memory_metric(with_host) == "pss-testhost"
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/smaps_rollup"), reason="needs /proc smaps_rollup")
+def test_samples_a_live_process():
+    sampler = procmem.ProcTreeSampler(os.getpid())
+    try:
+        s = sampler.sample()
+    finally:
+        sampler.close()
+    assert 0 < s.uss <= s.pss <= s.rss
+    assert s.cpu > 0
+    assert sum(s.roles.values()) == pytest.approx(s.pss)
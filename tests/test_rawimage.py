@@ -0,0 +1,72 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from testtools import rawimage
+
+def image(height=5, width=7, channels=3):
+    return np.arange(height * width * channels, dtype=np.uint8).reshape(height, width, channels)
+
+@pytest.mark.parametrize("channels,row_alignment", [(3, 1), (3, 16), (4, 1), (4, 64)])
+def test_round_trip(tmp_path, channels, row_alignment):
+    pixels = image(channels=channels)
+    path = str(tmp_path / ("img" + rawimage.EXTENSION))
+    rawimage.write_raw(path, pixels, row_alignment=row_alignment)
+    with rawimage.RawImage(path) as raw:
+        assert (raw.width, raw.height, raw.channels) == (7, 5, channels)
+        assert raw.header.data_offset % rawimage.DATA_ALIGNMENT == 0
+        assert raw.header.stride % row_alignment == 0
+        assert np.array_equal(raw.pixels(), pixels)
+        assert bytes(raw.row(2)) == pixels[2].tobytes()
+    assert rawimage.verify(path) == ""
+
+def test_rejects_unsupported_layouts(tmp_path):
+    with pytest.raises(rawimage.RawImageError):
+        rawimage.write_raw(str(tmp_path / "a.iaraw"), np.zeros((2, 2, 2), dtype=np.uint8))
+    with pytest.raises(rawimage.RawImageError):
+        rawimage.write_raw(str(tmp_path / "a.iaraw"), np.zeros((2, 2, 3), dtype=np.uint16))
+
+def test_truncated_and_foreign_files(tmp_path):
+    path = tmp_path / "a.iaraw"
+    rawimage.write_raw(str(path), image())
+    data = path.read_bytes()
+    path.write_bytes(data[:-1])
+    assert "Truncated" in rawimage.verify(str(path))
+    path.write_bytes(b"NOTRAWIM" + data[8:])
+    assert "Not an .iaraw" in rawimage.verify(str(path))
+    path.write_bytes(b"")
+    assert rawimage.verify(str(path)) == "Empty file"
+
+def test_verify_against_reference(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    pixels = image()
+    path = str(tmp_path / "a.iaraw")
+    rawimage.write_raw(path, pixels)
+    Image.fromarray(pixels).save(tmp_path / "a.png")
+    assert rawimage.verify(path, str(tmp_path / "a.png")) == ""
+    changed = pixels.copy()
+    changed[0, 0] = 255 - changed[0, 0]
+    Image.fromarray(changed).save(tmp_path / "b.png")
+    assert rawimage.verify(path, str(tmp_path / "b.png")).startswith("1 pixels differ")
+
+def test_live_views_keep_the_mapping_open(tmp_path):
+    pixels = image()
+    path = str(tmp_path / "a.iaraw")
+    rawimage.write_raw(path, pixels, row_alignment=16)
+    raw = rawimage.RawImage(path)
+    view = raw.pixels()
+    with pytest.raises(BufferError):
+        raw.close()
+    # Still readable after the refused close
+    assert np.array_equal(view, pixels)
+    assert not view.flags.owndata
+    del view
+    raw.close()
+
+def test_context_exit_with_live_view_raises(tmp_path):
+    path = str(tmp_path / "a.iaraw")
+    rawimage.write_raw(path, image())
+    with pytest.raises(BufferError):
+        with rawimage.RawImage(path) as raw:
+            view = raw.pixels()
+    assert int(view.sum()) == int(image().sum())
@@ -0,0 +1,73 @@
+import csv
+
+from testtools import regression
+
+FANOUT = "ImageAutomate.Execution.MemoryAndAccessTests.HighRes_HighPlus.Topology_FanOut"
+CHAIN = "ImageAutomate.Execution.MemoryAndAccessTests.HighRes_HighPlus.Topology_Chain"
+
+def row(test, max_mb, avg_mb=1000.0, duration=10.0, metric="pss-testhost", **extra):
+    values = {"Test": test, "Result": "Pass", "MaxMB": max_mb, "AvgMB": avg_mb, "DurationS": duration}
+    if metric:
+        values["MemMetric"] = metric
+    values.update(extra)
+    return values
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=sorted({k for r in rows for k in r}))
+        writer.writeheader()
+        writer.writerows(rows)
+    return str(path)
+
+def test_single_row_baseline_fails_closed(tmp_path, capsys):
+    baseline = write_csv(tmp_path / "baseline.csv", [row(FANOUT, 3760.0), row(CHAIN, 1813.0)])
+    current = [row(FANOUT, 4060.0), row(CHAIN, 1815.0)]
+
+    assert regression.gate(regression.load_rows([baseline]), current) == 1
+    assert "--repeat 2" in capsys.readouterr().out
+
+def test_no_noise_estimate_gives_no_threshold():
+    findings, warnings = regression.compare([row(CHAIN, 1813.0)], [row(CHAIN, 1815.0)])
+    assert {f.metric for f in findings} == set(regression.METRICS)
+    assert all(f.threshold is None and not f.regressed for f in findings)
+    assert any(w.startswith("MaxMB: no repeated samples") for w in warnings)
+    assert regression.gate([row(CHAIN, 1813.0)], [row(CHAIN, 1813.0)]) == 1
+
+def test_single_row_test_borrows_noise_from_repeated_tests():
+    baseline = [row(CHAIN, mb) for mb in (1800.0, 1810.0, 1790.0, 1805.0, 1795.0)] + [row(FANOUT, 3760.0)]
+    current = [row(CHAIN, mb) for mb in (1802.0, 1808.0, 1798.0)] + [row(FANOUT, 4060.0)]
+    findings, _ = regression.compare(baseline, current)
+    peak = [f for f in findings if f.test == FANOUT and f.metric == "MaxMB"][0]
+    assert peak.threshold is not None and peak.regressed
+    assert regression.gate(baseline, current) == 1
+
+def test_repeated_samples_use_noise_based_limit():
+    baseline = [row(CHAIN, mb) for mb in (1800.0, 1810.0, 1790.0, 1805.0, 1795.0)]
+    quiet = [row(CHAIN, mb) for mb in (1802.0, 1808.0, 1798.0)]
+    grown = [row(CHAIN, mb) for mb in (1900.0, 1910.0, 1890.0)]
+
+    assert regression.gate(baseline, quiet) == 0
+    findings, warnings = regression.compare(baseline, grown)
+    assert [f.metric for f in findings if f.regressed] == ["MaxMB"]
+    assert not any("no repeated samples" in w for w in warnings if w.startswith("MaxMB"))
+
+def test_tree_rss_baseline_is_not_compared_with_testhost_pss():
+    legacy = [row(FANOUT, 4360.0, metric=None)]
+    current = [row(FANOUT, 3760.0)]
+
+    findings, warnings = regression.compare(legacy, current)
+    assert not [f for f in findings if f.metric in regression.MEMORY_METRICS]
+    assert any("rss-tree" in w for w in warnings)
+    assert regression.gate(legacy, current) == 1
+
+def test_configurations_are_compared_separately():
+    baseline = [row(CHAIN, base + mb, Config=f"MaxShipmentSize={size}")
+                for size, base in ((8, 1800.0), (32, 2400.0)) for mb in (0.0, 4.0, -4.0)]
+    current = [row(CHAIN, base + mb, Config=f"MaxShipmentSize={size}")
+               for size, base in ((8, 1805.0), (32, 2405.0)) for mb in (0.0, 4.0, -4.0)]
+    assert regression.gate(baseline, current) == 0
+
+def test_repeat_two_baseline_is_enough():
+    baseline = [row(CHAIN, mb, duration=d) for mb, d in ((1800.0, 10.0), (1806.0, 10.2))]
+    assert regression.gate(baseline, [row(CHAIN, 1804.0, duration=10.1)]) == 0
+    assert regression.gate(baseline, [row(CHAIN, 1900.0, duration=10.1)]) == 1
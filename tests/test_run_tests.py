@@ -0,0 +1,64 @@
+import asyncio
+import signal
+from types import SimpleNamespace
+
+import pytest
+
+import RunTests
+
+def args(**overrides):
+    values = dict(jobs=1, runs=1, run_until_fail=False, discover=True, warm_host=False, filter=None,
+                  project="Fake.Tests/Fake.Tests.csproj", configuration="Debug", monitor_memory=False)
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+@pytest.fixture
+def runs(monkeypatch):
+    """Replaces execute_run with a fake that records concurrency; failing items are listed in `fail`."""
+    state = {"active": 0, "most": 0, "order": [], "fail": set()}
+
+    async def execute_run(session, test_item, trx_path, no_build):
+        state["active"] += 1
+        state["most"] = max(state["most"], state["active"])
+        state["order"].append(test_item)
+        await asyncio.sleep(0.01)
+        state["active"] -= 1
+        if test_item in state["fail"]:
+            session.failed = True
+        return {(test_item, test_item): {"outcome": "Passed"}}
+
+    monkeypatch.setattr(RunTests, "execute_run", execute_run)
+    monkeypatch.setattr(RunTests, "log_status", lambda *a, **k: None)
+    # run_queue routes SIGINT to its own task
+    handler = signal.getsignal(signal.SIGINT)
+    yield state
+    signal.signal(signal.SIGINT, handler)
+
+def session(**overrides):
+    return SimpleNamespace(args=args(**overrides), failed=False, trx_dir="trx")
+
+def test_jobs_bound_concurrency(runs):
+    queue = [f"Ns.A.T{i}" for i in range(10)]
+    asyncio.run(RunTests.run_queue(session(jobs=3, runs=2), queue, False))
+    assert runs["most"] == 3
+    assert sorted(runs["order"]) == sorted(queue * 2)
+
+def test_single_job_keeps_queue_order(runs):
+    queue = [f"Ns.A.T{i}" for i in range(5)]
+    asyncio.run(RunTests.run_queue(session(runs=2), queue, False))
+    assert runs["most"] == 1
+    assert runs["order"] == [t for t in queue for _ in range(2)]
+
+def test_run_until_fail_stops_the_queue(runs):
+    runs["fail"] = {"Ns.A.T0"}
+    queue = [f"Ns.A.T{i}" for i in range(5)]
+    asyncio.run(RunTests.run_queue(session(runs=0, run_until_fail=True), queue, False))
+    assert runs["order"] == ["Ns.A.T0"]
+
+def test_build_test_command():
+    cmd = RunTests.build_test_command(args(), "Ns.A.T0", "out.trx", no_build=True)
+    assert cmd == ["dotnet", "test", "Fake.Tests/Fake.Tests.csproj", "--configuration", "Debug",
+                   "--logger", "trx;LogFileName=out.trx", "--no-build", "--filter", "FullyQualifiedName=Ns.A.T0"]
+    cmd = RunTests.build_test_command(args(discover=False, filter="Ns.A.T0"), None, "out.trx")
+    assert cmd[-2:] == ["--filter", "FullyQualifiedName=Ns.A.T0"]
+    assert RunTests.expand_filter("Category=Memory|Name~Fan") == "Category=Memory|Name~Fan"
@@ -0,0 +1,73 @@
+import argparse
+import io
+
+import pytest
+
+from testtools import scaling
+
+@pytest.fixture
+def topology(monkeypatch):
+    # Two packages, two cores each, two SMT threads per core: cpu N and N+4 are siblings
+    files = {}
+    for cpu in range(8):
+        base = f"/sys/devices/system/cpu/cpu{cpu}/topology"
+        files[f"{base}/physical_package_id"] = str(cpu % 4 // 2)
+        files[f"{base}/core_id"] = str(cpu % 2)
+
+    def fake_open(path, *args, **kwargs):
+        if path not in files:
+            raise FileNotFoundError(path)
+        return io.StringIO(files[path])
+
+    monkeypatch.setattr(scaling, "open", fake_open, raising=False)
+    monkeypatch.setattr(scaling, "available_cpus", lambda: list(range(8)))
+
+def test_cpu_order_uses_physical_cores_first(topology):
+    order = scaling.cpu_order(range(8))
+    assert order == [0, 1, 2, 3, 4, 5, 6, 7]
+    assert scaling.cpu_order([7, 6, 4, 0]) == [0, 6, 7, 4]
+    assert scaling.cpus_for(2, scaling.cpu_order([0, 4, 1])) == {0, 1}
+
+def test_cpu_order_without_topology(monkeypatch):
+    monkeypatch.setattr(scaling, "open", lambda *a, **k: (_ for _ in ()).throw(OSError()), raising=False)
+    assert scaling.cpu_order([3, 1, 2]) == [1, 2, 3]
+
+def test_parse_core_counts(topology):
+    assert scaling.parse_core_counts("") == [1, 2, 4, 8]
+    assert scaling.parse_core_counts("6, 1,2,2") == [1, 2, 6]
+    for spec in ("0,2", "1,9", "two", ","):
+        with pytest.raises(argparse.ArgumentTypeError):
+            scaling.parse_core_counts(spec)
+
+def test_parse_core_counts_keeps_odd_totals(monkeypatch):
+    monkeypatch.setattr(scaling, "available_cpus", lambda: list(range(6)))
+    assert scaling.parse_core_counts("") == [1, 2, 4, 6]
+
+def row(cores, duration, gc="default", config="default", result="Pass"):
+    return {"Test": "Ns.Class.Test", "Config": config, "GcProfile": gc, "Cores": str(cores), "Result": result,
+            "DurationS": str(duration), "CpuS": str(duration * cores), "MaxMB": "100"}
+
+def test_gc_profiles_get_separate_curves():
+    rows = [row(1, 8.0), row(2, 4.0), row(1, 6.0, gc="Server"), row(2, 6.0, gc="Server")]
+    curves = scaling.analyze(rows)
+    assert sorted(curves) == [("Ns.Class.Test", "default", "Server"), ("Ns.Class.Test", "default", "default")]
+    assert [p.speedup for p in curves[("Ns.Class.Test", "default", "default")]] == [1.0, 2.0]
+    assert [p.speedup for p in curves[("Ns.Class.Test", "default", "Server")]] == [1.0, 1.0]
+
+def test_repeated_runs_use_medians_and_skip_failures():
+    rows = [row(1, 8.0), row(1, 9.0), row(1, 100.0), row(4, 2.0), row(4, 50.0, result="Fail")]
+    (points,) = scaling.analyze(rows).values()
+    assert [(p.cores, p.wall) for p in points] == [(1, 9.0), (4, 2.0)]
+    assert points[1].efficiency == 9.0 / 2.0 / 4
+
+def test_findings():
+    curve = scaling.analyze([row(1, 8.0), row(2, 4.2), row(4, 4.0), row(8, 5.0)])
+    (points,) = curve.values()
+    assert scaling.findings(points) == ["flattens at 4 cores (x2.00, efficiency 50%)",
+                                        "reverses at 8 cores (4.00s -> 5.00s)"]
+
+def test_report_labels_gc_profile(tmp_path, capsys):
+    path = tmp_path / "scaling.csv"
+    scaling.report(scaling.analyze([row(1, 2.0, gc="Server", config="BatchSize=8")]), str(path))
+    assert "Ns.Class.Test [BatchSize=8, GC=Server]" in capsys.readouterr().out
+    assert path.read_text().splitlines()[1].startswith("Ns.Class.Test,BatchSize=8,Server,1,")
@@ -0,0 +1,103 @@
+import os
+import subprocess
+
+import pytest
+
+from testtools import selection
+
+SOLUTION = """Microsoft Visual Studio Solution File, Format Version 12.00
+Project("{FAE04EC0-301F-11D3-BF4B-00C04F79EFBC}") = "Core", "Core\\Core.csproj", "{11111111-1111-1111-1111-111111111111}"
+EndProject
+Project("{FAE04EC0-301F-11D3-BF4B-00C04F79EFBC}") = "Other", "Other\\Other.csproj", "{22222222-2222-2222-2222-222222222222}"
+EndProject
+Project("{FAE04EC0-301F-11D3-BF4B-00C04F79EFBC}") = "Core.Tests", "Core.Tests\\Core.Tests.csproj", "{33333333-3333-3333-3333-333333333333}"
+EndProject
+"""
+TEST_PROJECT = """<Project Sdk="Microsoft.NET.Sdk">
+  <ItemGroup><PackageReference Include="xunit" Version="2.9.0" /></ItemGroup>
+  <ItemGroup><ProjectReference Include="..\\Core\\Core.csproj" /></ItemGroup>
+</Project>"""
+FILES = {
+    "Core/Core.csproj": '<Project Sdk="Microsoft.NET.Sdk" />',
+    "Core/Widget.cs": "namespace Core;\npublic class Widget { }\n",
+    "Core/Helper.cs": "namespace Core;\npublic static class Helper { public static Widget Make() => new(); }\n",
+    "Core/Unused.cs": "namespace Core;\n// Widget is only mentioned in a comment\npublic class Unused { }\n",
+    "Other/Other.csproj": '<Project Sdk="Microsoft.NET.Sdk" />',
+    "Other/Gadget.cs": "namespace Other;\npublic class Gadget { }\n",
+    "Core.Tests/Core.Tests.csproj": TEST_PROJECT,
+    "Core.Tests/HelperTests.cs": "namespace Core.Tests;\npublic class HelperTests { [Fact] public void Makes() => Helper.Make(); }\n",
+    "Core.Tests/PlainTests.cs": "namespace Core.Tests;\npublic class PlainTests { [Fact] public void Adds() { } }\n",
+    "Core.Tests/VariantBase.cs": ("namespace Core.Tests;\npublic abstract class VariantBase\n"
+                                  "{ protected abstract Widget Create(); [Fact] public void Runs() => Create(); }\n"),
+    "Core.Tests/HighRes.cs": "namespace Core.Tests;\npublic class HighRes : VariantBase { protected override Widget Create() => new(); }\n",
+}
+
+@pytest.fixture
+def solution(tmp_path):
+    root = tmp_path / "repo"
+    for rel, text in dict(FILES, **{"App.sln": SOLUTION}).items():
+        path = root / "App" / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+    return root, str(root / "App" / "App.sln"), str(tmp_path / "index.json")
+
+def affected(solution, *rels):
+    root, sln, cache = solution
+    return selection.affected_classes([str(root / rel) for rel in rels], sln, cache)
+
+def test_changed_type_reaches_tests_through_references(solution):
+    result = affected(solution, "App/Core/Widget.cs")
+    assert not result.full
+    assert result.classes == {"Core.Tests.HelperTests", "Core.Tests.VariantBase", "Core.Tests.HighRes"}
+
+def test_comment_mentions_do_not_count(solution):
+    assert "Core.Unused" not in str(affected(solution, "App/Core/Widget.cs").classes)
+    assert affected(solution, "App/Core/Unused.cs").classes == set()
+
+def test_unreferenced_project_selects_nothing(solution):
+    result = affected(solution, "App/Other/Gadget.cs")
+    assert result.classes == set()
+    assert selection.filter_expression(result) is None
+
+def test_project_file_change_marks_every_type(solution):
+    assert "Core.Tests.PlainTests" not in affected(solution, "App/Core/Core.csproj").classes
+    assert affected(solution, "App/Core.Tests/Core.Tests.csproj").classes >= {"Core.Tests.PlainTests"}
+
+def test_full_suite_files_and_outside_files(solution):
+    assert affected(solution, "App/Directory.Build.props").full
+    assert affected(solution, "App/README.md").full
+    assert affected(solution, "RunTests.py") == selection.Selection(False, "0 changed file(s) in the solution", set(), [])
+
+def test_select_and_filter_expression():
+    picked = selection.Selection(False, "", {"Core.Tests.HelperTests"}, [])
+    tests = ["Core.Tests.HelperTests.Makes", "Core.Tests.HelperTestsExtra.Other"]
+    assert selection.select(picked, tests) == ["Core.Tests.HelperTests.Makes"]
+    assert selection.filter_expression(picked) == "FullyQualifiedName~Core.Tests.HelperTests."
+    full = selection.Selection(True, "", set(), [])
+    assert selection.select(full, tests) == tests
+    assert selection.filter_expression(full) == ""
+
+def test_index_cache_skips_unchanged_files(solution, monkeypatch):
+    _, sln, cache = solution
+    projects = selection.solution_projects(sln)
+    first = selection.build_index(projects, cache)
+    monkeypatch.setattr(selection, "_scan_file", lambda path: pytest.fail(f"rescanned {path}"))
+    assert selection.build_index(projects, cache) == first
+
+def test_changed_files_from_git(solution):
+    root, _, _ = solution
+
+    def git(*args):
+        subprocess.run(["git", "-C", str(root), "-c", "user.name=t", "-c", "user.email=t@t", *args],
+                       check=True, capture_output=True)
+
+    git("init", "-q")
+    git("add", ".")
+    git("commit", "-qm", "base")
+    git("tag", "base")
+    (root / "App" / "Core" / "Widget.cs").write_text("namespace Core;\npublic class Widget { int x; }\n")
+    (root / "App" / "Core" / "New.cs").write_text("namespace Core;\npublic class New { }\n")
+    changed = selection.changed_files("base", str(root))
+    assert changed == sorted(os.path.normpath(str(root / "App" / "Core" / name)) for name in ("New.cs", "Widget.cs"))
+    with pytest.raises(RuntimeError):
+        selection.changed_files("no-such-ref", str(root))
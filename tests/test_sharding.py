@@ -0,0 +1,109 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+
+import pytest
+
+from testtools import sharding
+
+def test_parse_shard():
+    assert sharding.parse_shard("2/4") == (2, 4)
+    for spec in ("0/4", "5/4", "1", "a/b", "1/0"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            sharding.parse_shard(spec)
+
+def test_assign_balances_longest_first():
+    durations = {"a": 10.0, "b": 6.0, "c": 5.0, "d": 4.0, "e": 3.0, "f": 2.0}
+    tests = sorted(durations)
+    shards, loads = sharding.assign(tests, durations, 2)
+    assert sum(loads) == 30.0
+    # LPT: the busiest shard exceeds the lightest by at most the last test placed
+    assert max(loads) - min(loads) <= 2.0
+    assert sorted(t for shard in shards for t in shard) == tests
+
+def test_assign_keeps_discovery_order():
+    tests = ["z", "y", "x", "w"]
+    shards, _ = sharding.assign(tests, {"z": 1.0, "y": 4.0, "x": 2.0, "w": 3.0}, 2)
+    for shard in shards:
+        assert shard == [t for t in tests if t in shard]
+
+def test_assign_uses_median_for_unknown_tests_and_adds_overhead():
+    _, loads = sharding.assign(["a", "b", "c", "new"], {"a": 1.0, "b": 3.0, "c": 5.0}, 1, overhead=2.0)
+    assert loads == [1.0 + 3.0 + 5.0 + 3.0 + 4 * 2.0]
+
+def test_assign_is_deterministic_and_disjoint():
+    tests = [f"T{i}" for i in range(50)]
+    durations = {t: float(i % 7) for i, t in enumerate(tests)}
+    first = sharding.assign(tests, durations, 4)
+    assert first == sharding.assign(tests, durations, 4)
+    members = [set(shard) for shard in first[0]]
+    assert sum(map(len, members)) == len(set().union(*members)) == len(tests)
+
+def test_select_returns_own_shard():
+    tests = ["a", "b", "c"]
+    shard, load = sharding.select(tests, (2, 3), {"a": 3.0, "b": 2.0, "c": 1.0}, log=lambda _: None)
+    shards, loads = sharding.assign(tests, {"a": 3.0, "b": 2.0, "c": 1.0}, 3)
+    assert (shard, load) == (shards[1], loads[1])
+
+def test_load_durations_prefers_database_and_passing_runs(tmp_path):
+    db = str(tmp_path / "history.db")
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE results (test TEXT, passed INTEGER, duration_s REAL)")
+    conn.executemany("INSERT INTO results VALUES (?, ?, ?)",
+                     [("a", 1, 2.0), ("a", 1, 4.0), ("a", 0, 60.0), ("b", 0, 9.0)])
+    conn.commit()
+    conn.close()
+    path = tmp_path / "memory_stats.csv"
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Test", "DurationS"])
+        writer.writerows([["a", "100"], ["c", "1"], ["c", "3"], ["c", "8"]])
+
+    assert sharding.load_durations([db, str(path), str(tmp_path / "missing.db")]) == {"a": 3.0, "b": 9.0, "c": 3.0}
+
+def write_shard(directory, index, count, tests):
+    os.makedirs(directory)
+    results = os.path.join(directory, "results.csv")
+    with open(results, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Container", "Test", "Pass", "Fail", "FailPercent", "MaxMB", "AvgMB", "AvgDurationS"])
+        writer.writerows([["Ns.Class", t, "1", "0", "0", "10", "5", "1"] for t in tests])
+    sharding.write_manifest("RunTests", (index, count), tests, 1.0, {"results": results}, runs=1, directory=directory)
+
+def test_merge_concatenates_and_checks_the_split(tmp_path, capsys):
+    write_shard(tmp_path / "s1", 1, 3, ["a", "b"])
+    write_shard(tmp_path / "s2", 2, 3, ["b", "c"])
+    problems = sharding.merge([str(tmp_path / "s1"), str(tmp_path / "s2")], str(tmp_path / "out"))
+    assert any("missing shard(s) 3" in p for p in problems)
+    assert any("b ran in shards 1 and 2" in p for p in problems)
+    with open(tmp_path / "out" / "results.csv", newline="") as f:
+        assert [row["Test"] for row in csv.DictReader(f)] == ["a", "b", "b", "c"]
+
+def test_manifest_paths_are_relative(tmp_path):
+    write_shard(tmp_path / "s1", 1, 1, ["a"])
+    with open(tmp_path / "s1" / ("RunTests" + sharding.MANIFEST_SUFFIX)) as f:
+        assert json.load(f)["outputs"] == {"results": "results.csv"}
+
+def test_merged_report_uses_the_runs_confidence(tmp_path, capsys):
+    directory = tmp_path / "s1"
+    os.makedirs(directory)
+    results = str(directory / "results.csv")
+    with open(results, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Container", "Test", "Pass", "Fail", "FailPercent", "FailCiLow", "FailCiHigh", "MaxMB", "AvgMB"])
+        writer.writerow(["Ns.Class", "Ns.Class.Test", "9", "1", "10.00", "0.53", "54.01", "10", "5"])
+    sharding.write_manifest("RunTests", (1, 1), ["Ns.Class.Test"], 1.0, {"results": results}, runs=10,
+                            confidence=0.99, directory=str(directory))
+    assert sharding.merge([str(directory)], str(tmp_path / "out")) == []
+    out = capsys.readouterr().out
+    assert "99% CI" in out and "95% CI" not in out
+    assert "0.5-54.0%" in out
+
+def test_merge_flags_shards_without_results(tmp_path):
+    directory = tmp_path / "s1"
+    os.makedirs(directory)
+    sharding.write_manifest("RunTests", (1, 1), ["a"], 1.0, {"results": None}, runs=1, directory=str(directory))
+    problems = sharding.merge([str(directory)], str(tmp_path / "out"))
+    assert problems == [f"RunTests: shard 1 in {directory} has no results file"]
@@ -0,0 +1,37 @@
+import argparse
+
+import pytest
+
+from testtools import sweep
+
+def summary(config, images_per_s, peak_mb, failed=False):
+    return sweep.Summary("1080p", "Blur", config, 10, 10 / images_per_s, peak_mb, images_per_s, failed)
+
+def test_parse_axis():
+    assert sweep.parse_axis("maxdegreeofparallelism=1, 2,4") == ("MaxDegreeOfParallelism", ["1", "2", "4"])
+    for spec in ("MaxDegreeOfParallelism", "MaxDegreeOfParallelism=", "Nope=1"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            sweep.parse_axis(spec)
+
+def test_grid_and_labels():
+    points = sweep.grid([("MaxDegreeOfParallelism", ["1", "2"]), ("BatchSize", ["8"])])
+    assert points == [{"MaxDegreeOfParallelism": "1", "BatchSize": "8"}, {"MaxDegreeOfParallelism": "2", "BatchSize": "8"}]
+    assert sweep.point_label(points[0]) == "MaxDegreeOfParallelism=1,BatchSize=8"
+    assert sweep.point_env(points[0]) == {"IA_EXECUTOR_MaxDegreeOfParallelism": "1", "IA_EXECUTOR_BatchSize": "8"}
+    assert sweep.grid([]) == [{}]
+    assert sweep.point_label({}) == "default"
+
+def test_pareto_front_drops_dominated_and_failed():
+    fast = summary("fast", 20.0, 800.0)
+    lean = summary("lean", 5.0, 200.0)
+    middle = summary("middle", 10.0, 400.0)
+    worse = summary("worse", 9.0, 500.0)
+    broken = summary("broken", 50.0, 100.0, failed=True)
+    front = sweep.pareto_front([lean, worse, middle, broken, fast])
+    assert [s.config for s in front] == ["fast", "middle", "lean"]
+
+def test_pareto_front_treats_memory_jitter_as_equal():
+    quick = summary("quick", 10.0, 400.5)
+    slow = summary("slow", 8.0, 400.0)
+    assert [s.config for s in sweep.pareto_front([quick, slow])] == ["quick"]
+    assert [s.config for s in sweep.pareto_front([quick, slow], memory_tolerance_mb=0.0)] == ["quick", "slow"]
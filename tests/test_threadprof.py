@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+from testtools import procmem, threadprof, timeseries
+
+INTERVAL = 0.01
+
+def timeline():
+    # Two workers busy for 1.01-1.10, nothing until 1.51, then one worker for 1.51-1.60
+    times, tids, cpu = [], [], []
+    for i in range(1, 11):
+        for tid in (101, 102):
+            times.append(round(1.0 + i * INTERVAL, 2))
+            tids.append(tid)
+            cpu.append(INTERVAL)
+    for i in range(51, 61):
+        times.append(round(1.0 + i * INTERVAL, 2))
+        tids.append(103)
+        cpu.append(INTERVAL)
+    # A barely running thread does not make a tick busy
+    times.append(1.3)
+    tids.append(104)
+    cpu.append(INTERVAL * threadprof.IDLE_BUSY_THREADS / 2)
+    return {"timestamp": times, "tid": tids, "cpu": cpu,
+            "meta": {"interval": INTERVAL, "threads": {"101": ".NET TP Worker", "102": ".NET TP Worker", "103": "Main"}}}
+
+def test_summarize_whole_timeline():
+    summary = threadprof.summarize(timeline())
+    total = 30 * INTERVAL + INTERVAL * threadprof.IDLE_BUSY_THREADS / 2
+    assert summary["busy_threads"] == pytest.approx(total / 0.59)
+    assert summary["peak_busy"] == pytest.approx(2.0)
+    # 1.10 -> 1.51 less the interval the 1.51 row covers
+    assert summary["idle_gaps"] == 1
+    assert summary["idle_total"] == pytest.approx(0.40)
+    assert summary["longest_gap"] == pytest.approx(0.40)
+    assert [(name, tid) for name, tid, _, _ in summary["hot"]] == [(".NET TP Worker", 101), (".NET TP Worker", 102), ("Main", 103)]
+    assert sum(share for _, _, _, share in summary["hot"]) == pytest.approx(30 * INTERVAL / total)
+
+def test_summarize_window():
+    # One test of a warm-host batch: the window edges count as idle when nothing ran there
+    summary = threadprof.summarize(timeline(), start=1.40, end=1.70)
+    assert summary["busy_threads"] == pytest.approx(10 * INTERVAL / 0.30)
+    assert summary["idle_gaps"] == 2
+    assert summary["idle_total"] == pytest.approx(0.10 + 0.10)
+    assert threadprof.format_hot(summary["hot"]) == "Main#103 100%"
+
+def test_summarize_empty():
+    assert threadprof.summarize({"timestamp": [], "tid": [], "cpu": [], "meta": {}}) is None
+    summary = threadprof.summarize(timeline(), start=5.0, end=6.0)
+    assert summary["busy_threads"] == 0.0
+    assert summary["idle_gaps"] == 1
+    assert summary["hot"] == []
+
+def test_format_hot_unnamed():
+    assert threadprof.format_hot([("", 7, 0.5, 0.25), ("gc", 8, 1.5, 0.75)]) == "?#7 25%; gc#8 75%"
+
+def entry_for(path, schedstat):
+    entry = threadprof._ThreadEntry.__new__(threadprof._ThreadEntry)
+    entry.name, entry.last, entry.schedstat = "", None, schedstat
+    entry.fd = os.open(path, os.O_RDONLY)
+    return entry
+
+def test_reads_schedstat_nanoseconds(tmp_path):
+    path = tmp_path / "schedstat"
+    path.write_text("2500000000 120000 42\n")
+    entry = entry_for(str(path), schedstat=True)
+    try:
+        assert entry.read() == 2.5
+        # Every read starts again from the top of the file
+        assert entry.read() == 2.5
+    finally:
+        entry.close()
+    assert entry.fd is None
+
+def test_reads_stat_clock_ticks(tmp_path):
+    # The comm field may itself hold spaces and parentheses
+    path = tmp_path / "stat"
+    path.write_text("4242 (.NET (TP) Worker) S 4200 4200 4200 0 -1 4194560 100 0 0 0 "
+                    f"{procmem.CLOCK_TICKS * 3} {procmem.CLOCK_TICKS} 0 0 20 0 30 0\n")
+    entry = entry_for(str(path), schedstat=False)
+    try:
+        assert entry.read() == pytest.approx(4.0)
+    finally:
+        entry.close()
+
+def test_written_trace_summarizes_the_same(tmp_path):
+    profiler = threadprof.ThreadProfiler(interval=INTERVAL)
+    data = timeline()
+    profiler.times, profiler.tids, profiler.cpu = data["timestamp"], data["tid"], data["cpu"]
+    profiler.names = {101: ".NET TP Worker", 102: ".NET TP Worker", 103: "Main"}
+    profiler.seen_hosts = {4242}
+    path = str(tmp_path / ("run" + threadprof.SUFFIX))
+    profiler.write(path, {"test": "Ns.Class.Test"})
+
+    loaded = timeseries.load_trace(path)
+    assert loaded["meta"]["hosts"] == [4242]
+    assert loaded["meta"]["test"] == "Ns.Class.Test"
+    expected = threadprof.summarize(profiler.timeline())
+    actual = threadprof.summarize(loaded)
+    assert actual["idle_gaps"] == expected["idle_gaps"]
+    assert actual["busy_threads"] == pytest.approx(expected["busy_threads"], rel=1e-5)
+    assert [hot[:2] for hot in actual["hot"]] == [hot[:2] for hot in expected["hot"]]
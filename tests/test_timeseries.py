@@ -0,0 +1,54 @@
+import pytest
+
+from testtools import timeseries
+
+COLUMNS = [("timestamp", "d"), ("value", "f"), ("other", "f")]
+
+@pytest.fixture(params=["numpy", "array"])
+def backend(request, monkeypatch):
+    if request.param == "array":
+        monkeypatch.setattr(timeseries, "np", None)
+    elif timeseries.np is None:
+        pytest.skip("numpy not installed")
+    return request.param
+
+def write(path, rows, chunk_rows=4):
+    with timeseries.TraceWriter(str(path), COLUMNS, meta={"test": "Ns.Class.Test"}, chunk_rows=chunk_rows) as writer:
+        for row in rows:
+            writer.append(row)
+    return str(path)
+
+def test_round_trip_across_chunks(tmp_path, backend):
+    rows = [(float(i), float(i * 2), float(-i)) for i in range(10)]
+    trace = timeseries.load_trace(write(tmp_path / "a.iatrace", rows))
+    assert trace["meta"] == {"test": "Ns.Class.Test"}
+    assert list(trace["timestamp"]) == [r[0] for r in rows]
+    assert list(trace["value"]) == [r[1] for r in rows]
+    assert list(trace["other"]) == [r[2] for r in rows]
+
+def test_column_selection_keeps_time(tmp_path, backend):
+    trace = timeseries.load_trace(write(tmp_path / "a.iatrace", [(1.0, 2.0, 3.0)]), columns=["other"])
+    assert sorted(k for k in trace if k != "meta") == ["other", "timestamp"]
+
+def test_time_slice_skips_chunks(tmp_path, backend):
+    rows = [(float(i), float(i), 0.0) for i in range(20)]
+    trace = timeseries.load_trace(write(tmp_path / "a.iatrace", rows), start=5.0, end=9.0)
+    assert list(trace["timestamp"]) == [5.0, 6.0, 7.0, 8.0, 9.0]
+
+def test_downsample_keeps_spikes(tmp_path, backend):
+    rows = [(float(i), 100.0, 0.0) for i in range(1000)]
+    rows[537] = (537.0, 5000.0, 0.0)
+    trace = timeseries.load_trace(write(tmp_path / "a.iatrace", rows, chunk_rows=128), max_points=50)
+    assert len(trace["timestamp"]) <= 100
+    assert max(trace["value"]) == 5000.0
+    assert 537.0 in list(trace["timestamp"])
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "not.iatrace"
+    path.write_bytes(b"PNG....")
+    with pytest.raises(ValueError):
+        timeseries.load_trace(str(path))
+
+def test_trace_path_is_safe(tmp_path):
+    path = timeseries.trace_path(str(tmp_path), "Ns.Class.Test(a: 1/2)", 3)
+    assert path == str(tmp_path / "Ns.Class.Test_a_1_2___run3.iatrace")
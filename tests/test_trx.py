@@ -0,0 +1,66 @@
+import io
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from testtools import trx
+
+NS = "http://microsoft.com/schemas/VisualStudio/TeamTest/2010"
+
+def make_trx(count, truncate=False):
+    results = "".join(
+        f'<UnitTestResult testId="id{i}" testName="Ns.C{i % 2}.Test{i}" outcome="{"Failed" if i == 1 else "Passed"}" '
+        f'startTime="2024-01-01T10:00:0{i % 10}.1234567+00:00" endTime="2024-01-01T10:00:0{i % 10}.5234567+00:00" '
+        f'duration="00:00:00.4000000"><Output><StdOut>{"x" * 100}</StdOut>'
+        + ('<ErrorInfo><Message>boom</Message><StackTrace>at X</StackTrace></ErrorInfo>' if i == 1 else '')
+        + '</Output></UnitTestResult>'
+        for i in range(count))
+    definitions = "".join(
+        f'<UnitTest name="Test{i}" id="id{i}"><TestMethod className="Ns.C{i % 2}" name="Test{i}" /></UnitTest>'
+        for i in range(count))
+    text = f'<?xml version="1.0"?><TestRun xmlns="{NS}"><Results>{results}</Results><TestDefinitions>{definitions}</TestDefinitions></TestRun>'
+    if truncate:
+        text = text[:text.index("<TestDefinitions>") + len("<TestDefinitions>") + 40]
+    return text.encode("utf-8")
+
+class Pipe(io.BytesIO):
+    def seekable(self):
+        return False
+
+def test_results_resolve_class_names(tmp_path):
+    path = tmp_path / "run.trx"
+    path.write_bytes(make_trx(4))
+    results = list(trx.iter_results(str(path)))
+
+    assert [(r.class_name, r.test_name, r.outcome) for r in results] == [
+        ("Ns.C0", "Ns.C0.Test0", "Passed"), ("Ns.C1", "Ns.C1.Test1", "Failed"),
+        ("Ns.C0", "Ns.C0.Test2", "Passed"), ("Ns.C1", "Ns.C1.Test3", "Passed")]
+    assert results[1].message == "boom" and results[1].stack_trace == "at X"
+    assert results[0].duration == pytest.approx(0.4)
+    assert results[0].end - results[0].start == pytest.approx(0.4)
+
+def test_results_stream_before_definitions_are_read():
+    # With a re-readable source every result is yielded as soon as it is parsed, before the definitions section
+    source = io.BytesIO(make_trx(500))
+    results = trx.iter_results(source)
+    first = next(results)
+    assert first.class_name == "Ns.C0"
+    assert source.tell() < len(source.getvalue())
+
+def test_file_object_position_is_respected():
+    data = make_trx(3)
+    source = io.BytesIO(b"junk" + data)
+    source.seek(4)
+    assert len(list(trx.iter_results(source))) == 3
+
+def test_unseekable_source_falls_back_to_pending():
+    results = list(trx.iter_results(Pipe(make_trx(3))))
+    assert [r.class_name for r in results] == ["Ns.C0", "Ns.C1", "Ns.C0"]
+
+def test_truncated_file_yields_unresolved_results_then_raises():
+    seen = []
+    with pytest.raises(ET.ParseError):
+        for result in trx.iter_results(io.BytesIO(make_trx(3, truncate=True))):
+            seen.append(result)
+    assert len(seen) == 3
+    assert {r.class_name for r in seen} <= {"Ns.C0", trx.UNKNOWN_CONTAINER}
@@ -0,0 +1,81 @@
+import pytest
+
+import RunMemoryTests
+from testtools import variants
+
+SOURCE = """\
+namespace ImageAutomate.Execution.MemoryAndAccessTests;
+
+public class HighRes_Extreme : PerformanceTestBase
+{
+    protected override int ExpectedTotalItems => 500;
+    protected override int BatchSize => 100;
+    protected override LargeSource CreateSource(string name) => new LargeSource(name, 1920, 1080, ExpectedTotalItems);
+}
+
+public class LowRes_Small : PerformanceTestBase
+{
+    protected override int ExpectedTotalItems => 40;
+    protected override int BatchSize => 8;
+    protected override LargeSource CreateSource(string name) => new LargeSource( name, 640, 480, ExpectedTotalItems);
+}
+
+public class Baseline : PerformanceTestBase
+{
+    protected override int ExpectedTotalItems => 10;
+    protected override int BatchSize => 10;
+    protected override LargeSource CreateSource(string name) => new LargeSource(name, 320, 240, ExpectedTotalItems);
+}
+
+public class Computed_Sizes : PerformanceTestBase
+{
+    protected override int ExpectedTotalItems => Items;
+    protected override int BatchSize => 4;
+    protected override LargeSource CreateSource(string name) => new LargeSource(name, Width, Height, ExpectedTotalItems);
+}
+
+public abstract class PerformanceTestBase
+{
+}
+"""
+
+@pytest.fixture
+def matrix():
+    return variants.parse_variants(SOURCE)
+
+def test_parse_variants(matrix):
+    # Classes whose sizes are not literals are left out rather than guessed
+    assert sorted(matrix) == ["Baseline", "HighRes_Extreme", "LowRes_Small"]
+    assert matrix["HighRes_Extreme"] == variants.Variant("HighRes_Extreme", "HighRes", "Extreme", 1920, 1080, 500, 100)
+    assert matrix["LowRes_Small"][3:] == (640, 480, 40, 8)
+    assert matrix["Baseline"].workload == "Baseline"
+
+def test_load_variants(tmp_path):
+    path = tmp_path / "TestVariants.cs"
+    path.write_text(SOURCE, encoding="utf-8-sig")
+    assert sorted(variants.load_variants(str(path))) == ["Baseline", "HighRes_Extreme", "LowRes_Small"]
+    assert variants.load_variants(str(tmp_path / "missing.cs")) == {}
+
+def test_lookup_by_class_segment(matrix):
+    test = "ImageAutomate.Execution.MemoryAndAccessTests.HighRes_Extreme.Topology_Chain"
+    assert variants.variant_for_test(test, matrix).name == "HighRes_Extreme"
+    assert variants.variant_for_test("Topology_Chain", matrix) is None
+    assert variants.variant_for_test("Ns.Other.Topology_Chain", matrix) is None
+    assert variants.variant_for_class("ImageAutomate.Execution.MemoryAndAccessTests.LowRes_Small", matrix).name == "LowRes_Small"
+    assert variants.variant_for_class("LowRes_Small", matrix).name == "LowRes_Small"
+
+def test_throughput(matrix):
+    images, megapixels = variants.throughput(matrix["HighRes_Extreme"], 10.0)
+    assert images == 50.0
+    assert megapixels == pytest.approx(50 * 1920 * 1080 / 1e6)
+    assert variants.throughput(matrix["HighRes_Extreme"], 0) == (None, None)
+    assert variants.throughput(None, 10.0) == (None, None)
+
+def test_add_throughput_only_for_passing_runs(matrix):
+    row = {"Test": "Ns.LowRes_Small.Topology_Chain", "Result": "Pass", "DurationS": 4.0}
+    RunMemoryTests.add_throughput(row, matrix)
+    assert (row["ImagesPerS"], row["MPixPerS"]) == (10.0, 3.072)
+
+    row = {"Test": "Ns.LowRes_Small.Topology_Chain", "Result": "Fail", "DurationS": 4.0}
+    RunMemoryTests.add_throughput(row, matrix)
+    assert (row["ImagesPerS"], row["MPixPerS"]) == ("", "")
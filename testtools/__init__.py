@@ -0,0 +1 @@
+"""Shared helpers for RunTests.py and RunMemoryTests.py."""
@@ -0,0 +1,167 @@
+"""Adaptive repetition for RunTests.py stress runs.
+
+Instead of a fixed --runs per test, iterations go where they are informative.
+Every test first gets `min_runs`. After that the scheduler repeatedly picks the
+active test with the highest priority per second of expected run time:
+
+    priority = (upper Wilson bound on fail rate / target)
+               x (1 + FAIL_BOOST if it has failed)
+               x (1 + robust CV of duration and peak memory / VARIATION_REF)
+
+A test stops when the upper bound of its fail-rate interval drops below the
+target ("cleared": without failures that takes about z^2 / target runs, and
+a test with an early failure clears too once enough passes follow), when
+its lower bound rises above the target with at least CONFIRM_FAILURES failures
+("flaky": the bug is established and its failures are logged), or at
+`max_runs`. Nothing new starts once the next run would overrun the time budget.
+"""
+import argparse
+import math
+import time
+from statistics import NormalDist, median
+
+CONFIRM_FAILURES = 3
+FAIL_BOOST = 4.0
+# A robust coefficient of variation this large doubles a test's priority
+VARIATION_REF = 0.10
+MAD_SCALE = 1.4826
+
+STATUS_ACTIVE = "active"
+STATUS_CLEARED = "cleared"
+STATUS_FLAKY = "flaky"
+STATUS_MAX_RUNS = "max runs"
+STATUS_BUDGET = "budget"
+
+def wilson_interval(failures, runs, confidence=0.95):
+    """Two-sided Wilson score interval for a fail rate; (0, 1) without runs."""
+    if runs <= 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = failures / runs
+    denominator = 1 + z * z / runs
+    center = (p + z * z / (2 * runs)) / denominator
+    half = z * math.sqrt(p * (1 - p) / runs + z * z / (4 * runs * runs)) / denominator
+    return max(0.0, center - half), min(1.0, center + half)
+
+def runs_to_clear(target, confidence=0.95):
+    """Failure-free runs needed before the upper bound drops below `target`."""
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    return math.floor(z * z * (1 - target) / target) + 1
+
+def robust_cv(values):
+    if len(values) < 3:
+        return 0.0
+    center = median(values)
+    if center <= 0:
+        return 0.0
+    return MAD_SCALE * median([abs(v - center) for v in values]) / center
+
+class ItemStats:
+    __slots__ = ("runs", "failures", "seconds", "durations", "peaks", "status", "running")
+
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.seconds = 0.0
+        self.durations = []
+        self.peaks = []
+        self.status = STATUS_ACTIVE
+        self.running = False
+
+class Scheduler:
+    """Chooses which queue item runs next; the caller runs it and reports back with record()."""
+
+    def __init__(self, count, target=0.05, confidence=0.95, min_runs=10, max_runs=200, budget_s=None):
+        self.items = [ItemStats() for _ in range(count)]
+        self.target = target
+        self.confidence = confidence
+        self.min_runs = min_runs
+        self.max_runs = max_runs
+        self.budget_s = budget_s
+        self.started = time.monotonic()
+
+    def interval(self, index):
+        stats = self.items[index]
+        return wilson_interval(stats.failures, stats.runs, self.confidence)
+
+    def _cost(self, stats):
+        if stats.runs:
+            return max(stats.seconds / stats.runs, 0.01)
+        known = [s.seconds / s.runs for s in self.items if s.runs]
+        return median(known) if known else 1.0
+
+    def priority(self, index):
+        stats = self.items[index]
+        _, high = self.interval(index)
+        score = high / self.target
+        if stats.failures:
+            score *= 1 + FAIL_BOOST
+        score *= 1 + (robust_cv(stats.durations) + robust_cv(stats.peaks)) / VARIATION_REF
+        return score / self._cost(stats)
+
+    def _over_budget(self, stats):
+        if self.budget_s is None:
+            return False
+        return time.monotonic() - self.started + self._cost(stats) > self.budget_s
+
+    def next(self):
+        """Index of the item to run next, or None if no idle item may run now."""
+        candidates = [i for i, s in enumerate(self.items) if s.status == STATUS_ACTIVE and not s.running]
+        candidates = [i for i in candidates if not self._over_budget(self.items[i])]
+        if not candidates:
+            return None
+        # Coverage first: every item reaches min_runs before anything gets extra runs
+        behind = [i for i in candidates if self.items[i].runs < self.min_runs]
+        if behind:
+            index = min(behind, key=lambda i: (self.items[i].runs, i))
+        else:
+            index = max(candidates, key=lambda i: (self.priority(i), -i))
+        self.items[index].running = True
+        return index
+
+    def pending(self):
+        """True while some item may still get more runs (now or once a running one finishes)."""
+        return any(s.status == STATUS_ACTIVE and (s.running or not self._over_budget(s)) for s in self.items)
+
+    def record(self, index, failed, seconds, durations=(), peaks=()):
+        stats = self.items[index]
+        stats.running = False
+        stats.runs += 1
+        stats.failures += 1 if failed else 0
+        stats.seconds += seconds
+        stats.durations.extend(durations)
+        stats.peaks.extend(p for p in peaks if p)
+
+        low, high = self.interval(index)
+        if stats.runs < self.min_runs:
+            return
+        if high < self.target:
+            stats.status = STATUS_CLEARED
+        elif stats.failures >= CONFIRM_FAILURES and low > self.target:
+            stats.status = STATUS_FLAKY
+        elif stats.runs >= self.max_runs:
+            stats.status = STATUS_MAX_RUNS
+
+    def finish(self):
+        """Marks whatever is still active as stopped by the budget."""
+        for stats in self.items:
+            if stats.status == STATUS_ACTIVE:
+                stats.status = STATUS_BUDGET
+
+    def summary(self):
+        counts = {}
+        for stats in self.items:
+            counts[stats.status] = counts.get(stats.status, 0) + 1
+        total_runs = sum(s.runs for s in self.items)
+        return total_runs, counts
+
+def parse_duration(spec):
+    """'90' / '90s' / '30m' / '2h' -> seconds."""
+    text = spec.strip().lower()
+    units = {"s": 1, "m": 60, "h": 3600}
+    try:
+        if text and text[-1] in units:
+            return float(text[:-1]) * units[text[-1]]
+        return float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Bad duration '{spec}', expected e.g. 900, 30m or 2h")
@@ -0,0 +1,155 @@
+"""Per-test transient cgroups (Linux, cgroup v2).
+
+Each test process tree runs in its own child cgroup so the kernel tracks its exact
+peak (memory.peak) and OOM/limit events (memory.events), which polling cannot miss.
+An optional memory.max reproduces a hard memory budget deterministically.
+
+Creating child cgroups needs a delegated subtree: either run as root in a container
+with a writable cgroup namespace, or start the runner in its own delegated scope,
+for example `systemd-run --user --scope -p Delegate=yes python RunMemoryTests.py --cgroup`.
+When that is not possible `CgroupManager.create()` returns None and callers carry
+on without cgroups.
+"""
+import os
+import time
+
+MB = 1024 * 1024
+_UNITS = {"": 1, "K": 1024, "M": MB, "G": 1024 * MB, "T": 1024 * 1024 * MB}
+
+class CgroupUnavailable(Exception):
+    pass
+
+def parse_size(value):
+    """'16G' / '512M' / '1073741824' -> bytes."""
+    text = str(value).strip().upper().rstrip("B")
+    unit = text[-1] if text and text[-1] in _UNITS else ""
+    number = text[:-1] if unit else text
+    return int(float(number) * _UNITS[unit])
+
+def _read(path):
+    with open(path, "r") as f:
+        return f.read()
+
+def _write(path, value):
+    with open(path, "w") as f:
+        f.write(value)
+
+def _cgroup2_mount():
+    with open("/proc/self/mountinfo", "r") as f:
+        for line in f:
+            left, _, right = line.partition(" - ")
+            if right.split()[:1] == ["cgroup2"]:
+                return left.split()[4]
+    return None
+
+def _own_cgroup():
+    for line in _read("/proc/self/cgroup").splitlines():
+        if line.startswith("0::"):
+            return line[3:].strip()
+    return None
+
+class TestCgroup:
+    def __init__(self, path, memory_max=None):
+        self.path = path
+        os.mkdir(path)
+        if memory_max:
+            _write(os.path.join(path, "memory.max"), str(memory_max))
+            # Without this the limit turns into swapping instead of an OOM kill
+            swap_max = os.path.join(path, "memory.swap.max")
+            if os.path.exists(swap_max):
+                _write(swap_max, "0")
+
+    def enter(self):
+        """preexec_fn for the child: moves the forked process into this cgroup before exec."""
+        _write(os.path.join(self.path, "cgroup.procs"), "0")
+
+    def peak_mb(self):
+        """Exact peak from memory.peak (kernel 5.19+), or None when unsupported."""
+        try:
+            return int(_read(os.path.join(self.path, "memory.peak"))) / MB
+        except (OSError, ValueError):
+            return None
+
+    def current_mb(self):
+        try:
+            return int(_read(os.path.join(self.path, "memory.current"))) / MB
+        except (OSError, ValueError):
+            return None
+
+    def events(self):
+        counters = {}
+        try:
+            for line in _read(os.path.join(self.path, "memory.events")).splitlines():
+                key, _, value = line.partition(" ")
+                counters[key] = int(value)
+        except (OSError, ValueError):
+            pass
+        return counters
+
+    def destroy(self, timeout=5.0):
+        # Lingering build servers or orphaned testhosts would keep the cgroup busy
+        kill_file = os.path.join(self.path, "cgroup.kill")
+        procs_file = os.path.join(self.path, "cgroup.procs")
+        try:
+            if os.path.exists(kill_file):
+                _write(kill_file, "1")
+            deadline = time.monotonic() + timeout
+            while _read(procs_file).strip() and time.monotonic() < deadline:
+                time.sleep(0.05)
+            os.rmdir(self.path)
+        except OSError:
+            pass
+
+class CgroupManager:
+    """Owns a parent cgroup with the memory controller enabled for per-test children."""
+
+    def __init__(self, parent):
+        self.parent = parent
+        self._counter = 0
+
+    @classmethod
+    def create(cls, log=print):
+        try:
+            return cls(cls._prepare_parent())
+        except (CgroupUnavailable, OSError) as e:
+            log(f"Warning: cgroup v2 memory accounting unavailable ({e}). Falling back to sampling only.")
+            return None
+
+    @staticmethod
+    def _prepare_parent():
+        mount = _cgroup2_mount()
+        own = _own_cgroup()
+        if not mount or own is None:
+            raise CgroupUnavailable("no cgroup v2 hierarchy")
+
+        current = os.path.join(mount, own.lstrip("/"))
+        if "memory" not in _read(os.path.join(current, "cgroup.controllers")).split():
+            raise CgroupUnavailable(f"memory controller not delegated to {current}")
+
+        subtree = os.path.join(current, "cgroup.subtree_control")
+        if "memory" in _read(subtree).split():
+            return current
+
+        # "No internal processes": the runner moves into a leaf of its own before the
+        # memory controller can be enabled for its children.
+        leaf = os.path.join(current, f"ia-runner-{os.getpid()}")
+        os.makedirs(leaf, exist_ok=True)
+        _write(os.path.join(leaf, "cgroup.procs"), str(os.getpid()))
+        try:
+            _write(subtree, "+memory")
+        except OSError as e:
+            _write(os.path.join(current, "cgroup.procs"), str(os.getpid()))
+            os.rmdir(leaf)
+            raise CgroupUnavailable(f"cannot enable memory controller in {current}: {e.strerror}")
+        return current
+
+    def new_test_cgroup(self, memory_max=None):
+        self._counter += 1
+        return TestCgroup(os.path.join(self.parent, f"ia-test-{os.getpid()}-{self._counter}"), memory_max)
+
+def env_for_cgroup(base_env=None):
+    """Environment that keeps MSBuild/compiler servers from outliving the test cgroup."""
+    env = dict(os.environ if base_env is None else base_env)
+    env["MSBUILDDISABLENODEREUSE"] = "1"
+    env["DOTNET_CLI_USE_MSBUILD_SERVER"] = "0"
+    return env
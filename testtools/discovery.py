@@ -0,0 +1,179 @@
+"""Test discovery cached on the built test assembly.
+
+`dotnet test <project> --list-tests` builds the project and starts a testhost just
+to print test names. The list only changes when the compiled assembly does, so it
+is cached on disk under a hash of the output assembly and every dependency next
+to it. The cache also records each of those files' size and mtime, so a hit
+costs a stat per file; they are only hashed again when a stamp changes. A miss
+lists tests from the existing assembly through vstest, building first only when
+sources are newer than it.
+"""
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import xml.etree.ElementTree as ET
+
+from testtools import host
+
+CACHE_FILE = os.path.abspath(".test_discovery_cache.json")
+# Build inputs: anything else under a project (test data, settings, corpus manifests) must not force a build
+SOURCE_EXTENSIONS = (".cs", ".csproj", ".props", ".targets", ".resx")
+# JSON that MSBuild itself reads; other JSON counts only if the project file includes it as an item
+BUILD_JSON = ("global.json", "packages.lock.json", "runtimeconfig.template.json")
+
+def project_references(project_path):
+    try:
+        root = ET.parse(project_path).getroot()
+    except (ET.ParseError, OSError):
+        return []
+    project_dir = os.path.dirname(project_path)
+    refs = []
+    for elem in root.iter():
+        if elem.tag.rsplit("}", 1)[-1] == "ProjectReference" and elem.get("Include"):
+            include = elem.get("Include").replace("\\", os.sep)
+            refs.append(os.path.normpath(os.path.join(project_dir, include)))
+    return refs
+
+def _project_closure(project_path):
+    seen = []
+    queue = [os.path.abspath(project_path)]
+    while queue:
+        path = queue.pop()
+        if path in seen or not os.path.exists(path):
+            continue
+        seen.append(path)
+        queue.extend(project_references(path))
+    return seen
+
+def _json_items(project_path):
+    """Absolute paths of .json files the project file includes as items (Content, None, EmbeddedResource...)."""
+    try:
+        root = ET.parse(project_path).getroot()
+    except (ET.ParseError, OSError):
+        return set()
+    project_dir = os.path.dirname(project_path)
+    items = set()
+    for elem in root.iter():
+        for include in (elem.get("Include") or "").split(";"):
+            include = include.strip().replace("\\", os.sep)
+            if include.lower().endswith(".json"):
+                items.update(os.path.normpath(p) for p in glob.glob(os.path.join(project_dir, include), recursive=True))
+    return items
+
+def _newest_source_mtime(project_path):
+    newest = 0
+    for project in _project_closure(project_path):
+        project_dir = os.path.dirname(project)
+        json_items = _json_items(project)
+        for dirpath, dirnames, filenames in os.walk(project_dir):
+            dirnames[:] = [d for d in dirnames if d not in ("bin", "obj", "TestResults")]
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if (filename.endswith(SOURCE_EXTENSIONS) or filename.endswith(BUILD_JSON)
+                        or (filename.endswith(".json") and os.path.normpath(path) in json_items)):
+                    newest = max(newest, os.path.getmtime(path))
+    return newest
+
+def find_built_assembly(project_path, configuration):
+    """Locates the output assembly from the conventional bin/ layout without invoking MSBuild."""
+    project_dir = os.path.dirname(os.path.abspath(project_path))
+    name = os.path.splitext(os.path.basename(project_path))[0]
+    try:
+        for elem in ET.parse(project_path).getroot().iter():
+            if elem.tag.rsplit("}", 1)[-1] == "AssemblyName" and elem.text:
+                name = elem.text.strip()
+    except (ET.ParseError, OSError):
+        pass
+
+    candidates = glob.glob(os.path.join(project_dir, "bin", configuration, "*", f"{name}.dll"))
+    return max(candidates, key=os.path.getmtime) if candidates else None
+
+def _output_files(assembly_path):
+    output_dir = os.path.dirname(assembly_path)
+    return sorted(glob.glob(os.path.join(output_dir, "*.dll")) + glob.glob(os.path.join(output_dir, "*.deps.json")))
+
+def assembly_stamp(assembly_path):
+    """[name, size, mtime_ns] of the assembly and every dependency; cheap to compare before hashing."""
+    stamp = []
+    for path in _output_files(assembly_path):
+        st = os.stat(path)
+        stamp.append([os.path.basename(path), st.st_size, st.st_mtime_ns])
+    return stamp
+
+def assembly_key(assembly_path):
+    """Hash of the assembly and every dependency (dlls + deps.json) in its output directory."""
+    digest = hashlib.sha256()
+    for path in _output_files(assembly_path):
+        digest.update(os.path.basename(path).encode("utf-8"))
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+def parse_list_output(stdout):
+    tests = []
+    capture = False
+    for line in stdout.splitlines():
+        if "The following Tests are available:" in line:
+            capture = True
+            continue
+        if capture and line.strip():
+            tests.append(line.strip())
+    return tests
+
+def _load_cache():
+    try:
+        with open(CACHE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_cache(cache):
+    tmp_path = CACHE_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=1)
+    os.replace(tmp_path, CACHE_FILE)
+
+def discover_tests(project_path, configuration="Debug", refresh=False, log=print):
+    """Returns the fully qualified test names of `project_path`, using the cache when valid."""
+    project_key = os.path.abspath(project_path)
+
+    assembly = find_built_assembly(project_path, configuration)
+    if assembly is None or os.path.getmtime(assembly) < _newest_source_mtime(project_path):
+        log("Test assembly missing or out of date, building...")
+        host.build_project(project_path, configuration)
+        assembly = find_built_assembly(project_path, configuration) or host.resolve_test_assembly(project_path, configuration)
+
+    stamp = assembly_stamp(assembly)
+    cache = _load_cache()
+    entry = cache.get(project_key)
+    if not refresh and entry and entry.get("configuration") == configuration:
+        if entry.get("stamp") == stamp:
+            log("Using cached test discovery.")
+            return list(entry["tests"])
+        # Touched but possibly identical (e.g. a no-op rebuild): hash before relisting
+        key = assembly_key(assembly)
+        if entry.get("key") == key:
+            entry["stamp"] = stamp
+            try:
+                _save_cache(cache)
+            except OSError as e:
+                log(f"Warning: could not write discovery cache: {e}")
+            log("Using cached test discovery.")
+            return list(entry["tests"])
+    else:
+        key = assembly_key(assembly)
+
+    result = subprocess.run(["dotnet", "test", assembly, "--list-tests"], capture_output=True, text=True)
+    tests = parse_list_output(result.stdout)
+
+    if result.returncode == 0:
+        cache[project_key] = {"configuration": configuration, "assembly": assembly, "key": key, "stamp": stamp,
+                              "tests": tests}
+        try:
+            _save_cache(cache)
+        except OSError as e:
+            log(f"Warning: could not write discovery cache: {e}")
+    return tests
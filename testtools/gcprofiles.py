@@ -0,0 +1,124 @@
+""".NET GC configuration profiles for RunMemoryTests.py.
+
+A profile is a set of documented DOTNET_ GC environment variables applied to the
+test host. Numeric GC settings are read by the runtime as hexadecimal, so heap
+counts and the hard limit are written in hex here:
+
+    DOTNET_gcServer          0 = workstation, 1 = server
+    DOTNET_gcConcurrent      0/1, background GC
+    DOTNET_GCHeapCount       server GC heaps (hex)
+    DOTNET_GCHeapHardLimit   total GC heap limit in bytes (hex)
+    DOTNET_GCConserveMemory  0-9, how hard the GC compacts to limit fragmentation
+
+Profiles are either one of PRESETS or `name:key=value,...` with the keys
+server, concurrent, heaps, hard-limit (16G, 512M, ...) and conserve.
+"""
+import argparse
+import csv
+from collections import namedtuple
+from statistics import median
+
+from testtools import cgroup
+
+GcProfile = namedtuple("GcProfile", ["name", "env"])
+
+_KEYS = {
+    "server": "DOTNET_gcServer",
+    "concurrent": "DOTNET_gcConcurrent",
+    "heaps": "DOTNET_GCHeapCount",
+    "hard-limit": "DOTNET_GCHeapHardLimit",
+    "conserve": "DOTNET_GCConserveMemory",
+}
+
+PRESETS = {
+    "default": {},
+    "workstation": {"server": "0", "concurrent": "1"},
+    "workstation-nonconcurrent": {"server": "0", "concurrent": "0"},
+    "server": {"server": "1", "concurrent": "1"},
+    "server-nonconcurrent": {"server": "1", "concurrent": "0"},
+    "server-conserve": {"server": "1", "conserve": "7"},
+}
+
+def _env_value(key, value):
+    if key in ("server", "concurrent"):
+        if value not in ("0", "1"):
+            raise ValueError(f"{key} must be 0 or 1")
+        return value
+    if key == "heaps":
+        return format(int(value), "X")
+    if key == "hard-limit":
+        return format(cgroup.parse_size(value), "X")
+    if key == "conserve":
+        level = int(value)
+        if not 0 <= level <= 9:
+            raise ValueError("conserve must be 0-9")
+        return str(level)
+    raise ValueError(f"unknown key '{key}'")
+
+def build_profile(name, settings):
+    return GcProfile(name, {_KEYS[key]: _env_value(key, value) for key, value in settings.items()})
+
+def parse_profile(spec):
+    """'server' (a preset) or 'srv4:server=1,heaps=4,hard-limit=8G'."""
+    name, sep, body = spec.partition(":")
+    if not sep:
+        if name not in PRESETS:
+            raise argparse.ArgumentTypeError(f"Unknown GC profile '{name}'; presets: {', '.join(PRESETS)}")
+        return build_profile(name, PRESETS[name])
+
+    settings = {}
+    for item in body.split(","):
+        key, eq, value = item.partition("=")
+        key = key.strip().lower()
+        if not eq or key not in _KEYS:
+            raise argparse.ArgumentTypeError(f"Bad GC setting '{item}'; keys: {', '.join(_KEYS)}")
+        settings[key] = value.strip()
+    try:
+        return build_profile(name, settings)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"GC profile '{name}': {e}")
+
+def is_oom(row):
+    if row.get("OomKills") not in (None, "", 0, "0"):
+        return True
+    return "OutOfMemory" in (row.get("Error") or "")
+
+def report(rows, profiles, csv_path=None):
+    """Per test, one line per GC profile: pass count, median peak, median passing duration, OOMs."""
+    names = [p.name for p in profiles]
+    table = {}
+    for row in rows:
+        cell = table.setdefault(row["Test"], {}).setdefault(row.get("GcProfile", "default"),
+                                                            {"runs": 0, "passed": 0, "ooms": 0, "peaks": [], "durations": []})
+        cell["runs"] += 1
+        if is_oom(row):
+            cell["ooms"] += 1
+        # Peaks of failed runs still count: how high a profile got before an OOM matters here
+        if float(row["MaxMB"] or 0) > 0:
+            cell["peaks"].append(float(row["MaxMB"]))
+        if row["Result"] == "Pass":
+            cell["passed"] += 1
+            cell["durations"].append(float(row["DurationS"]))
+
+    width = max(len(n) for n in names)
+    lines = []
+    for test in sorted(table):
+        print(f"\n{test}")
+        for name in names:
+            cell = table[test].get(name)
+            if cell is None:
+                continue
+            peak = median(cell["peaks"]) if cell["peaks"] else None
+            duration = median(cell["durations"]) if cell["durations"] else None
+            peak_text = f"{peak:9.2f} MB" if peak is not None else f"{'-':>12}"
+            duration_text = f"{duration:8.2f} s" if duration is not None else f"{'-':>10}"
+            oom_text = f"  OOM x{cell['ooms']}" if cell["ooms"] else ""
+            print(f"  {name:<{width}} | {cell['passed']}/{cell['runs']} pass | {peak_text} | {duration_text}{oom_text}")
+            lines.append([test, name, cell["runs"], cell["passed"], cell["ooms"],
+                          round(peak, 2) if peak is not None else "", round(duration, 4) if duration is not None else ""])
+
+    if csv_path:
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Test", "GcProfile", "Runs", "Passed", "OomRuns", "PeakMB", "DurationS"])
+            writer.writerows(lines)
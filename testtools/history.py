@@ -0,0 +1,286 @@
+"""SQLite history of test results across runs, commits and machines.
+
+Every runner invocation becomes a row in `runs` (git commit, start time, host
+fingerprint, runner) and every test execution a row in `results`. Results are
+buffered and written in one transaction per FLUSH_ROWS rows or FLUSH_SECONDS, so
+a 200-iteration stress run costs a handful of commits rather than one per test,
+and an interrupted run still keeps everything up to the last flush.
+
+    python -m testtools.history runs
+    python -m testtools.history trend HighRes_Extreme.Topology_Chain --by-commit
+    python -m testtools.history top duration --last-runs 20
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import time
+
+DEFAULT_DB = os.path.abspath("test_history.db")
+FLUSH_ROWS = 500
+FLUSH_SECONDS = 5.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hosts (
+    fingerprint TEXT PRIMARY KEY,
+    description TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    git_commit TEXT,
+    git_branch TEXT,
+    dirty INTEGER,
+    host TEXT NOT NULL REFERENCES hosts(fingerprint),
+    runner TEXT NOT NULL,
+    command TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    test TEXT NOT NULL,
+    config TEXT NOT NULL DEFAULT 'default',
+    iteration INTEGER,
+    passed INTEGER NOT NULL,
+    duration_s REAL,
+    max_mb REAL,
+    avg_mb REAL,
+    cpu_s REAL,
+    images_per_s REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS results_test ON results(test, config, run_id);
+CREATE INDEX IF NOT EXISTS results_run ON results(run_id);
+CREATE INDEX IF NOT EXISTS runs_commit ON runs(git_commit);
+CREATE INDEX IF NOT EXISTS runs_started ON runs(started);
+"""
+
+_RESULT_COLUMNS = ("run_id", "test", "config", "iteration", "passed", "duration_s", "max_mb", "avg_mb", "cpu_s",
+                   "images_per_s", "error")
+
+def connect(path=None):
+    conn = sqlite3.connect(path or DEFAULT_DB)
+    # WAL lets the query CLI read while a stress run is still writing
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def host_fingerprint():
+    """(short hash, description) of what makes timings comparable: CPU model and count, memory, OS."""
+    cpu_model = platform.processor()
+    mem_total = ""
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    cpu_model = line.split(":", 1)[1].strip()
+                    break
+        with open("/proc/meminfo", "r") as f:
+            mem_total = f.readline().split(":", 1)[1].strip()
+    except (OSError, IndexError):
+        pass
+    description = {
+        "node": platform.node(),
+        "system": f"{platform.system()} {platform.release()}",
+        "machine": platform.machine(),
+        "cpu": cpu_model,
+        "cpus": os.cpu_count(),
+        "memory": mem_total,
+    }
+    digest = hashlib.sha1(json.dumps(description, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    return digest, description
+
+def git_state(directory=None):
+    """(commit, branch, dirty) of the checkout containing `directory`, or (None, None, None)."""
+    def git(*args):
+        result = subprocess.run(["git", "-C", directory or ".", *args], capture_output=True, text=True)
+        return result.stdout.strip() if result.returncode == 0 else None
+
+    try:
+        commit = git("rev-parse", "HEAD")
+    except OSError:
+        return None, None, None
+    if commit is None:
+        return None, None, None
+    dirty = git("status", "--porcelain", "--untracked-files=no")
+    return commit, git("rev-parse", "--abbrev-ref", "HEAD"), int(bool(dirty))
+
+def _number(value):
+    if value in (None, ""):
+        return None
+    return float(value)
+
+class HistoryWriter:
+    """Records one runner invocation; add() buffers, flush() commits the buffer in one transaction."""
+
+    def __init__(self, path, runner, command=None, source_dir=None):
+        self.conn = connect(path)
+        self._pending = []
+        self._last_flush = time.monotonic()
+        fingerprint, description = host_fingerprint()
+        commit, branch, dirty = git_state(source_dir)
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO hosts (fingerprint, description) VALUES (?, ?)",
+                              (fingerprint, json.dumps(description, sort_keys=True)))
+            cursor = self.conn.execute(
+                "INSERT INTO runs (started, git_commit, git_branch, dirty, host, runner, command) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), commit, branch, dirty, fingerprint, runner, command))
+        self.run_id = cursor.lastrowid
+
+    def add(self, test, passed, iteration=None, config="default", duration=None, max_mb=None, avg_mb=None,
+            cpu=None, images_per_s=None, error=None):
+        self._pending.append((self.run_id, test, config or "default", iteration, int(bool(passed)), _number(duration),
+                              _number(max_mb), _number(avg_mb), _number(cpu), _number(images_per_s), error or None))
+        if len(self._pending) >= FLUSH_ROWS or time.monotonic() - self._last_flush >= FLUSH_SECONDS:
+            self.flush()
+
+    def add_memory_row(self, row):
+        """Adds a RunMemoryTests.py result row."""
+        config = row.get("Config", "default")
+        if row.get("GcProfile") not in (None, "", "default"):
+            config += f",GC={row['GcProfile']}"
+        if row.get("Cores"):
+            config += f",Cores={row['Cores']}"
+        self.add(row["Test"], row["Result"] == "Pass", iteration=row.get("Run"), config=config,
+                 duration=row.get("DurationS"), max_mb=row.get("MaxMB"), avg_mb=row.get("AvgMB"),
+                 cpu=row.get("CpuS"), images_per_s=row.get("ImagesPerS"), error=row.get("Error"))
+
+    def flush(self):
+        if self._pending:
+            with self.conn:
+                self.conn.executemany(
+                    f"INSERT INTO results ({', '.join(_RESULT_COLUMNS)}) VALUES ({', '.join('?' * len(_RESULT_COLUMNS))})",
+                    self._pending)
+            self._pending = []
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def resolve_tests(conn, pattern):
+    """Exact test names, else every recorded test ending with or containing `pattern`."""
+    if conn.execute("SELECT 1 FROM results WHERE test = ? LIMIT 1", (pattern,)).fetchone():
+        return [pattern]
+    names = [r[0] for r in conn.execute("SELECT DISTINCT test FROM results WHERE test LIKE ? ORDER BY test",
+                                        (f"%{pattern}%",))]
+    suffix = [n for n in names if n.endswith("." + pattern)]
+    return suffix or names
+
+def _recent_runs_clause(last_runs, runner):
+    clauses, params = [], []
+    if runner:
+        clauses.append("run_id IN (SELECT id FROM runs WHERE runner = ?)")
+        params.append(runner)
+    if last_runs:
+        where = "WHERE runner = ? " if runner else ""
+        clauses.append(f"run_id >= (SELECT MIN(id) FROM (SELECT id FROM runs {where}ORDER BY id DESC LIMIT ?))")
+        params += ([runner] if runner else []) + [last_runs]
+    return (" AND ".join(clauses) or "1"), params
+
+def trend(conn, test, config=None, limit=20, by_commit=False):
+    """Per run (or per commit), newest first: label, executions, passes, avg/max MaxMB, avg/max duration."""
+    group = "r.git_commit" if by_commit else "x.run_id"
+    label = ("COALESCE(SUBSTR(r.git_commit, 1, 10), '-') || CASE WHEN MAX(r.dirty) THEN '+' ELSE '' END" if by_commit
+             else "r.id || ' ' || STRFTIME('%Y-%m-%d %H:%M', r.started, 'unixepoch', 'localtime') || ' ' || "
+                  "COALESCE(SUBSTR(r.git_commit, 1, 10), '-')")
+    sql = f"""
+        SELECT {label}, COUNT(*), SUM(x.passed), AVG(x.max_mb), MAX(x.max_mb), AVG(x.duration_s), MAX(x.duration_s)
+        FROM results x JOIN runs r ON r.id = x.run_id
+        WHERE x.test = ? {"AND x.config = ?" if config else ""}
+        GROUP BY {group} ORDER BY MAX(x.run_id) DESC LIMIT ?"""
+    return conn.execute(sql, [test] + ([config] if config else []) + [limit]).fetchall()
+
+TOP_ORDER = {
+    "duration": "AVG(duration_s) DESC",
+    "memory": "MAX(max_mb) DESC",
+    "failures": "1.0 * SUM(passed) / COUNT(*) ASC, COUNT(*) DESC",
+}
+
+def top(conn, by="duration", limit=10, last_runs=None, runner=None):
+    """(test, config, executions, pass rate, avg duration, max duration, avg MaxMB, max MaxMB) ranked by `by`."""
+    where, params = _recent_runs_clause(last_runs, runner)
+    sql = f"""
+        SELECT test, config, COUNT(*), 1.0 * SUM(passed) / COUNT(*), AVG(duration_s), MAX(duration_s), AVG(max_mb), MAX(max_mb)
+        FROM results WHERE {where}
+        GROUP BY test, config {"HAVING SUM(passed) < COUNT(*)" if by == "failures" else ""}
+        ORDER BY {TOP_ORDER[by]} LIMIT ?"""
+    return conn.execute(sql, params + [limit]).fetchall()
+
+def recent_runs(conn, limit=20):
+    return conn.execute("""
+        SELECT r.id, STRFTIME('%Y-%m-%d %H:%M', r.started, 'unixepoch', 'localtime'), r.runner,
+               COALESCE(SUBSTR(r.git_commit, 1, 10), '-') || CASE WHEN r.dirty THEN '+' ELSE '' END, r.host,
+               (SELECT COUNT(*) FROM results WHERE run_id = r.id),
+               (SELECT SUM(passed) FROM results WHERE run_id = r.id)
+        FROM runs r ORDER BY r.id DESC LIMIT ?""", (limit,)).fetchall()
+
+def _fmt(value, spec=".2f"):
+    return "-" if value is None else format(value, spec)
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the test result history database")
+    parser.add_argument('--db', type=str, default=DEFAULT_DB, help='History database path')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    runs_cmd = commands.add_parser('runs', help='List recorded runner invocations')
+    runs_cmd.add_argument('--limit', type=int, default=20)
+
+    trend_cmd = commands.add_parser('trend', help='Pass rate, MaxMB and duration of one test over time')
+    trend_cmd.add_argument('test', help='Full test name or a unique part of it')
+    trend_cmd.add_argument('--config', type=str, default=None, help='Only this configuration label')
+    trend_cmd.add_argument('--by-commit', action='store_true', help='One line per git commit instead of per run')
+    trend_cmd.add_argument('--limit', type=int, default=20)
+
+    top_cmd = commands.add_parser('top', help='Slowest, most memory-hungry or least reliable tests')
+    top_cmd.add_argument('by', choices=sorted(TOP_ORDER), help='Ranking')
+    top_cmd.add_argument('--last-runs', type=int, default=None, help='Only the most recent N runs')
+    top_cmd.add_argument('--runner', type=str, default=None, help='Only runs of this runner (RunTests, RunMemoryTests)')
+    top_cmd.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"No history database at {args.db}", file=sys.stderr)
+        sys.exit(1)
+    conn = connect(args.db)
+
+    if args.command == 'runs':
+        print(f"{'Run':>5} | {'Started':<16} | {'Runner':<14} | {'Commit':<11} | {'Host':<12} | {'Tests':>6} | {'Pass %':>6}")
+        for run_id, started, runner, commit, host, count, passed in recent_runs(conn, args.limit):
+            rate = f"{100.0 * passed / count:.1f}" if count else "-"
+            print(f"{run_id:>5} | {started:<16} | {runner:<14} | {commit:<11} | {host:<12} | {count:>6} | {rate:>6}")
+
+    elif args.command == 'trend':
+        names = resolve_tests(conn, args.test)
+        if not names:
+            print(f"No results recorded for '{args.test}'", file=sys.stderr)
+            sys.exit(1)
+        if len(names) > 1:
+            print(f"'{args.test}' matches {len(names)} tests; be more specific:\n  " + "\n  ".join(names[:20]), file=sys.stderr)
+            sys.exit(1)
+        print(names[0])
+        print(f"  {'Run / commit':<38} | {'N':>5} | {'Pass %':>6} | {'Avg MB':>9} | {'Max MB':>9} | {'Avg s':>8} | {'Max s':>8}")
+        for label, count, passed, avg_mb, max_mb, avg_s, max_s in trend(conn, names[0], args.config, args.limit, args.by_commit):
+            print(f"  {label:<38} | {count:>5} | {100.0 * passed / count:>6.1f} | {_fmt(avg_mb):>9} | {_fmt(max_mb):>9}"
+                  f" | {_fmt(avg_s, '.3f'):>8} | {_fmt(max_s, '.3f'):>8}")
+
+    elif args.command == 'top':
+        print(f"{'Test':<70} | {'N':>6} | {'Pass %':>6} | {'Avg s':>8} | {'Max s':>8} | {'Avg MB':>9} | {'Max MB':>9}")
+        for test, config, count, rate, avg_s, max_s, avg_mb, max_mb in top(conn, args.by, args.limit, args.last_runs, args.runner):
+            name = test if config == "default" else f"{test} [{config}]"
+            name = name if len(name) <= 70 else ".." + name[-68:]
+            print(f"{name:<70} | {count:>6} | {100.0 * rate:>6.1f} | {_fmt(avg_s, '.3f'):>8} | {_fmt(max_s, '.3f'):>8}"
+                  f" | {_fmt(avg_mb):>9} | {_fmt(max_mb):>9}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Build-once execution of a compiled test assembly.
+
+`dotnet test <project>` re-evaluates the project, checks the incremental build and
+starts a fresh testhost on every call. Building once and handing the output assembly
+straight to `dotnet test <assembly>` skips MSBuild entirely, and batching several
+tests into one filter lets a single testhost run all of them.
+"""
+import glob
+import os
+import subprocess
+
+class BuildError(Exception):
+    pass
+
+def build_project(project_path, configuration):
+    cmd = ["dotnet", "build", project_path, "--configuration", configuration]
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise BuildError(f"dotnet build failed for {project_path}\n{result.stderr}")
+
+def resolve_test_assembly(project_path, configuration):
+    """Returns the absolute path of the project's built output assembly."""
+    cmd = ["dotnet", "msbuild", project_path, "-getProperty:TargetPath", f"-p:Configuration={configuration}"]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode == 0:
+        target = result.stdout.strip().splitlines()[-1].strip() if result.stdout.strip() else ""
+        if target and os.path.exists(target):
+            return os.path.abspath(target)
+
+    # Older SDKs have no -getProperty; fall back to the conventional output layout
+    project_dir = os.path.dirname(os.path.abspath(project_path))
+    name = os.path.splitext(os.path.basename(project_path))[0]
+    candidates = glob.glob(os.path.join(project_dir, "bin", configuration, "*", f"{name}.dll"))
+    if not candidates:
+        raise BuildError(f"Could not locate the built assembly for {project_path}")
+    return max(candidates, key=os.path.getmtime)
+
+def prepare_assembly(project_path, configuration):
+    build_project(project_path, configuration)
+    return resolve_test_assembly(project_path, configuration)
+
+def batch_filter(test_names):
+    return "|".join(f"FullyQualifiedName={name}" for name in test_names)
+
+def chunked(items, size):
+    size = max(1, size)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def assembly_test_command(assembly_path, trx_path, test_filter="", serial=False):
+    """
+    Command running an already-built assembly. `serial` disables xUnit's parallel
+    collections so memory samples can be attributed to one test at a time.
+    """
+    cmd = ["dotnet", "test", assembly_path, "--logger", f"trx;LogFileName={trx_path}"]
+    if test_filter:
+        cmd.extend(["--filter", test_filter])
+    if serial:
+        cmd.extend(["--", "xUnit.ParallelizeTestCollections=false"])
+    return cmd
+
+def attribute_samples(samples, windows):
+    """
+    Splits timestamped samples [(epoch, mb), ...] across per-test windows
+    {key: (start, end)}. Tests whose window caught no sample get the nearest one,
+    so very short tests still report the host's footprint at that moment.
+    """
+    attributed = {}
+    if not samples:
+        return attributed
+
+    for key, (start, end) in windows.items():
+        if start is None or end is None:
+            continue
+        inside = [mb for (t, mb) in samples if start <= t <= end]
+        if not inside:
+            nearest = min(samples, key=lambda s: abs(s[0] - start))
+            inside = [nearest[1]]
+        attributed[key] = inside
+    return attributed
@@ -0,0 +1,116 @@
+"""Leak detection from memory growth across execution cycles and repeated runs.
+
+Within a run the engine's footprint saw-tooths: it rises while a shipment is in
+flight and falls back once the Warehouse releases it. The troughs between cycles
+(post-cycle baselines) are what the process retains; if they climb steadily,
+something is not being disposed. Growth is estimated with the Theil-Sen slope and
+its significance with the Mann-Kendall trend test, both robust to the outliers GC
+timing produces. Several runs are combined with Fisher's method.
+"""
+import math
+from collections import namedtuple
+from statistics import median
+
+MB = 1024 * 1024
+MIN_POINTS = 4
+
+VERDICT_LEAK = "leak"
+VERDICT_STABLE = "stable"
+VERDICT_UNKNOWN = "n/a"
+
+LeakResult = namedtuple("LeakResult", ["verdict", "bytes_per_step", "p_value", "points"])
+UNKNOWN = LeakResult(VERDICT_UNKNOWN, 0.0, 1.0, 0)
+
+def post_cycle_baselines(values, prominence=None):
+    """
+    Troughs of a saw-tooth series: each local minimum that a rise of at least
+    `prominence` MB follows, plus the final settle. By default the prominence is
+    5% of the series range (at least 1 MB).
+    """
+    if len(values) < 3:
+        return []
+    if prominence is None:
+        prominence = max(1.0, 0.05 * (max(values) - min(values)))
+
+    troughs = []
+    rising = True
+    extreme = values[0]
+    for v in values:
+        if rising:
+            if v > extreme:
+                extreme = v
+            elif v < extreme - prominence:
+                rising = False
+                extreme = v
+        else:
+            if v < extreme:
+                extreme = v
+            elif v > extreme + prominence:
+                troughs.append(extreme)
+                rising = True
+                extreme = v
+    if not rising:
+        troughs.append(extreme)
+    return troughs
+
+def theil_sen_slope(ys):
+    n = len(ys)
+    # Pairwise slopes are O(n^2); thin very long series, the median barely moves
+    step = max(1, n // 300)
+    points = list(range(0, n, step))
+    slopes = [(ys[j] - ys[i]) / (j - i) for a, i in enumerate(points) for j in points[a + 1:]]
+    return median(slopes) if slopes else 0.0
+
+def mann_kendall_p(ys):
+    """One-sided p-value for an increasing trend (normal approximation, tie-corrected)."""
+    n = len(ys)
+    s = 0
+    for i in range(n - 1):
+        for j in range(i + 1, n):
+            diff = ys[j] - ys[i]
+            s += (diff > 0) - (diff < 0)
+
+    ties = {}
+    for y in ys:
+        ties[y] = ties.get(y, 0) + 1
+    variance = (n * (n - 1) * (2 * n + 5) - sum(t * (t - 1) * (2 * t + 5) for t in ties.values())) / 18
+    if variance <= 0:
+        return 1.0
+    z = (s - 1) / math.sqrt(variance) if s > 0 else (s + 1) / math.sqrt(variance) if s < 0 else 0.0
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+def fisher_combine(p_values):
+    """Fisher's method; the chi-square survival function has a closed form for even dof."""
+    p_values = [max(p, 1e-300) for p in p_values]
+    if not p_values:
+        return 1.0
+    half = -sum(math.log(p) for p in p_values)
+    term = total = math.exp(-half)
+    for i in range(1, len(p_values)):
+        term *= half / i
+        total += term
+    return min(1.0, total)
+
+def assess(series_list, alpha=0.05, min_growth_mb=1.0):
+    """
+    Judges one or more baseline series (MB). A leak needs a significant upward trend
+    and a fitted growth of at least `min_growth_mb` over the observed steps.
+    Returns a LeakResult with the median per-step growth in bytes.
+    """
+    usable = [s for s in series_list if len(s) >= MIN_POINTS]
+    if not usable:
+        return UNKNOWN
+
+    slope = median(theil_sen_slope(s) for s in usable)
+    p_value = fisher_combine([mann_kendall_p(s) for s in usable])
+    steps = max(len(s) for s in usable) - 1
+
+    verdict = VERDICT_STABLE
+    if p_value < alpha and slope * steps >= min_growth_mb:
+        verdict = VERDICT_LEAK
+    return LeakResult(verdict, slope * MB, p_value, sum(len(s) for s in usable))
+
+def worst(*results):
+    """Picks the most severe verdict (leak over stable over unknown)."""
+    rank = {VERDICT_LEAK: 2, VERDICT_STABLE: 1, VERDICT_UNKNOWN: 0}
+    return max(results, key=lambda r: (rank[r.verdict], -r.p_value))
@@ -0,0 +1,322 @@
+"""Live progress feed for long runs: a JSONL event stream and a Prometheus endpoint.
+
+Events are one JSON object per line, appended to a file or sent to a local Unix
+socket (`unix:/path`, e.g. one opened with `socat UNIX-LISTEN:/tmp/feed.sock -`):
+
+    {"event": "start", "ts": ..., "runner": "RunMemoryTests", "planned": 192, ...}
+    {"event": "memory", "ts": ..., "label": ..., "window_s": 1.0, "samples": 10, "rss_mb": ..., "pss_mb": ..., "testhost_mb": ..., "cpu_s": ...}
+    {"event": "test", "ts": ..., "test": ..., "result": "Pass", "duration_s": ..., "max_mb": ..., ...}
+    {"event": "launch", "ts": ..., "label": ..., "wall_s": ..., "ok": true}
+    {"event": "end", "ts": ..., "completed": ..., "passed": ..., "failed": ...}
+
+Memory samples are folded into one "memory" event per launch and WINDOW_SECONDS
+(maxima over the window), so the stream grows with run time, not sample rate.
+Writes are buffered and flushed every FLUSH_SECONDS, at FLUSH_BYTES, and at the
+end of each launch; a socket reader that falls behind loses the oldest data
+rather than stalling the run.
+
+The metrics endpoint serves the Prometheus text format on 127.0.0.1 from a
+daemon thread, so it costs nothing until it is scraped. It exposes progress,
+ETA, the latest memory sample of every running launch and pass/fail counters,
+both cumulative and over the last ROLLING_TESTS results.
+"""
+import json
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from testtools import procmem
+
+WINDOW_SECONDS = 1.0
+FLUSH_SECONDS = 1.0
+FLUSH_BYTES = 64 * 1024
+# A socket reader this far behind starts losing the oldest events
+MAX_BACKLOG = 4 * 1024 * 1024
+ROLLING_TESTS = 100
+METRICS_HOST = "127.0.0.1"
+PREFIX = "testrun_"
+ERROR_CHARS = 300
+
+class EventStream:
+    """Buffered JSONL writer for a file path or 'unix:<socket path>'."""
+
+    def __init__(self, target):
+        self.target = target
+        self.file = None
+        self.sock = None
+        self.pending = []
+        self.pending_bytes = 0
+        self.backlog = b""
+        self.dropped = 0
+        self.last_flush = time.monotonic()
+        if target.startswith("unix:"):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(target[len("unix:"):])
+            self.sock.setblocking(False)
+        else:
+            self.file = open(target, "a", encoding="utf-8")
+
+    def emit(self, event, **fields):
+        line = json.dumps(dict(event=event, ts=round(time.time(), 3), **fields), default=str) + "\n"
+        self.pending.append(line)
+        self.pending_bytes += len(line)
+        if self.pending_bytes >= FLUSH_BYTES or time.monotonic() - self.last_flush >= FLUSH_SECONDS:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.pending and not self.backlog:
+            return
+        data = "".join(self.pending)
+        self.pending = []
+        self.pending_bytes = 0
+        if self.file:
+            self.file.write(data)
+            self.file.flush()
+            return
+        if self.sock is None:
+            return
+        self.backlog += data.encode("utf-8")
+        if len(self.backlog) > MAX_BACKLOG:
+            # Keep whole lines: cut at the first newline past the excess
+            cut = self.backlog.find(b"\n", len(self.backlog) - MAX_BACKLOG) + 1
+            self.dropped += self.backlog.count(b"\n", 0, cut)
+            self.backlog = self.backlog[cut:]
+        try:
+            sent = self.sock.send(self.backlog)
+            self.backlog = self.backlog[sent:]
+        except BlockingIOError:
+            pass
+        except OSError as e:
+            print(f"\nWarning: event stream {self.target} closed ({e}); no further events are sent.", file=sys.stderr)
+            self.sock.close()
+            self.sock = None
+            self.backlog = b""
+
+    def close(self):
+        self.flush()
+        if self.file:
+            self.file.close()
+            self.file = None
+        if self.sock:
+            # Give a slow reader a last chance at what is left
+            self.sock.setblocking(True)
+            self.sock.settimeout(1.0)
+            try:
+                self.sock.sendall(self.backlog)
+            except OSError:
+                pass
+            self.sock.close()
+            self.sock = None
+        if self.dropped:
+            print(f"Warning: {self.dropped} event(s) dropped because {self.target} was not read fast enough.", file=sys.stderr)
+
+class Launch:
+    """One process launch: a sample sink that feeds live memory and the window events."""
+
+    def __init__(self, feed, label):
+        self.feed = feed
+        self.label = label
+        self.started = time.time()
+        self.window_start = None
+        self.count = 0
+        self.rss = self.pss = self.testhost = 0.0
+        self.cpu = 0.0
+
+    def sample(self, sample):
+        testhost = sample.roles.get(procmem.ROLE_TESTHOST, 0.0)
+        self.feed.metrics.update_memory(self, sample.rss, sample.pss, testhost)
+        if self.feed.stream is None:
+            return
+        if self.window_start is None:
+            self.window_start = sample.timestamp
+        self.count += 1
+        self.rss = max(self.rss, sample.rss)
+        self.pss = max(self.pss, sample.pss)
+        self.testhost = max(self.testhost, testhost)
+        self.cpu = sample.cpu
+        if sample.timestamp - self.window_start >= WINDOW_SECONDS:
+            self._emit_window(sample.timestamp)
+
+    def _emit_window(self, now):
+        if not self.count:
+            return
+        self.feed.stream.emit("memory", label=self.label, window_s=round(now - self.window_start, 3), samples=self.count,
+                              rss_mb=round(self.rss, 2), pss_mb=round(self.pss, 2), testhost_mb=round(self.testhost, 2),
+                              cpu_s=round(self.cpu, 3))
+        self.window_start = now
+        self.count = 0
+        self.rss = self.pss = self.testhost = 0.0
+
+    def close(self, ok=True):
+        now = time.time()
+        self.feed.metrics.launch_finished(self)
+        if self.feed.stream is not None:
+            self._emit_window(now)
+            self.feed.stream.emit("launch", label=self.label, wall_s=round(now - self.started, 3), ok=ok)
+            self.feed.stream.flush()
+
+class LiveMetrics:
+    """Counters and gauges behind the /metrics endpoint; updated from the runner, read from the server thread."""
+
+    def __init__(self, runner):
+        self.runner = runner
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.planned = None
+        self.deadline = None
+        self.launches_done = 0
+        self.counts = {"passed": 0, "failed": 0}
+        self.recent = deque(maxlen=ROLLING_TESTS)
+        self.duration_sum = 0.0
+        self.duration_count = 0
+        self.peak_pss = 0.0
+        self.live = {}
+
+    def update_memory(self, launch, rss, pss, testhost):
+        with self.lock:
+            self.live[launch] = (rss, pss, testhost)
+            self.peak_pss = max(self.peak_pss, pss)
+
+    def launch_finished(self, launch):
+        with self.lock:
+            self.live.pop(launch, None)
+            self.launches_done += 1
+
+    def test_finished(self, passed, duration):
+        with self.lock:
+            result = "passed" if passed else "failed"
+            self.counts[result] += 1
+            self.recent.append(result)
+            if duration is not None:
+                self.duration_sum += duration
+                self.duration_count += 1
+
+    def eta(self, now):
+        """Seconds left: from the time budget, else from the average launch so far; None if unknown."""
+        if self.deadline is not None:
+            return max(0.0, self.deadline - now)
+        if not self.planned or not self.launches_done:
+            return None
+        return (now - self.started) / self.launches_done * max(0, self.planned - self.launches_done)
+
+    def render(self):
+        now = time.time()
+        lines = []
+        labels = f'runner="{self.runner}"'
+
+        def metric(name, kind, help_text, values, suffixes=("",)):
+            """One metric family; `values` pairs extra labels with a value, or with one value per suffix."""
+            lines.append(f"# HELP {PREFIX}{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+            for extra, value in values:
+                for suffix, v in zip(suffixes, value if len(suffixes) > 1 else (value,)):
+                    lines.append(f"{PREFIX}{name}{suffix}{{{labels}{extra}}} {v:.10g}")
+
+        with self.lock:
+            recent = {result: self.recent.count(result) for result in self.counts}
+            live = list(self.live.values())
+            eta = self.eta(now)
+            metric("elapsed_seconds", "gauge", "Seconds since the run started.", [("", now - self.started)])
+            metric("launches_completed_total", "counter", "Test host launches finished.", [("", self.launches_done)])
+            if self.planned:
+                metric("launches_planned", "gauge", "Test host launches the run will make.", [("", self.planned)])
+                metric("progress_ratio", "gauge", "Fraction of planned launches finished.",
+                       [("", min(1.0, self.launches_done / self.planned))])
+            if eta is not None:
+                metric("eta_seconds", "gauge", "Estimated seconds until the run finishes.", [("", eta)])
+            metric("tests_total", "counter", "Test results by outcome.",
+                   [(f',result="{result}"', count) for result, count in self.counts.items()])
+            metric("recent_tests", "gauge", f"Test results by outcome over the last {ROLLING_TESTS}.",
+                   [(f',result="{result}"', count) for result, count in recent.items()])
+            metric("test_duration_seconds", "summary", "Duration of finished tests.",
+                   [("", (self.duration_sum, self.duration_count))], suffixes=("_sum", "_count"))
+            metric("active_launches", "gauge", "Test host launches running now.", [("", len(live))])
+            metric("rss_bytes", "gauge", "Resident set size of all running launches (latest sample).",
+                   [("", sum(v[0] for v in live) * procmem.MB)])
+            metric("pss_bytes", "gauge", "Proportional set size of all running launches (latest sample).",
+                   [("", sum(v[1] for v in live) * procmem.MB)])
+            metric("testhost_pss_bytes", "gauge", "Proportional set size of the running testhosts (latest sample).",
+                   [("", sum(v[2] for v in live) * procmem.MB)])
+            metric("peak_pss_bytes", "gauge", "Largest launch PSS sampled so far.", [("", self.peak_pss * procmem.MB)])
+        return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class LiveFeed:
+    """Event stream and/or metrics endpoint of one runner invocation."""
+
+    def __init__(self, runner, events=None, metrics_port=None):
+        self.runner = runner
+        self.metrics = LiveMetrics(runner)
+        self.stream = EventStream(events) if events else None
+        self.server = None
+        if metrics_port is not None:
+            self.server = ThreadingHTTPServer((METRICS_HOST, metrics_port), _MetricsHandler)
+            self.server.daemon_threads = True
+            self.server.metrics = self.metrics
+            threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://{METRICS_HOST}:{self.server.server_address[1]}/metrics" if self.server else None
+
+    def start(self, planned=None, deadline=None, **fields):
+        self.metrics.planned = planned
+        self.metrics.deadline = deadline
+        if self.stream:
+            self.stream.emit("start", runner=self.runner, planned=planned, **fields)
+            self.stream.flush()
+
+    def launch(self, label):
+        return Launch(self, label)
+
+    def test_finished(self, test, passed, duration=None, max_mb=None, error=None, **fields):
+        self.metrics.test_finished(passed, duration)
+        if self.stream:
+            text = str(error or "").strip()
+            self.stream.emit("test", test=test, result="Pass" if passed else "Fail",
+                             duration_s=round(duration, 4) if duration is not None else None,
+                             max_mb=round(max_mb, 2) if max_mb else None,
+                             error=text.splitlines()[0][:ERROR_CHARS] if text else None, **fields)
+
+    def close(self):
+        if self.stream:
+            counts = self.metrics.counts
+            self.stream.emit("end", completed=sum(counts.values()), passed=counts["passed"], failed=counts["failed"],
+                             launches=self.metrics.launches_done, elapsed_s=round(time.time() - self.metrics.started, 3))
+            self.stream.close()
+            self.stream = None
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+def chain(*sinks):
+    """One sample sink calling every given sink (None entries are skipped); None if there are none."""
+    sinks = [s for s in sinks if s is not None]
+    if not sinks:
+        return None
+    if len(sinks) == 1:
+        return sinks[0]
+
+    def call_all(sample):
+        for sink in sinks:
+            sink(sample)
+    return call_all
@@ -0,0 +1,328 @@
+"""Peak-memory model and batch-size recommender built from memory-suite results.
+
+Every MaxMB in memory_stats.csv belongs to a TestVariants.cs variant (resolution,
+item count, batch size) and a topology. The model is
+
+    MaxMB = baseline + in_flight * (Mpx x batch x width) + retained * (Mpx x items x width)
+
+where Mpx is megapixels per image and width is the number of branches an image
+is copied into (2 for Topology_FanOut). The in-flight term is what a shipment
+of `batch` images costs while it moves through the graph. The retained term is
+there because the suite's MockSink keeps every item it receives, so peaks also
+grow with the item count; a production sink that writes images out retains
+nothing, which is what `recommend` assumes unless --items is given.
+
+The coefficients are a non-negative least-squares fit over the median MaxMB of
+each (test, effective batch). A MaxShipmentSize or BatchSize in a sweep's Config
+label overrides the variant's batch size. Rows run under a non-default GC
+profile are left out, as the GC changes how much garbage a peak includes.
+All rows must share one MemMetric (see regression.memory_metric): a testhost
+PSS peak and an old whole-tree RSS peak differ by the CLI's ~600 MB.
+
+Accuracy is reported twice: in-sample residuals, and leave-one-variant-out
+errors, where each variant is predicted by a model fitted without any of its
+rows. The worst leave-one-out under-prediction is the safety margin
+`recommend` applies, since it is the closest measure of how the model does on
+variants it has not seen (Extreme, Ultra, Maximum).
+"""
+import argparse
+import math
+import re
+import sys
+from collections import namedtuple
+from statistics import median
+
+from testtools import cgroup, procmem, regression, variants as variants_mod
+
+DEFAULT_STATS = "memory_stats.csv"
+DEFAULT_HEADROOM = 0.9
+# Branches an image is copied into, by test method (see PerformanceTestBase)
+TOPOLOGY_WIDTH = {"Topology_FanOut": 2}
+TOPOLOGIES = {"chain": 1, "fanout": 2}
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080), "1440p": (2560, 1440), "4k": (3840, 2160), "2160p": (3840, 2160)}
+BATCH_SETTINGS = ("MaxShipmentSize", "BatchSize")
+MIN_POINTS = 4
+
+Point = namedtuple("Point", ["test", "config", "variant", "batch", "width", "max_mb"])
+Model = namedtuple("Model", ["baseline", "in_flight", "retained", "points"])
+
+_SIZE = re.compile(r"^\s*(\d+)\s*[xX]\s*(\d+)\s*$")
+
+def topology_width(test_name):
+    return TOPOLOGY_WIDTH.get(test_name.rsplit(".", 1)[-1], 1)
+
+def effective_batch(config, variant):
+    """The batch a row actually ran with: a swept MaxShipmentSize/BatchSize, else the variant's."""
+    for part in (config or "").split(","):
+        name, _, value = part.partition("=")
+        if name.strip() in BATCH_SETTINGS:
+            try:
+                return int(value)
+            except ValueError:
+                pass
+    return variant.batch_size
+
+def load_points(rows, variants):
+    """One Point per (test, config) with the median MaxMB of its passing runs."""
+    grouped = {}
+    for row in rows:
+        if row.get("Result") != "Pass" or row.get("GcProfile") not in (None, "", "default"):
+            continue
+        variant = variants_mod.variant_for_test(row["Test"], variants)
+        if variant is None:
+            continue
+        try:
+            peak = float(row["MaxMB"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if peak <= 0:
+            continue
+        config = row.get("Config") or "default"
+        grouped.setdefault((row["Test"], config, variant), []).append(peak)
+
+    return [Point(test, config, variant, effective_batch(config, variant), topology_width(test), median(peaks))
+            for (test, config, variant), peaks in sorted(grouped.items(), key=lambda item: item[0][:2])]
+
+def features(mpx, batch, width, items):
+    return [mpx * batch * width, mpx * items * width]
+
+def _point_features(point):
+    mpx = point.variant.width * point.variant.height / 1e6
+    return features(mpx, point.batch, point.width, point.variant.items)
+
+def _solve(matrix, vector):
+    """Gaussian elimination with partial pivoting; None if the system is singular."""
+    n = len(vector)
+    a = [row[:] + [v] for row, v in zip(matrix, vector)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(a[r][col]))
+        if abs(a[pivot][col]) < 1e-12:
+            return None
+        a[col], a[pivot] = a[pivot], a[col]
+        for r in range(n):
+            if r != col:
+                factor = a[r][col] / a[col][col]
+                a[r] = [x - factor * y for x, y in zip(a[r], a[col])]
+    return [a[i][n] / a[i][i] for i in range(n)]
+
+def _least_squares(xs, ys, active):
+    """Coefficients (intercept first) of a least-squares fit using only the `active` feature columns."""
+    rows = [[1.0] + [x[i] for i in active] for x in xs]
+    k = len(rows[0])
+    normal = [[sum(r[i] * r[j] for r in rows) for j in range(k)] for i in range(k)]
+    rhs = [sum(r[i] * y for r, y in zip(rows, ys)) for i in range(k)]
+    return _solve(normal, rhs)
+
+def fit(points):
+    """Model fitted to `points`; slopes that would come out negative are dropped (set to 0)."""
+    if len(points) < MIN_POINTS:
+        raise ValueError(f"Need at least {MIN_POINTS} measured variants to fit a model, got {len(points)}")
+    xs = [_point_features(p) for p in points]
+    ys = [p.max_mb for p in points]
+    active = [0, 1]
+    while True:
+        solution = _least_squares(xs, ys, active)
+        if solution is None:
+            # Collinear features (e.g. one variant only): fall back to fewer terms
+            if not active:
+                raise ValueError("Cannot fit a model to these results")
+            active = active[:-1]
+            continue
+        slopes = dict(zip(active, solution[1:]))
+        negative = [i for i, s in slopes.items() if s < 0]
+        if not negative:
+            break
+        active = [i for i in active if i not in negative]
+    return Model(solution[0], slopes.get(0, 0.0), slopes.get(1, 0.0), len(points))
+
+def predict(model, mpx, batch, width=1, items=0):
+    in_flight, retained = features(mpx, batch, width, items)
+    return model.baseline + model.in_flight * in_flight + model.retained * retained
+
+def predict_point(model, point):
+    mpx = point.variant.width * point.variant.height / 1e6
+    return predict(model, mpx, point.batch, point.width, point.variant.items)
+
+def residuals(model, points):
+    """[(point, predicted, relative error)]; the error is positive when the model over-predicts."""
+    result = []
+    for point in points:
+        predicted = predict_point(model, point)
+        result.append((point, predicted, (predicted - point.max_mb) / point.max_mb))
+    return result
+
+def leave_one_variant_out(points):
+    """Residuals where each variant is predicted by a model fitted without it."""
+    result = []
+    for name in sorted({p.variant.name for p in points}):
+        held_out = [p for p in points if p.variant.name == name]
+        try:
+            model = fit([p for p in points if p.variant.name != name])
+        except ValueError:
+            continue
+        result.extend(residuals(model, held_out))
+    return result
+
+def error_summary(errors):
+    """{'mae_mb', 'mape', 'worst_under', 'worst_over'} over residuals() output."""
+    if not errors:
+        return None
+    return {
+        "mae_mb": sum(abs(pred - p.max_mb) for p, pred, _ in errors) / len(errors),
+        "mape": sum(abs(rel) for _, _, rel in errors) / len(errors),
+        "worst_under": max((-rel for _, _, rel in errors), default=0.0),
+        "worst_over": max((rel for _, _, rel in errors), default=0.0),
+    }
+
+def safety_margin(points):
+    """Fraction to add to predictions: the worst leave-one-variant-out under-prediction."""
+    summary = error_summary(leave_one_variant_out(points))
+    return max(summary["worst_under"], 0.0) if summary else 0.0
+
+def largest_batch(model, mpx, width, budget_mb, items=0, margin=0.0, headroom=DEFAULT_HEADROOM):
+    """Largest batch whose predicted peak, plus margin, stays within headroom x budget; 0 if none fits, None if unbounded."""
+    limit = budget_mb * headroom / (1 + margin)
+    fixed = predict(model, mpx, 0, width, items)
+    per_image = model.in_flight * mpx * width
+    if fixed + per_image > limit:
+        return 0
+    if per_image <= 0:
+        return None
+    batch = math.floor((limit - fixed) / per_image)
+    return min(batch, items) if items else batch
+
+def parse_resolution(spec, variants=None):
+    """'1920x1080', '1080p' or a variant resolution such as 'HighRes' -> (width, height)."""
+    match = _SIZE.match(spec)
+    if match:
+        return int(match.group(1)), int(match.group(2))
+    if spec.lower() in RESOLUTIONS:
+        return RESOLUTIONS[spec.lower()]
+    for variant in (variants or {}).values():
+        if variant.resolution.lower() == spec.lower():
+            return variant.width, variant.height
+    raise argparse.ArgumentTypeError(f"Bad resolution '{spec}', expected WxH, a name like 1080p, or a variant resolution")
+
+def parse_topology(spec):
+    """'chain' / 'fanout' / a branch count -> width."""
+    if spec.lower() in TOPOLOGIES:
+        return TOPOLOGIES[spec.lower()]
+    try:
+        width = int(spec)
+    except ValueError:
+        width = 0
+    if width < 1:
+        raise argparse.ArgumentTypeError(f"Bad topology '{spec}', expected {', '.join(TOPOLOGIES)} or a branch count")
+    return width
+
+def print_model(model, margin=None):
+    print(f"Model fitted to {model.points} measurements:")
+    print(f"  baseline      {model.baseline:8.1f} MB")
+    print(f"  in flight     {model.in_flight:8.3f} MB per Mpx x batch x width ({model.in_flight * 1024 * 1024 / 1e6:.1f} bytes/pixel)")
+    print(f"  retained      {model.retained:8.3f} MB per Mpx x items x width ({model.retained * 1024 * 1024 / 1e6:.1f} bytes/pixel)")
+    if margin is not None:
+        print(f"  safety margin {margin:8.1%} (worst leave-one-variant-out under-prediction)")
+
+def print_errors(title, errors, verbose=False):
+    summary = error_summary(errors)
+    if summary is None:
+        print(f"\n{title}: not enough variants")
+        return
+    print(f"\n{title}: mean |error| {summary['mae_mb']:.1f} MB ({summary['mape']:.1%}), "
+          f"worst under-prediction {summary['worst_under']:.1%}, worst over-prediction {summary['worst_over']:.1%}")
+    if not verbose:
+        return
+    print(f"{'Test':<56} {'Batch':>6} {'Measured':>10} {'Predicted':>10} {'Error':>8}")
+    for point, predicted, rel in errors:
+        name = ".".join(point.test.split(".")[-2:])
+        if point.config != "default":
+            name += f" [{point.config}]"
+        print(f"{name:<56} {point.batch:>6} {point.max_mb:>9.0f}M {predicted:>9.0f}M {rel:>+8.1%}")
+
+def print_matrix(model, variants, measured, budget_mb=None, margin=0.0):
+    """Predicted peaks for every variant and topology width, marking the ones never measured."""
+    print(f"\n{'Variant':<26} {'Items':>6} {'Batch':>6} {'Chain':>9} {'FanOut':>9}  Measured")
+    for variant in sorted(variants.values(), key=lambda v: (v.width * v.height, v.items, v.batch_size)):
+        mpx = variant.width * variant.height / 1e6
+        cells = []
+        for width in (1, 2):
+            peak = predict(model, mpx, variant.batch_size, width, variant.items)
+            over = budget_mb is not None and peak * (1 + margin) > budget_mb
+            cells.append(f"{peak:>8.0f}M" + ("!" if over else " "))
+        seen = "yes" if variant.name in measured else "no"
+        print(f"{variant.name:<26} {variant.items:>6} {variant.batch_size:>6} {cells[0]}{cells[1]}  {seen}")
+    if budget_mb is not None:
+        print(f"! = over {budget_mb:.0f} MB once the safety margin is added")
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit a peak-memory model to memory-suite results and size batches with it")
+    parser.add_argument('--stats', type=str, action='append', default=None,
+                        help='memory_stats.csv file or directory of them (repeatable; default memory_stats.csv)')
+    parser.add_argument('--variants-file', type=str, default=None, help='TestVariants.cs (default: the repo copy)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    fit_cmd = commands.add_parser('fit', help='Show the model, its errors and predictions for the whole variant matrix')
+    fit_cmd.add_argument('--budget', type=str, default=None, help='Flag variants predicted over this much memory, e.g. 16G')
+    fit_cmd.add_argument('-v', '--verbose', action='store_true', help='List the error of every measurement')
+
+    rec_cmd = commands.add_parser('recommend', help='Largest batch size that fits a memory budget')
+    rec_cmd.add_argument('--resolution', type=str, required=True, help='WxH, e.g. 3840x2160, or 1080p/4k/HighRes')
+    rec_cmd.add_argument('--topology', type=str, default='chain', help='chain, fanout, or a fan-out branch count')
+    rec_cmd.add_argument('--budget', type=str, required=True, help='Memory available to the process, e.g. 16G')
+    rec_cmd.add_argument('--items', type=int, default=0, help='Images the sink keeps in memory (default: none, a streaming sink)')
+    rec_cmd.add_argument('--headroom', type=float, default=DEFAULT_HEADROOM, help='Fraction of the budget the peak may use')
+    args = parser.parse_args()
+
+    variants = variants_mod.load_variants(args.variants_file)
+    if not variants:
+        print("No test variants found; pass --variants-file", file=sys.stderr)
+        sys.exit(1)
+    rows = regression.load_rows(args.stats or [DEFAULT_STATS])
+    metrics = sorted({regression.memory_metric(r) for r in rows if r.get("Result") == "Pass"})
+    if len(metrics) > 1:
+        print(f"Error: the results mix memory metrics ({', '.join(metrics)}); fit files of one kind", file=sys.stderr)
+        sys.exit(1)
+    if metrics == [procmem.LEGACY_METRIC]:
+        print("Warning: these results are whole-tree RSS (no MemMetric column); the baseline includes "
+              "the dotnet CLI and MSBuild", file=sys.stderr)
+    points = load_points(rows, variants)
+    try:
+        model = fit(points)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    margin = safety_margin(points)
+
+    if args.command == 'fit':
+        print_model(model, margin)
+        print_errors("In-sample", residuals(model, points), args.verbose)
+        print_errors("Leave one variant out", leave_one_variant_out(points), args.verbose)
+        budget_mb = cgroup.parse_size(args.budget) / cgroup.MB if args.budget else None
+        print_matrix(model, variants, {p.variant.name for p in points}, budget_mb, margin)
+        return
+
+    try:
+        width, height = parse_resolution(args.resolution, variants)
+        fan_out = parse_topology(args.topology)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    budget_mb = cgroup.parse_size(args.budget) / cgroup.MB
+    mpx = width * height / 1e6
+    batch = largest_batch(model, mpx, fan_out, budget_mb, args.items, margin, args.headroom)
+
+    print_model(model, margin)
+    print(f"\n{width}x{height}, width {fan_out}, budget {budget_mb:.0f} MB x {args.headroom:.0%} headroom"
+          + (f", {args.items} retained images" if args.items else ""))
+    if batch is None:
+        print("The model has no per-batch cost; any batch size fits.")
+        return
+    if batch == 0:
+        print(f"Nothing fits: even a batch of 1 is predicted at {predict(model, mpx, 1, fan_out, args.items):.0f} MB "
+              f"(+{margin:.0%} margin).")
+        sys.exit(1)
+    peak = predict(model, mpx, batch, fan_out, args.items)
+    print(f"Largest safe batch size: {batch} (predicted peak {peak:.0f} MB, {peak * (1 + margin):.0f} MB with margin)")
+    print(f"Set BatchSize / MaxShipmentSize to {batch} or lower.")
+
+if __name__ == "__main__":
+    main()
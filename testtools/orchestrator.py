@@ -0,0 +1,224 @@
+"""asyncio core for launching and watching `dotnet test` processes.
+
+Every launch gets its own RunState instead of module-level globals. stdout and
+stderr are always drained concurrently (a full, unread pipe blocks the child and
+skews timings), only a bounded tail of each is kept, and memory is sampled from
+a coroutine on the same event loop, so any number of launches can run side by
+side without monitor threads.
+
+CPU time of a launch's whole tree comes from getrusage(RUSAGE_CHILDREN) when no
+other launch overlapped it (exact: reaped descendants roll up into the CLI), and
+from the sampler's /proc readings otherwise. Which launches overlap is tracked by
+a Launcher, which each runner session owns, so nothing is shared between
+sessions or left behind across asyncio.run() calls.
+"""
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from collections import deque
+
+from testtools import procmem
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+TAIL_LINES = 200
+_READ_CHUNK = 64 * 1024
+DRAIN_GRACE = 5.0
+
+def _children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+class RunState:
+    """Command, timings, output tails and memory samples of one process launch."""
+
+    def __init__(self, cmd, label="", env=None, preexec_fn=None, cpus=None):
+        self.cmd = cmd
+        self.label = label
+        self.env = env
+        self.preexec_fn = preexec_fn
+        # CPU ids the tree is pinned to (Linux affinity, inherited by every descendant)
+        self.cpus = cpus
+        self.pid = None
+        self.returncode = None
+        self.started = None
+        self.finished = None
+        self.samples = []
+        # Optional callable receiving each MemorySample as it is taken (e.g. a TraceWriter)
+        self.sample_sink = None
+        # Optional threadprof.ThreadProfiler sampling the testhost's threads alongside memory
+        self.thread_profiler = None
+        self.stdout_tail = deque(maxlen=TAIL_LINES)
+        self.stderr_tail = deque(maxlen=TAIL_LINES)
+        self.cpu_time = None
+        self.overlapped = False
+
+    @property
+    def wall_time(self):
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+    def stderr_text(self):
+        return "\n".join(self.stderr_tail)
+
+    def _preexec(self):
+        if self.cpus:
+            os.sched_setaffinity(0, self.cpus)
+        if self.preexec_fn is not None:
+            self.preexec_fn()
+
+async def _drain(stream, tail):
+    # Chunked reads rather than readline(): a single huge log line must not stall the pipe
+    pending = b""
+    while True:
+        chunk = await stream.read(_READ_CHUNK)
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        if len(pending) > _READ_CHUNK:
+            lines.append(pending)
+            pending = b""
+        tail.extend(line.decode("utf-8", "replace").rstrip("\r") for line in lines)
+    if pending:
+        tail.append(pending.decode("utf-8", "replace"))
+
+async def sample_memory(state, interval, stop):
+    """Appends procmem.MemorySamples to state.samples until `stop` is set or the process exits."""
+    interval = max(procmem.MIN_INTERVAL, interval)
+    sampler = procmem.create_sampler(state.pid)
+    if sampler is None:
+        return
+
+    loop = asyncio.get_running_loop()
+    try:
+        next_tick = loop.time()
+        while not stop.is_set():
+            sample = sampler.sample()
+            if sample is None:
+                break
+            state.samples.append(sample)
+            if state.sample_sink:
+                state.sample_sink(sample)
+            # Fixed-rate schedule so sampling cost does not stretch the interval
+            next_tick += interval
+            delay = next_tick - loop.time()
+            if delay < 0:
+                next_tick = loop.time()
+                delay = 0
+            try:
+                await asyncio.wait_for(stop.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        sampler.close()
+
+def _kill_tree(proc):
+    if proc.returncode is not None:
+        return
+    try:
+        if sys.platform != "win32":
+            # Launched in its own session, so the group holds the CLI, build nodes and testhost
+            os.killpg(proc.pid, signal.SIGKILL)
+        elif procmem.psutil is not None:
+            for child in procmem.psutil.Process(proc.pid).children(recursive=True):
+                child.kill()
+            proc.kill()
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError, OSError):
+        pass
+
+class Launcher:
+    """Runs the launches of one runner session and knows which of them are running."""
+
+    def __init__(self):
+        # Used to know whether rusage deltas are attributable to a single launch
+        self.active = set()
+
+    async def run(self, state, sample_interval=None):
+        """
+        Launches state.cmd, drains its output and optionally samples memory every
+        `sample_interval` seconds. Cancelling the coroutine kills the whole process tree.
+        """
+        kwargs = {}
+        if sys.platform != "win32":
+            kwargs["start_new_session"] = True
+        if state.preexec_fn is not None or state.cpus:
+            kwargs["preexec_fn"] = state._preexec
+
+        for other in self.active:
+            other.overlapped = True
+        state.overlapped = bool(self.active)
+        self.active.add(state)
+        cpu_before = _children_cpu() if resource else None
+
+        state.started = time.time()
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *state.cmd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                env=state.env,
+                **kwargs,
+            )
+        except BaseException:
+            self.active.discard(state)
+            raise
+        state.pid = proc.pid
+
+        stop = asyncio.Event()
+        tasks = [
+            asyncio.create_task(_drain(proc.stdout, state.stdout_tail)),
+            asyncio.create_task(_drain(proc.stderr, state.stderr_tail)),
+        ]
+        samplers = []
+        if sample_interval:
+            samplers.append(asyncio.create_task(sample_memory(state, sample_interval, stop)))
+        if state.thread_profiler is not None:
+            samplers.append(asyncio.create_task(state.thread_profiler.run(state.pid, stop)))
+
+        try:
+            state.returncode = await proc.wait()
+            # Detached MSBuild/compiler servers can inherit the pipes and keep them open
+            await asyncio.wait(tasks, timeout=DRAIN_GRACE)
+        except asyncio.CancelledError:
+            _kill_tree(proc)
+            # Reap it, so the transport is not left to be collected after the loop has closed
+            try:
+                await asyncio.wait_for(proc.wait(), DRAIN_GRACE)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+            raise
+        finally:
+            state.finished = time.time()
+            self.active.discard(state)
+            stop.set()
+            if samplers:
+                await asyncio.gather(*samplers, return_exceptions=True)
+            for task in tasks:
+                task.cancel()
+            if cpu_before is not None and not state.overlapped and state.returncode is not None:
+                state.cpu_time = _children_cpu() - cpu_before
+            elif state.samples:
+                state.cpu_time = max(s.cpu for s in state.samples)
+        return state
+
+def install_interrupt_handler(task, on_interrupt=None):
+    """Routes SIGINT to cancelling `task` on its loop (works with signal.signal on every platform)."""
+    loop = asyncio.get_running_loop()
+
+    def handler(sig, frame):
+        if on_interrupt:
+            on_interrupt()
+        loop.call_soon_threadsafe(task.cancel)
+
+    signal.signal(signal.SIGINT, handler)
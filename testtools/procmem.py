@@ -0,0 +1,268 @@
+"""Memory sampling for a `dotnet test` process tree.
+
+On Linux the sampler reads /proc directly: smaps_rollup gives PSS and USS, so
+pages shared between the dotnet CLI, MSBuild nodes and the testhost are not
+counted several times over. File descriptors are kept open between samples and
+the process tree is only re-walked every `tree_refresh` seconds, which keeps the
+per-sample cost low enough for intervals down to a few milliseconds. Elsewhere
+psutil is used with the same interface (RSS only).
+
+Each sample also carries the tree's cumulative CPU time (user + system, including
+already reaped children), so CPU use can be followed during a run.
+"""
+import os
+import sys
+import time
+from collections import namedtuple
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+MB = 1024 * 1024
+MIN_INTERVAL = 0.005
+
+ROLE_CLI = "cli"
+ROLE_BUILD = "build"
+ROLE_TESTHOST = "testhost"
+ROLE_OTHER = "other"
+ROLES = (ROLE_CLI, ROLE_BUILD, ROLE_TESTHOST, ROLE_OTHER)
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+# CSVs written before MemMetric existed hold whole-tree RSS (CLI and MSBuild included)
+LEGACY_METRIC = "rss-tree"
+
+# rss/pss/uss are tree totals in MB; roles maps role -> PSS in MB; cpu is tree CPU seconds so far
+MemorySample = namedtuple("MemorySample", ["timestamp", "rss", "pss", "uss", "roles", "cpu"], defaults=(0.0,))
+
+def classify(cmdline):
+    joined = " ".join(cmdline).lower()
+    if "testhost" in joined:
+        return ROLE_TESTHOST
+    if "msbuild" in joined or "vbcscompiler" in joined or "csc.dll" in joined or "/nodemode" in joined:
+        return ROLE_BUILD
+    if "dotnet" in joined or "vstest.console" in joined:
+        return ROLE_CLI
+    return ROLE_OTHER
+
+def engine_series(samples):
+    """
+    [(timestamp, MB)] of the testhost's PSS, i.e. the engine itself without the CLI
+    and build tooling. Falls back to whole-tree PSS if no testhost was ever seen.
+    """
+    testhost = [(s.timestamp, s.roles[ROLE_TESTHOST]) for s in samples if ROLE_TESTHOST in s.roles]
+    return testhost if testhost else [(s.timestamp, s.pss) for s in samples]
+
+def memory_metric(samples):
+    """
+    What engine_series() measured, stored as MemMetric next to MinMB/MaxMB/AvgMB:
+    'pss-testhost' from /proc, 'rss-...' from psutil or statm, '...-tree' if no
+    testhost was ever seen. Results taken under different metrics are not comparable.
+    """
+    kind = "pss" if sys.platform.startswith("linux") and os.path.exists("/proc/self/smaps_rollup") else "rss"
+    scope = "testhost" if any(ROLE_TESTHOST in s.roles for s in samples) else "tree"
+    return f"{kind}-{scope}"
+
+def role_peaks(samples):
+    peaks = {}
+    for s in samples:
+        for role, mb in s.roles.items():
+            peaks[role] = max(peaks.get(role, 0.0), mb)
+    return peaks
+
+class _ProcEntry:
+    __slots__ = ("role", "fd", "rollup", "stat_fd")
+
+    def __init__(self, pid):
+        self.role = ROLE_OTHER
+        self.fd = None
+        self.rollup = True
+        try:
+            self.stat_fd = os.open(f"/proc/{pid}/stat", os.O_RDONLY)
+        except OSError:
+            self.stat_fd = None
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                self.role = classify(f.read().decode("utf-8", "replace").split("\0"))
+        except OSError:
+            pass
+        try:
+            self.fd = os.open(f"/proc/{pid}/smaps_rollup", os.O_RDONLY)
+        except OSError:
+            # Kernels before 4.14 (or restricted ptrace access): RSS from statm only
+            self.rollup = False
+            try:
+                self.fd = os.open(f"/proc/{pid}/statm", os.O_RDONLY)
+            except OSError:
+                self.fd = None
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        if self.stat_fd is not None:
+            os.close(self.stat_fd)
+            self.stat_fd = None
+
+class ProcTreeSampler:
+    PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def __init__(self, root_pid, tree_refresh=0.25):
+        self.root_pid = root_pid
+        self.tree_refresh = tree_refresh
+        self._entries = {}
+        self._last_refresh = 0.0
+
+    def _children(self, pid):
+        children = []
+        try:
+            for tid in os.listdir(f"/proc/{pid}/task"):
+                with open(f"/proc/{pid}/task/{tid}/children", "r") as f:
+                    children.extend(int(c) for c in f.read().split())
+        except (OSError, ValueError):
+            pass
+        return children
+
+    def _refresh_tree(self):
+        alive = []
+        queue = [self.root_pid]
+        while queue:
+            pid = queue.pop()
+            alive.append(pid)
+            queue.extend(self._children(pid))
+
+        for pid in list(self._entries):
+            if pid not in alive:
+                self._entries.pop(pid).close()
+        for pid in alive:
+            if pid not in self._entries:
+                self._entries[pid] = _ProcEntry(pid)
+        self._last_refresh = time.monotonic()
+
+    def _read(self, entry):
+        os.lseek(entry.fd, 0, os.SEEK_SET)
+        data = os.read(entry.fd, 8192)
+        if not data:
+            return None
+        if not entry.rollup:
+            rss = int(data.split()[1]) * self.PAGE_SIZE / MB
+            return rss, rss, rss
+
+        rss = pss = uss = 0
+        for line in data.split(b"\n"):
+            if line.startswith(b"Rss:"):
+                rss = int(line.split()[1])
+            elif line.startswith(b"Pss:"):
+                pss = int(line.split()[1])
+            elif line.startswith(b"Private_Clean:") or line.startswith(b"Private_Dirty:"):
+                uss += int(line.split()[1])
+        return rss / 1024, pss / 1024, uss / 1024
+
+    def _read_cpu(self, entry):
+        if entry.stat_fd is None:
+            return 0.0
+        os.lseek(entry.stat_fd, 0, os.SEEK_SET)
+        data = os.read(entry.stat_fd, 4096)
+        # The command name may contain spaces; fields after it are fixed: utime, stime, cutime, cstime are 11-14
+        fields = data[data.rindex(b")") + 2:].split()
+        return sum(int(v) for v in fields[11:15]) / CLOCK_TICKS
+
+    def sample(self):
+        """Returns a MemorySample, or None once the root process is gone."""
+        if time.monotonic() - self._last_refresh >= self.tree_refresh:
+            self._refresh_tree()
+
+        rss = pss = uss = cpu = 0.0
+        roles = {}
+        for pid, entry in list(self._entries.items()):
+            if entry.fd is None:
+                continue
+            try:
+                values = self._read(entry)
+                if values is not None:
+                    # A process's own time plus its reaped children's, so exits do not lose CPU
+                    cpu += self._read_cpu(entry)
+            except (OSError, ValueError, IndexError):
+                values = None
+            if values is None:
+                # Exited, or exec'd since the descriptor was opened (which leaves it
+                # pointing at the old address space): re-walk the tree next sample
+                self._entries.pop(pid).close()
+                self._last_refresh = 0.0
+                continue
+            p_rss, p_pss, p_uss = values
+            rss += p_rss
+            pss += p_pss
+            uss += p_uss
+            roles[entry.role] = roles.get(entry.role, 0.0) + p_pss
+
+        if not os.path.exists(f"/proc/{self.root_pid}"):
+            return None
+        return MemorySample(time.time(), rss, pss, uss, roles, cpu)
+
+    def close(self):
+        for entry in self._entries.values():
+            entry.close()
+        self._entries.clear()
+
+class PsutilTreeSampler:
+    def __init__(self, root_pid, tree_refresh=0.25):
+        self.root = psutil.Process(root_pid)
+        self.tree_refresh = tree_refresh
+        self._procs = {}
+        self._last_refresh = 0.0
+
+    def _refresh_tree(self):
+        procs = {self.root.pid: self.root}
+        procs.update((c.pid, c) for c in self.root.children(recursive=True))
+        for pid, proc in procs.items():
+            if pid not in self._procs:
+                try:
+                    role = classify(proc.cmdline())
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    role = ROLE_OTHER
+                self._procs[pid] = (proc, role)
+        for pid in list(self._procs):
+            if pid not in procs:
+                del self._procs[pid]
+        self._last_refresh = time.monotonic()
+
+    def sample(self):
+        try:
+            if time.monotonic() - self._last_refresh >= self.tree_refresh:
+                self._refresh_tree()
+            total = self.root.memory_info().rss / MB
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return None
+
+        roles = {}
+        cpu = 0.0
+        for pid, (proc, role) in list(self._procs.items()):
+            try:
+                mb = total if pid == self.root.pid else proc.memory_info().rss / MB
+                times = proc.cpu_times()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                del self._procs[pid]
+                continue
+            roles[role] = roles.get(role, 0.0) + mb
+            cpu += times.user + times.system + getattr(times, "children_user", 0.0) + getattr(times, "children_system", 0.0)
+        tree = sum(roles.values())
+        return MemorySample(time.time(), tree, tree, tree, roles, cpu)
+
+    def close(self):
+        self._procs.clear()
+
+def available():
+    return os.path.exists("/proc/self/stat") or psutil is not None
+
+def create_sampler(pid, tree_refresh=0.25):
+    if sys.platform.startswith("linux") and os.path.exists(f"/proc/{pid}"):
+        return ProcTreeSampler(pid, tree_refresh)
+    if psutil is not None:
+        try:
+            return PsutilTreeSampler(pid, tree_refresh)
+        except psutil.NoSuchProcess:
+            return None
+    return None
@@ -0,0 +1,170 @@
+"""Headered raw image files (.iaraw) that can be memory-mapped without decoding.
+
+Layout, all little-endian:
+
+    b"IARAWIMG" | u32 width | u32 height | u32 pixel format | u32 stride | u32 data offset | u32 reserved
+    then zero padding up to `data offset` (64-byte aligned), then `height` rows of `stride` bytes
+
+Rows may be padded past width * channels; readers must step by `stride`. The
+pixels are 8 bits per channel in R, G, B(, A) order, matching ImageSharp's
+Rgb24/Rgba32, so a benchmark can wrap the mapping directly instead of paying
+for PNG inflate.
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAGIC = b"IARAWIMG"
+EXTENSION = ".iaraw"
+_HEADER = struct.Struct("<8sIIIIII")
+DATA_ALIGNMENT = 64
+
+FORMAT_RGB24 = 1
+FORMAT_RGBA32 = 2
+CHANNELS = {FORMAT_RGB24: 3, FORMAT_RGBA32: 4}
+FORMAT_NAMES = {FORMAT_RGB24: "rgb24", FORMAT_RGBA32: "rgba32"}
+
+RawHeader = namedtuple("RawHeader", ["width", "height", "pixel_format", "stride", "data_offset"])
+
+class RawImageError(ValueError):
+    pass
+
+def _align(value, alignment):
+    return (value + alignment - 1) // alignment * alignment
+
+def write_raw(path, pixels, row_alignment=1):
+    """Writes an (H, W, 3|4) uint8 array. Rows are padded to `row_alignment` bytes."""
+    height, width, channels = pixels.shape
+    pixel_format = {3: FORMAT_RGB24, 4: FORMAT_RGBA32}.get(channels)
+    if pixel_format is None or pixels.dtype != np.uint8:
+        raise RawImageError(f"Unsupported pixel layout {pixels.shape} {pixels.dtype}")
+
+    row_bytes = width * channels
+    stride = _align(row_bytes, row_alignment)
+    data_offset = _align(_HEADER.size, DATA_ALIGNMENT)
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, width, height, pixel_format, stride, data_offset, 0))
+        f.write(b"\0" * (data_offset - _HEADER.size))
+        if stride == row_bytes:
+            f.write(np.ascontiguousarray(pixels).tobytes())
+        else:
+            padding = b"\0" * (stride - row_bytes)
+            for row in pixels:
+                f.write(row.tobytes())
+                f.write(padding)
+
+def parse_header(data):
+    if len(data) < _HEADER.size:
+        raise RawImageError("File too short for header")
+    magic, width, height, pixel_format, stride, data_offset, _ = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise RawImageError("Not an .iaraw file")
+    if pixel_format not in CHANNELS:
+        raise RawImageError(f"Unknown pixel format {pixel_format}")
+    if stride < width * CHANNELS[pixel_format]:
+        raise RawImageError(f"Stride {stride} shorter than a row")
+    if data_offset < _HEADER.size:
+        raise RawImageError(f"Data offset {data_offset} overlaps the header")
+    return RawHeader(width, height, pixel_format, stride, data_offset)
+
+class RawImage:
+    """A read-only mapping of an .iaraw file. Use as a context manager."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                raise RawImageError("Empty file")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.header = parse_header(self._map)
+            expected = self.header.data_offset + self.header.stride * self.header.height
+            if size < expected:
+                raise RawImageError(f"Truncated: {size} bytes, expected {expected}")
+        except RawImageError:
+            self._map.close()
+            raise
+
+    @property
+    def width(self):
+        return self.header.width
+
+    @property
+    def height(self):
+        return self.header.height
+
+    @property
+    def channels(self):
+        return CHANNELS[self.header.pixel_format]
+
+    def pixels(self):
+        """Zero-copy (H, W, C) uint8 view over the mapping; stride padding is skipped, not copied.
+        The view holds a buffer export, so close() raises BufferError while one is alive."""
+        h = self.header
+        rows = np.frombuffer(self._map, dtype=np.uint8, count=h.stride * h.height, offset=h.data_offset)
+        rows = rows.reshape(h.height, h.stride)[:, :h.width * self.channels]
+        return rows.reshape(h.height, h.width, self.channels)
+
+    def row(self, y):
+        """memoryview of one row's pixel bytes, for callers without numpy."""
+        h = self.header
+        start = h.data_offset + y * h.stride
+        return memoryview(self._map)[start:start + h.width * self.channels]
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def verify(path, reference=None):
+    """Checks header and size; with a reference image path (e.g. the PNG) also compares pixels.
+    Returns an error string, or "" when the file is valid."""
+    try:
+        with RawImage(path) as image:
+            if reference is None:
+                return ""
+            from PIL import Image
+            with Image.open(reference) as ref:
+                mode = "RGBA" if image.channels == 4 else "RGB"
+                expected = np.asarray(ref.convert(mode))
+            if expected.shape != (image.height, image.width, image.channels):
+                return f"Shape {expected.shape} in {reference} differs from {(image.height, image.width, image.channels)}"
+            mismatched = int(np.count_nonzero((image.pixels() != expected).any(axis=2)))
+            return f"{mismatched} pixels differ from {reference}" if mismatched else ""
+    except (OSError, RawImageError) as e:
+        return str(e)
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and verify .iaraw images")
+    parser.add_argument('files', nargs='+', help='.iaraw files')
+    parser.add_argument('--against-png', action='store_true', help='Compare pixels with the sibling .png of the same name')
+    args = parser.parse_args()
+
+    failed = 0
+    for path in args.files:
+        reference = os.path.splitext(path)[0] + ".png" if args.against_png else None
+        error = verify(path, reference)
+        if error:
+            failed += 1
+            print(f"FAIL {path}: {error}")
+            continue
+        with RawImage(path) as image:
+            h = image.header
+            print(f"OK   {path}: {h.width}x{h.height} {FORMAT_NAMES[h.pixel_format]} stride={h.stride} offset={h.data_offset}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
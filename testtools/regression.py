@@ -0,0 +1,186 @@
+"""Baseline comparison for memory_stats.csv.
+
+Rows are matched by test name. Each metric's noise is estimated from repeated
+samples rather than a fixed percentage: the robust scale (1.4826 x MAD) of the
+baseline and current samples around their own medians. Tests with too few
+samples of their own borrow the median relative noise of the tests that have
+them. A change counts as a regression when the median moved up by more than
+`sigmas` standard errors and by at least the metric's MIN_EFFECT, so very quiet
+tests are not flagged for changes nobody would act on.
+
+When no test has repeated samples (one baseline file and --repeat 1), there is
+no noise to estimate. Such metrics get a Finding without a threshold, and gate()
+fails and asks for --repeat 2 or more baseline runs rather than guess a limit.
+
+MaxMB/AvgMB are only compared between rows that measured the same thing
+(MemMetric, see procmem.memory_metric; files without the column are the old
+whole-tree RSS). A mismatch is reported instead of compared, and fails gate().
+"""
+import csv
+import glob
+import os
+from collections import namedtuple
+from statistics import median
+
+from testtools import procmem
+
+METRICS = ("MaxMB", "AvgMB", "DurationS")
+MAD_SCALE = 1.4826
+MIN_EFFECT = {"MaxMB": 1.0, "AvgMB": 1.0, "DurationS": 0.05}
+MEMORY_METRICS = ("MaxMB", "AvgMB")
+
+# threshold is None when there was no noise estimate to derive one from
+Finding = namedtuple("Finding", ["test", "metric", "baseline", "current", "delta", "threshold", "regressed"])
+
+def expand_paths(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.csv"))))
+        else:
+            files.extend(sorted(glob.glob(path)) or [path])
+    return files
+
+def load_rows(paths):
+    rows = []
+    for path in expand_paths(paths):
+        with open(path, "r", newline="") as f:
+            rows.extend(csv.DictReader(f))
+    return rows
+
+def memory_metric(row):
+    """The row's MemMetric; rows from before the column existed measured whole-tree RSS."""
+    return row.get("MemMetric") or procmem.LEGACY_METRIC
+
+def _key(row):
+    # Sweep points, GC profiles and core counts of the same test are compared separately
+    variant = [row.get("Config") or "default", row.get("GcProfile") or "default"]
+    if row.get("Cores") not in (None, ""):
+        variant.append(f"Cores={row['Cores']}")
+    variant = ",".join(v for v in variant if v != "default")
+    return f"{row['Test']} [{variant}]" if variant else row["Test"]
+
+def memory_metrics(rows):
+    """{test: set of MemMetric values} over passing rows, keyed like group()."""
+    found = {}
+    for row in rows:
+        if row.get("Result", "Pass") == "Pass":
+            found.setdefault(_key(row), set()).add(memory_metric(row))
+    return found
+
+def group(rows, metrics=METRICS):
+    """{test: {metric: [values]}} over passing rows only."""
+    grouped = {}
+    for row in rows:
+        if row.get("Result", "Pass") != "Pass":
+            continue
+        per_test = grouped.setdefault(_key(row), {})
+        for metric in metrics:
+            try:
+                per_test.setdefault(metric, []).append(float(row[metric]))
+            except (KeyError, TypeError, ValueError):
+                pass
+    return grouped
+
+def _robust_scale(*groups):
+    deviations = []
+    for values in groups:
+        if len(values) >= 2:
+            center = median(values)
+            deviations.extend(abs(v - center) for v in values)
+    # One repeated pair is a usable, if rough, estimate; pooling across tests steadies it
+    if len(deviations) < 2:
+        return None
+    return MAD_SCALE * median(deviations)
+
+def metric_mismatches(baseline_rows, current_rows):
+    """{test: (baseline MemMetrics, current MemMetrics)} for tests whose memory figures are not comparable."""
+    baseline = memory_metrics(baseline_rows)
+    current = memory_metrics(current_rows)
+    return {test: (baseline[test], kinds) for test, kinds in current.items()
+            if test in baseline and (baseline[test] != kinds or len(kinds) > 1)}
+
+def compare(baseline_rows, current_rows, metrics=METRICS, sigmas=3.0):
+    """Returns (findings, warnings)."""
+    baseline = group(baseline_rows, metrics)
+    current = group(current_rows, metrics)
+    warnings = []
+
+    # Memory measured differently (e.g. an old whole-tree RSS baseline) is dropped, not compared
+    mismatched = metric_mismatches(baseline_rows, current_rows)
+    for test, (b_kinds, c_kinds) in sorted(mismatched.items()):
+        warnings.append(f"{test}: baseline memory is {'/'.join(sorted(b_kinds))}, this run measured "
+                        f"{'/'.join(sorted(c_kinds))}; {'/'.join(MEMORY_METRICS)} not compared")
+        for metric in MEMORY_METRICS:
+            baseline[test].pop(metric, None)
+            current[test].pop(metric, None)
+
+    # Relative noise per metric from every test that has repeated samples of its own
+    pooled = {}
+    for metric in metrics:
+        ratios = []
+        for test, per_test in current.items():
+            b = baseline.get(test, {}).get(metric, [])
+            c = per_test.get(metric, [])
+            scale = _robust_scale(b, c)
+            center = median(b + c) if b + c else 0
+            if scale is not None and center > 0:
+                ratios.append(scale / center)
+        pooled[metric] = median(ratios) if ratios else None
+
+    findings = []
+    for test in sorted(current):
+        if test not in baseline:
+            warnings.append(f"{test}: not in baseline")
+            continue
+        for metric in metrics:
+            b = baseline[test].get(metric, [])
+            c = current[test].get(metric, [])
+            if not b or not c:
+                continue
+            b_med, c_med = median(b), median(c)
+            scale = _robust_scale(b, c)
+            if scale is None and pooled[metric] is not None:
+                scale = pooled[metric] * b_med
+            delta = c_med - b_med
+            if scale is None:
+                findings.append(Finding(test, metric, b_med, c_med, delta, None, False))
+                continue
+            threshold = max(sigmas * scale * (1 / len(b) + 1 / len(c)) ** 0.5, MIN_EFFECT.get(metric, 0.0))
+            findings.append(Finding(test, metric, b_med, c_med, delta, threshold, delta > threshold))
+
+    for metric in metrics:
+        if any(f.metric == metric and f.threshold is None for f in findings):
+            warnings.append(f"{metric}: no repeated samples to estimate noise from; not checked")
+    return findings, warnings
+
+def print_findings(findings, warnings, only_regressions=False):
+    for warning in warnings:
+        print(f"Warning: {warning}")
+
+    shown = [f for f in findings if f.regressed or not only_regressions]
+    if not shown:
+        print("No regressions against baseline.")
+        return
+
+    header = f"{'Test Name':<60} | {'Metric':<9} | {'Baseline':<9} | {'Current':<9} | {'Delta':<9} | {'Limit':<9}"
+    print(header)
+    print("-" * len(header))
+    for f in shown:
+        name = (f.test[:57] + '..') if len(f.test) > 57 else f.test
+        limit = f"{f.threshold:<9.2f}" if f.threshold is not None else f"{'-':<9}"
+        row = f"{name:<60} | {f.metric:<9} | {f.baseline:<9.2f} | {f.current:<9.2f} | {f.delta:<+9.2f} | {limit}"
+        print(f"{row}  REGRESSION" if f.regressed else row)
+
+def gate(baseline_rows, current_rows, sigmas=3.0):
+    """Prints the regression check; 1 if anything regressed or could not be compared, else 0."""
+    findings, warnings = compare(baseline_rows, current_rows, sigmas=sigmas)
+    print_findings(findings, warnings, only_regressions=True)
+    if metric_mismatches(baseline_rows, current_rows):
+        print("Error: the baseline measured memory differently; regenerate it with this version of RunMemoryTests.py")
+        return 1
+    if any(f.threshold is None for f in findings):
+        print("Error: no noise estimate for a regression limit; run with --repeat 2 or more, "
+              "or pass several baseline files")
+        return 1
+    return 1 if any(f.regressed for f in findings) else 0
@@ -0,0 +1,123 @@
+"""CPU-core scaling runs for RunMemoryTests.py.
+
+Each selected test is rerun with its process tree pinned to 1, 2, 4, ... N CPUs
+(sched_setaffinity is inherited by the CLI and testhost, and .NET sizes
+Environment.ProcessorCount and the thread pool from the affinity mask). The
+report gives speedup and parallel efficiency against the smallest core count
+and marks where adding cores stops paying off or makes things slower.
+"""
+import argparse
+import csv
+import os
+from collections import namedtuple
+from statistics import median
+
+# Extra cores must buy at least this fraction of their ideal speedup...
+FLATTEN_GAIN = 0.25
+# ...and a run this much slower than the previous core count counts as a reversal
+REVERSAL_TOLERANCE = 0.05
+
+Point = namedtuple("Point", ["cores", "wall", "cpu", "peak_mb", "speedup", "efficiency"])
+
+def available_cpus():
+    return sorted(os.sched_getaffinity(0))
+
+def cpu_order(cpus):
+    """Orders CPUs so each physical core is used once before any SMT sibling is added."""
+    def topology(cpu):
+        base = f"/sys/devices/system/cpu/cpu{cpu}/topology"
+        try:
+            with open(f"{base}/physical_package_id") as f:
+                package = int(f.read())
+            with open(f"{base}/core_id") as f:
+                core = int(f.read())
+            return package, core
+        except (OSError, ValueError):
+            return 0, cpu
+
+    seen = {}
+    ranked = []
+    for cpu in sorted(cpus):
+        key = topology(cpu)
+        ranked.append((seen.get(key, 0), cpu))
+        seen[key] = seen.get(key, 0) + 1
+    return [cpu for _, cpu in sorted(ranked)]
+
+def parse_core_counts(spec):
+    """'' -> powers of two up to every available CPU; '1,2,6' -> exactly those."""
+    total = len(available_cpus())
+    if not spec:
+        counts = []
+        n = 1
+        while n < total:
+            counts.append(n)
+            n *= 2
+        return counts + [total]
+    try:
+        counts = sorted({int(v) for v in spec.split(",") if v.strip()})
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Bad core counts '{spec}', expected e.g. 1,2,4")
+    if not counts or counts[0] < 1 or counts[-1] > total:
+        raise argparse.ArgumentTypeError(f"Core counts must be between 1 and {total}")
+    return counts
+
+def cpus_for(count, order):
+    return set(order[:count])
+
+def analyze(rows):
+    """{(test, config, gc profile): [Point]} from passing rows, repeated runs reduced to medians.
+    GC profiles get separate curves, as they change both wall time and peak memory."""
+    grouped = {}
+    for row in rows:
+        if row.get("Result") != "Pass" or row.get("Cores") in (None, ""):
+            continue
+        key = (row["Test"], row.get("Config") or "default", row.get("GcProfile") or "default")
+        grouped.setdefault(key, {}).setdefault(int(row["Cores"]), []).append(row)
+
+    curves = {}
+    for key, by_cores in grouped.items():
+        points = []
+        base_cores = base_wall = None
+        for cores in sorted(by_cores):
+            runs = by_cores[cores]
+            wall = median([float(r["DurationS"]) for r in runs])
+            cpu = median([float(r["CpuS"]) for r in runs if r.get("CpuS") not in (None, "")] or [0.0])
+            peak = median([float(r["MaxMB"]) for r in runs])
+            if base_cores is None:
+                base_cores, base_wall = cores, wall
+            speedup = base_wall / wall if wall > 0 else 0.0
+            points.append(Point(cores, wall, cpu, peak, speedup, speedup / (cores / base_cores)))
+        curves[key] = points
+    return curves
+
+def findings(points):
+    """Human-readable notes on where a curve flattens or reverses."""
+    flattened = reversed_at = None
+    for prev, point in zip(points, points[1:]):
+        if reversed_at is None and point.wall > prev.wall * (1 + REVERSAL_TOLERANCE):
+            reversed_at = f"reverses at {point.cores} cores ({prev.wall:.2f}s -> {point.wall:.2f}s)"
+        ideal_gain = point.cores / prev.cores - 1
+        gain = prev.wall / point.wall - 1 if point.wall > 0 else 0.0
+        if flattened is None and reversed_at is None and gain < ideal_gain * FLATTEN_GAIN:
+            flattened = f"flattens at {point.cores} cores (x{point.speedup:.2f}, efficiency {point.efficiency:.0%})"
+    return [note for note in (flattened, reversed_at) if note]
+
+def report(curves, csv_path=None):
+    for (test, config, gc_profile), points in sorted(curves.items()):
+        labels = ([config] if config != "default" else []) + ([f"GC={gc_profile}"] if gc_profile != "default" else [])
+        title = f"{test} [{', '.join(labels)}]" if labels else test
+        print(f"\n{title}")
+        print(f"  {'Cores':>5} | {'Wall s':>8} | {'CPU s':>8} | {'Peak MB':>9} | {'Speedup':>7} | {'Eff.':>5}")
+        for p in points:
+            print(f"  {p.cores:>5} | {p.wall:>8.2f} | {p.cpu:>8.2f} | {p.peak_mb:>9.2f} | {p.speedup:>7.2f} | {p.efficiency:>5.0%}")
+        for note in findings(points):
+            print(f"  -> {note}")
+
+    if csv_path:
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Test", "Config", "GcProfile", "Cores", "WallS", "CpuS", "PeakMB", "Speedup", "Efficiency"])
+            for (test, config, gc_profile), points in sorted(curves.items()):
+                for p in points:
+                    writer.writerow([test, config, gc_profile, p.cores, round(p.wall, 4), round(p.cpu, 4), round(p.peak_mb, 2),
+                                     round(p.speedup, 3), round(p.efficiency, 3)])
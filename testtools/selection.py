@@ -0,0 +1,282 @@
+"""Change-aware test selection: which test classes can a git diff affect?
+
+Changed files are mapped to the projects of ImageAutomate.sln that own them. A
+changed .cs file marks the types it declares as changed; any other change inside
+a project (.csproj, resources, a deleted file) marks every type of that project.
+Changes then propagate through a type reference index: a file that mentions a
+changed type by name, and whose project can see the type's project through the
+ProjectReference graph, changes in turn. The test classes reached this way are
+the ones to run.
+
+Name matching is deliberately coarse (comments are ignored, strings are not), so
+it errs towards running more. Changes to FULL_SUITE_FILES, or to solution-level
+build files outside any project, select the whole suite.
+
+The per-file index (namespace, declared types, referenced names) is cached in
+SELECTION_CACHE and only re-read for files whose size or mtime changed.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import re
+import subprocess
+import sys
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+from testtools import discovery
+
+SOLUTION = "ImageAutomate/ImageAutomate.sln"
+SELECTION_CACHE = os.path.abspath(".test_selection_index.json")
+
+# Everything runs through these, so a change to one of them is never narrowed down
+FULL_SUITE_FILES = (
+    "*/ImageAutomate.Execution/GraphExecutor.cs",
+    "*/ImageAutomate.Execution/Warehouse.cs",
+    "*/ImageAutomate.Execution/DependencyBarrier.cs",
+    "*/Directory.Build.*",
+    "*/Directory.Packages.props",
+    "*/global.json",
+    "*/NuGet.config",
+    "*.sln",
+)
+TEST_PACKAGES = ("xunit", "mstest", "nunit", "microsoft.net.test.sdk")
+
+Selection = namedtuple("Selection", ["full", "reason", "classes", "changed"])
+
+_PROJECT_LINE = re.compile(r'^Project\("\{[^}]+\}"\)\s*=\s*"([^"]+)",\s*"([^"]+\.csproj)"', re.M)
+_COMMENTS = re.compile(r"//[^\n]*|/\*.*?\*/", re.S)
+_NAMESPACE = re.compile(r"\bnamespace\s+([\w.]+)")
+_DECLARATION = re.compile(r"\b(?:class|struct|interface|enum|record(?:\s+class|\s+struct)?)\s+([A-Za-z_]\w*)")
+_NAME = re.compile(r"\b[A-Z_]\w*")
+_BASE = re.compile(r"\bclass\s+([A-Za-z_]\w*)\s*(?:<[^>{]*>)?\s*:\s*([\w.]+)")
+_TEST_ATTRIBUTE = re.compile(r"\[\s*(?:Fact|Theory|TestMethod|Test|TestCase)\b")
+CACHE_VERSION = 1
+
+def solution_projects(solution_path=SOLUTION):
+    """{project name: absolute .csproj path} from the solution file."""
+    with open(solution_path, "r", encoding="utf-8-sig") as f:
+        text = f.read()
+    base = os.path.dirname(os.path.abspath(solution_path))
+    return {name: os.path.normpath(os.path.join(base, rel.replace("\\", os.sep)))
+            for name, rel in _PROJECT_LINE.findall(text)}
+
+def is_test_project(project_path):
+    try:
+        root = ET.parse(project_path).getroot()
+    except (ET.ParseError, OSError):
+        return False
+    for elem in root.iter():
+        if elem.tag.rsplit("}", 1)[-1] == "PackageReference":
+            package = (elem.get("Include") or "").lower()
+            if any(package.startswith(p) for p in TEST_PACKAGES):
+                return True
+    return False
+
+def _visible_projects(projects):
+    """{project path: set of project paths whose types it can use (itself and its transitive references)}."""
+    visible = {}
+    for path in projects.values():
+        seen = set()
+        queue = [path]
+        while queue:
+            current = queue.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            queue.extend(discovery.project_references(current))
+        visible[path] = seen
+    return visible
+
+def _scan_file(path):
+    with open(path, "r", encoding="utf-8-sig", errors="replace") as f:
+        text = _COMMENTS.sub(" ", f.read())
+    namespace = _NAMESPACE.search(text)
+    return {
+        "namespace": namespace.group(1) if namespace else "",
+        "types": sorted(set(_DECLARATION.findall(text))),
+        "names": sorted(set(_NAME.findall(text))),
+        "bases": {name: base.rsplit(".", 1)[-1] for name, base in _BASE.findall(text)},
+        "has_tests": bool(_TEST_ATTRIBUTE.search(text)),
+    }
+
+def build_index(projects, cache_path=SELECTION_CACHE):
+    """{absolute .cs path: {'project', 'namespace', 'types', 'names', 'bases', 'has_tests'}} for every source file."""
+    cache = {}
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r") as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION:
+                cache = data["files"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            cache = {}
+
+    index = {}
+    fresh = {}
+    for project in projects.values():
+        project_dir = os.path.dirname(project)
+        for dirpath, dirnames, filenames in os.walk(project_dir):
+            dirnames[:] = [d for d in dirnames if d not in ("bin", "obj", "TestResults")]
+            for filename in filenames:
+                if not filename.endswith(".cs"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                st = os.stat(path)
+                stamp = [st.st_mtime_ns, st.st_size]
+                entry = cache.get(path)
+                if entry is None or entry.get("stamp") != stamp:
+                    entry = dict(_scan_file(path), stamp=stamp)
+                fresh[path] = entry
+                index[path] = dict(entry, project=project)
+
+    if cache_path and fresh != cache:
+        with open(cache_path, "w") as f:
+            json.dump({"version": CACHE_VERSION, "files": fresh}, f)
+    return index
+
+def _owner(path, projects):
+    """The project whose directory contains `path` (deepest match), or None."""
+    best = None
+    for project in projects.values():
+        project_dir = os.path.dirname(project) + os.sep
+        if path.startswith(project_dir) and (best is None or len(project_dir) > len(os.path.dirname(best))):
+            best = project
+    return best
+
+def changed_files(since, repo_root=None):
+    """Absolute paths changed between the merge base with `since` and the working tree, plus untracked files."""
+    def git(*args):
+        result = subprocess.run(["git", "-C", repo_root or ".", *args], capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"git {' '.join(args)} failed: {result.stderr.strip()}")
+        return result.stdout
+
+    root = git("rev-parse", "--show-toplevel").strip()
+    base = git("merge-base", since, "HEAD").strip()
+    names = git("diff", "--name-only", base).splitlines()
+    names += git("ls-files", "--others", "--exclude-standard").splitlines()
+    return sorted({os.path.normpath(os.path.join(root, name)) for name in names if name})
+
+def affected_classes(changed, solution_path=SOLUTION, cache_path=SELECTION_CACHE):
+    """Selection for a list of absolute changed paths."""
+    projects = solution_projects(solution_path)
+    solution_dir = os.path.dirname(os.path.abspath(solution_path)) + os.sep
+    index = build_index(projects, cache_path)
+
+    changed_types = set()
+    changed_projects = set()
+    relevant = []
+    for path in changed:
+        if not path.startswith(solution_dir):
+            # Runner scripts, docs, assets: not part of any build
+            continue
+        relevant.append(path)
+        rel = "/" + os.path.relpath(path, os.path.dirname(solution_dir.rstrip(os.sep))).replace(os.sep, "/")
+        if any(fnmatch.fnmatch(rel, pattern) for pattern in FULL_SUITE_FILES):
+            return Selection(True, f"core file changed: {rel.lstrip('/')}", set(), relevant)
+        project = _owner(path, projects)
+        if project is None:
+            return Selection(True, f"solution-level file changed: {rel.lstrip('/')}", set(), relevant)
+        entry = index.get(path)
+        if entry and entry["types"]:
+            changed_types.update((project, t) for t in entry["types"])
+        else:
+            changed_projects.add(project)
+
+    # Every type of a project-wide change counts as changed
+    for path, entry in index.items():
+        if entry["project"] in changed_projects:
+            changed_types.update((entry["project"], t) for t in entry["types"])
+
+    visible = _visible_projects(projects)
+    by_name = {}
+    for project, name in changed_types:
+        by_name.setdefault(name, set()).add(project)
+
+    affected = set(changed_types)
+    frontier = dict(by_name)
+    while frontier:
+        reached = {}
+        for path, entry in index.items():
+            if not entry["types"]:
+                continue
+            project = entry["project"]
+            if any(name in frontier and frontier[name] & visible[project] for name in entry["names"]):
+                for t in entry["types"]:
+                    if (project, t) not in affected:
+                        affected.add((project, t))
+                        reached.setdefault(t, set()).add(project)
+        frontier = reached
+
+    # Test classes: declared next to test attributes, or deriving from such a class (the memory test variants)
+    test_projects = {p for p in projects.values() if is_test_project(p)}
+    declared = {}
+    bases = {}
+    with_tests = set()
+    for path, entry in index.items():
+        if entry["project"] not in test_projects:
+            continue
+        for t in entry["types"]:
+            declared[(entry["project"], t)] = entry["namespace"]
+            if entry["has_tests"]:
+                with_tests.add((entry["project"], t))
+        for name, base in entry["bases"].items():
+            bases[(entry["project"], name)] = (entry["project"], base)
+
+    def runs_tests(key, depth=0):
+        if key in with_tests:
+            return True
+        return key in bases and depth < 16 and runs_tests(bases[key], depth + 1)
+
+    classes = set()
+    for key, namespace in declared.items():
+        if key in affected and runs_tests(key):
+            classes.add(f"{namespace}.{key[1]}" if namespace else key[1])
+    return Selection(False, f"{len(relevant)} changed file(s) in the solution", classes, relevant)
+
+def from_git(since, solution_path=SOLUTION):
+    """Selection for the changes since `since`; the full suite if git cannot tell."""
+    try:
+        return affected_classes(changed_files(since, os.path.dirname(os.path.abspath(solution_path))), solution_path)
+    except (RuntimeError, OSError) as e:
+        return Selection(True, f"cannot diff against {since} ({e})", set(), [])
+
+def select(selection, tests):
+    """The discovered test names that belong to a selected class."""
+    if selection.full:
+        return list(tests)
+    prefixes = tuple(c + "." for c in selection.classes)
+    return [t for t in tests if t.startswith(prefixes)]
+
+def filter_expression(selection):
+    """A `dotnet test --filter` for the selected classes: '' for the full suite, None if nothing is affected."""
+    if selection.full:
+        return ""
+    if not selection.classes:
+        return None
+    return "|".join(f"FullyQualifiedName~{c}." for c in sorted(selection.classes))
+
+def main():
+    parser = argparse.ArgumentParser(description="Show which test classes a change can affect")
+    parser.add_argument('--since', type=str, default='origin/main', help='Compare against the merge base with this ref')
+    parser.add_argument('--solution', type=str, default=SOLUTION, help='Solution file')
+    parser.add_argument('files', nargs='*', help='Changed files (default: from git)')
+    args = parser.parse_args()
+
+    changed = [os.path.abspath(f) for f in args.files] if args.files else changed_files(args.since)
+    selection = affected_classes(changed, args.solution)
+    print(f"# {selection.reason}", file=sys.stderr)
+    if selection.full:
+        print("# full suite", file=sys.stderr)
+        return
+    if not selection.classes:
+        print("# no tests affected", file=sys.stderr)
+        return
+    for name in sorted(selection.classes):
+        print(name)
+    print(f"# --filter \"{filter_expression(selection)}\"", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""Splitting a test run across machines and merging the shards back together.
+
+`--shard i/N` gives each runner a disjoint part of the discovered tests. Tests are
+assigned longest-first to whichever shard has the least estimated work so far
+(LPT scheduling), using historical durations from the history database or from
+earlier result CSVs; tests without history get the median known duration. Every
+agent must see the same durations source, since each one computes the split on
+its own.
+
+Each shard leaves a <runner>.shard.json manifest next to its outputs. Merging the shard
+directories concatenates the RunTests.py result CSV, memory_stats.csv and
+failed_tests.log and prints the report a single machine would have:
+
+    python -m testtools.sharding merge shard1/ shard2/ shard3/ -o merged/
+"""
+import argparse
+import csv
+import glob
+import heapq
+import json
+import os
+import sqlite3
+import sys
+from statistics import median
+
+from testtools import adaptive, gcprofiles, regression, scaling, sweep, variants
+
+MANIFEST_SUFFIX = ".shard.json"
+# Host startup of a `dotnet test` launch that the TRX durations do not include
+LAUNCH_OVERHEAD_S = 2.0
+MEMORY_STATS = "memory_stats.csv"
+FAILURE_LOG = "failed_tests.log"
+
+def parse_shard(spec):
+    """'2/4' -> (2, 4); shards are numbered from 1."""
+    index, sep, count = spec.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        index = count = 0
+    if not sep or count < 1 or not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"Bad shard '{spec}', expected i/N with 1 <= i <= N")
+    return index, count
+
+def load_durations(paths):
+    """{test: seconds} from history databases (.db) and result CSVs (DurationS or AvgDurationS)."""
+    durations = {}
+    csv_paths = []
+    for path in paths:
+        if not path.endswith(".db"):
+            csv_paths.append(path)
+            continue
+        if not os.path.exists(path):
+            continue
+        conn = sqlite3.connect(path)
+        try:
+            # Passing executions when there are any; a test that always fails still costs its failures
+            for test, passed, overall in conn.execute(
+                    "SELECT test, AVG(CASE WHEN passed THEN duration_s END), AVG(duration_s) FROM results "
+                    "WHERE duration_s IS NOT NULL GROUP BY test"):
+                durations[test] = passed if passed is not None else overall
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            conn.close()
+
+    samples = {}
+    for row in regression.load_rows([p for p in regression.expand_paths(csv_paths) if os.path.exists(p)]):
+        value = row.get("DurationS") or row.get("AvgDurationS")
+        if row.get("Test") and value not in (None, ""):
+            samples.setdefault(row["Test"], []).append(float(value))
+    for test, values in samples.items():
+        durations.setdefault(test, median(values))
+    return durations
+
+def assign(tests, durations, count, overhead=0.0):
+    """Splits `tests` into `count` lists (each in the original order) and returns (shards, estimated seconds)."""
+    known = [durations[t] for t in tests if t in durations]
+    default = median(known) if known else 1.0
+    cost = {t: durations.get(t, default) + overhead for t in tests}
+
+    heap = [(0.0, i) for i in range(count)]
+    members = [set() for _ in range(count)]
+    for test in sorted(tests, key=lambda t: (-cost[t], t)):
+        load, i = heapq.heappop(heap)
+        members[i].add(test)
+        heapq.heappush(heap, (load + cost[test], i))
+
+    loads = [0.0] * count
+    for load, i in heap:
+        loads[i] = load
+    # Original (discovery) order keeps warm-host batches grouped by class
+    return [[t for t in tests if t in m] for m in members], loads
+
+def select(tests, shard, durations, overhead=0.0, log=print):
+    index, count = shard
+    shards, loads = assign(tests, durations, count, overhead)
+    known = sum(1 for t in tests if t in durations)
+    log(f"Shard {index}/{count}: {len(shards[index - 1])} of {len(tests)} tests, ~{loads[index - 1]:.0f}s estimated "
+        f"(shards {min(loads):.0f}-{max(loads):.0f}s; history for {known} tests)")
+    return shards[index - 1], loads[index - 1]
+
+def write_manifest(runner, shard, tests, estimate, outputs, runs=None, confidence=None, directory="."):
+    """Writes <runner>.shard.json; `outputs` maps a kind ('results', 'memory_stats', 'failures') to a file path,
+    stored relative to the manifest. `confidence` is the level of the results' fail-rate intervals."""
+    base = os.path.abspath(directory)
+    path = os.path.join(base, runner + MANIFEST_SUFFIX)
+    manifest = {
+        "runner": runner,
+        "index": shard[0],
+        "count": shard[1],
+        "tests": tests,
+        "estimated_s": round(estimate, 2),
+        "runs": runs,
+        "confidence": confidence,
+        "outputs": {kind: os.path.relpath(os.path.abspath(p), base) for kind, p in outputs.items() if p},
+    }
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=1)
+
+def _read_csv(path):
+    with open(path, "r", newline="") as f:
+        reader = csv.DictReader(f)
+        return list(reader.fieldnames or []), list(reader)
+
+def _write_csv(path, fieldnames, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+def _merge_fields(fields, more):
+    return fields + [name for name in more if name not in fields]
+
+def _fail_interval(row, confidence):
+    """The row's FailCiLow/FailCiHigh as fractions; recomputed for CSVs written before those columns."""
+    if row.get("FailCiLow") not in (None, "") and row.get("FailCiHigh") not in (None, ""):
+        return float(row["FailCiLow"]) / 100, float(row["FailCiHigh"]) / 100
+    return adaptive.wilson_interval(int(row['Fail']), int(row['Pass']) + int(row['Fail']), confidence or 0.95)
+
+def print_results(rows, runs=None, confidence=None):
+    """RunTests.py's per-container table, rebuilt from its CSV rows."""
+    ci_label = f"{confidence:.0%} CI" if confidence else "CI"
+    print(f"\n--- Test Report (Total Runs: {runs if runs is not None else '?'}) ---")
+    containers = {}
+    for row in rows:
+        containers.setdefault(row["Container"], []).append(row)
+    leak_column = any(row.get("LeakVerdict") not in (None, "", "n/a") for row in rows)
+    for container in sorted(containers):
+        print(f"\nContainer: {container}")
+        header = f"{'Test Case':<60} | {'Pass':<5} | {'Fail':<5} | {'Fail %':<7} | {ci_label:<13} | {'Max MB':<8} | {'Avg MB':<8} | {'Avg s':<7} | {'CPU s':<7} | {'img/s':<8}"
+        if leak_column:
+            header += f" | {'Leak':<6}"
+        print(header)
+        print("-" * len(header))
+        for row in sorted(containers[container], key=lambda r: (int(r["Fail"]), r["Test"]), reverse=True):
+            name = row["Test"]
+            display_name = (name[:57] + '..') if len(name) > 57 else name
+            cpu = f"{float(row['AvgCpuS']):.2f}" if row.get("AvgCpuS") else '-'
+            images = f"{float(row['ImagesPerS']):.2f}" if row.get("ImagesPerS") else '-'
+            ci_low, ci_high = _fail_interval(row, confidence)
+            ci_text = f"{ci_low * 100:.1f}-{ci_high * 100:.1f}%"
+            line = (f"{display_name:<60} | {row['Pass']:<5} | {row['Fail']:<5} | {float(row['FailPercent']):.1f}%   "
+                    f"| {ci_text:<13} | {float(row['MaxMB']):<8.2f} | {float(row['AvgMB']):<8.2f} | {float(row.get('AvgDurationS') or 0):<7.2f}"
+                    f" | {cpu:<7} | {images:<8}")
+            if leak_column:
+                line += f" | {row.get('LeakVerdict', ''):<6}"
+            print(line)
+
+def _memory_reports(rows, output):
+    """Global stats plus the sweep / GC profile / scaling reports RunMemoryTests.py prints for the same rows."""
+    if rows:
+        maxes = [float(r["MaxMB"]) for r in rows]
+        avgs = [float(r["AvgMB"]) for r in rows]
+        print("\n" + "=" * 90)
+        print(f"Global Stats: Max={max(maxes):.2f}MB, Min={min(float(r['MinMB']) for r in rows):.2f}MB, "
+              f"Avg={sum(avgs) / len(avgs):.2f}MB")
+
+    if len({r.get("Config", "default") for r in rows}) > 1:
+        print("\n" + "=" * 90)
+        print("Sweep: Pareto-optimal configurations (throughput vs peak memory)")
+        sweep.report(sweep.summarize(rows, variants.load_variants()), os.path.join(output, "sweep_pareto.csv"))
+
+    profiles = sorted({r.get("GcProfile") or "default" for r in rows})
+    if profiles != ["default"]:
+        print("\n" + "=" * 90)
+        print("GC profiles (median peak MB and duration per profile)")
+        gcprofiles.report(rows, [gcprofiles.GcProfile(name, {}) for name in profiles], os.path.join(output, "gc_profiles.csv"))
+
+    if any(r.get("Cores") for r in rows):
+        print("\n" + "=" * 90)
+        print("CPU scaling (speedup and efficiency against the smallest core count)")
+        scaling.report(scaling.analyze(rows), os.path.join(output, "scaling.csv"))
+
+def _check_split(runner, manifests):
+    problems = []
+    counts = {m["count"] for _, m in manifests}
+    if len(counts) > 1:
+        problems.append(f"{runner}: shards come from different splits: {sorted(counts)}")
+    levels = {m.get("confidence") for _, m in manifests} - {None}
+    if len(levels) > 1:
+        problems.append(f"{runner}: shards used different --confidence levels: {sorted(levels)}")
+    seen = {}
+    for directory, m in manifests:
+        if m["index"] in seen:
+            problems.append(f"{runner}: shard {m['index']} appears twice ({seen[m['index']]}, {directory})")
+        seen[m["index"]] = directory
+    missing = [i for i in range(1, max(counts) + 1) if i not in seen]
+    if missing:
+        problems.append(f"{runner}: missing shard(s) {', '.join(map(str, missing))} of {max(counts)}")
+    for directory, m in manifests:
+        if m["tests"] and not any(_shard_file(directory, m, kind) for kind in ("results", "memory_stats")):
+            problems.append(f"{runner}: shard {m['index']} in {directory} has no results file")
+    owners = {}
+    for _, m in manifests:
+        for test in m["tests"]:
+            if test in owners:
+                problems.append(f"{runner}: {test} ran in shards {owners[test]} and {m['index']}")
+            owners[test] = m["index"]
+    return problems
+
+def _shard_file(directory, manifest, kind):
+    rel = manifest.get("outputs", {}).get(kind)
+    path = os.path.join(directory, rel) if rel else None
+    return path if path and os.path.exists(path) else None
+
+def _concat(manifests, kind):
+    fields, rows = [], []
+    for directory, m in manifests:
+        path = _shard_file(directory, m, kind)
+        if path:
+            more, shard_rows = _read_csv(path)
+            fields = _merge_fields(fields, more)
+            rows.extend(shard_rows)
+    return fields, rows
+
+def merge(directories, output):
+    """Merges shard directories into `output`. Returns a list of problems (missing shards, overlapping tests)."""
+    by_runner = {}
+    problems = []
+    for directory in directories:
+        paths = sorted(glob.glob(os.path.join(directory, "*" + MANIFEST_SUFFIX)))
+        if not paths:
+            problems.append(f"{directory}: no *{MANIFEST_SUFFIX}")
+        for path in paths:
+            with open(path, "r") as f:
+                manifest = json.load(f)
+            by_runner.setdefault(manifest["runner"], []).append((directory, manifest))
+    if not by_runner:
+        return problems
+
+    os.makedirs(output, exist_ok=True)
+    for runner, manifests in sorted(by_runner.items()):
+        problems += _check_split(runner, manifests)
+        manifests.sort(key=lambda item: item[1]["index"])
+
+        # RunTests.py: per-test aggregate rows; tests are disjoint, so rows simply concatenate
+        fields, rows = _concat(manifests, "results")
+        if rows:
+            _write_csv(os.path.join(output, "results.csv"), fields, rows)
+            levels = {m.get("confidence") for _, m in manifests} - {None}
+            print_results(rows, sum(m.get("runs") or 0 for _, m in manifests), levels.pop() if len(levels) == 1 else None)
+
+        # RunMemoryTests.py: one row per execution, ordered like a single run walks the matrix
+        fields, rows = _concat(manifests, "memory_stats")
+        if rows:
+            points = {}
+            for row in rows:
+                points.setdefault((row.get("Config"), row.get("GcProfile"), row.get("Cores")), len(points))
+            rows.sort(key=lambda r: (points[(r.get("Config"), r.get("GcProfile"), r.get("Cores"))], int(r.get("Run") or 1)))
+            _write_csv(os.path.join(output, MEMORY_STATS), fields, rows)
+            _memory_reports(rows, output)
+
+        logs = [(m, _shard_file(directory, m, "failures")) for directory, m in manifests]
+        logs = [(m, path) for m, path in logs if path]
+        if logs:
+            with open(os.path.join(output, FAILURE_LOG), "a", encoding="utf-8") as out:
+                for m, path in logs:
+                    with open(path, "r", encoding="utf-8") as f:
+                        text = f.read()
+                    if text:
+                        out.write(f"=== {runner} shard {m['index']}/{m['count']} ===\n\n{text}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan and merge sharded test runs")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    merge_cmd = commands.add_parser('merge', help='Combine shard output directories into one report')
+    merge_cmd.add_argument('directories', nargs='+', help=f'Shard directories, each with *{MANIFEST_SUFFIX} manifests')
+    merge_cmd.add_argument('-o', '--output', type=str, default='merged', help='Directory for the merged files')
+
+    plan_cmd = commands.add_parser('plan', help='Show how a test list would be split')
+    plan_cmd.add_argument('tests', help='File with one test name per line')
+    plan_cmd.add_argument('--shards', type=int, required=True)
+    plan_cmd.add_argument('--durations', type=str, nargs='+', default=[], help='History databases or result CSVs')
+    plan_cmd.add_argument('--overhead', type=float, default=0.0, help='Seconds added per test launch')
+    args = parser.parse_args()
+
+    if args.command == 'plan':
+        with open(args.tests, "r") as f:
+            tests = [line.strip() for line in f if line.strip()]
+        shards, loads = assign(tests, load_durations(args.durations), args.shards, args.overhead)
+        for i, (shard, load) in enumerate(zip(shards, loads), 1):
+            print(f"Shard {i}/{args.shards}: {len(shard)} tests, ~{load:.1f}s")
+        return
+
+    problems = merge(args.directories, args.output)
+    for problem in problems:
+        print(f"Warning: {problem}", file=sys.stderr)
+    print(f"\nMerged results written to {os.path.abspath(args.output)}")
+    sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Executor configuration sweeps for RunMemoryTests.py.
+
+A sweep is a grid of ExecutorConfiguration values, e.g.
+
+    --sweep MaxDegreeOfParallelism=1,2,4,8 --sweep MaxShipmentSize=8,32
+
+Each grid point is passed to the test host as IA_EXECUTOR_<Property> environment
+variables (see ExecutorConfigOverrides.cs). Results are summarized per variant
+(resolution and workload from TestVariants.cs) and reduced to the configurations
+on the throughput / peak-memory Pareto front.
+"""
+import argparse
+import csv
+import itertools
+from collections import namedtuple
+from statistics import median
+
+from testtools import variants as variants_mod
+
+ENV_PREFIX = "IA_EXECUTOR_"
+
+# Public settable properties of ExecutorConfiguration
+SETTINGS = (
+    "Mode", "MaxDegreeOfParallelism", "WatchdogTimeout", "EnableGcThrottling", "MaxShipmentSize",
+    "ProfilingWindowSize", "CostEmaAlpha", "CriticalPathRecomputeInterval", "BatchSize", "CriticalPathBoost",
+)
+
+Summary = namedtuple("Summary", ["resolution", "workload", "config", "images", "duration", "peak_mb", "images_per_s", "failed"])
+
+def parse_axis(spec):
+    """'MaxDegreeOfParallelism=1,2,4' -> ('MaxDegreeOfParallelism', ['1', '2', '4'])."""
+    name, sep, values = spec.partition("=")
+    if not sep or not values:
+        raise argparse.ArgumentTypeError(f"Bad sweep axis '{spec}', expected Name=v1,v2")
+    matches = [s for s in SETTINGS if s.lower() == name.strip().lower()]
+    if not matches:
+        raise argparse.ArgumentTypeError(f"Unknown executor setting '{name}'; choose from {', '.join(SETTINGS)}")
+    return matches[0], [v.strip() for v in values.split(",") if v.strip()]
+
+def grid(axes):
+    """Cartesian product of the axes as a list of {setting: value} dicts (one empty point if none)."""
+    names = [name for name, _ in axes]
+    return [dict(zip(names, values)) for values in itertools.product(*(values for _, values in axes))]
+
+def point_env(point):
+    return {ENV_PREFIX + name: value for name, value in point.items()}
+
+def point_label(point):
+    return ",".join(f"{name}={value}" for name, value in point.items()) or "default"
+
+def summarize(rows, variants):
+    """One Summary per (variant, config): the variant's tests run back to back.
+
+    Repeated runs of a test are reduced to their median first. `images` counts source
+    images (FanOut still reads each image once), so images/s is comparable across topologies.
+    """
+    per_test = {}
+    for row in rows:
+        variant = variants_mod.variant_for_test(row["Test"], variants)
+        if variant is None:
+            continue
+        config = row.get("Config", "default")
+        if row.get("GcProfile") not in (None, "", "default"):
+            config += f",GC={row['GcProfile']}"
+        if row.get("Cores"):
+            config += f",Cores={row['Cores']}"
+        entry = per_test.setdefault((variant.name, config, row["Test"]),
+                                    {"durations": [], "peaks": [], "failed": False})
+        if row["Result"] != "Pass":
+            entry["failed"] = True
+            continue
+        entry["durations"].append(float(row["DurationS"]))
+        entry["peaks"].append(float(row["MaxMB"]))
+
+    grouped = {}
+    for (variant_name, config, _), entry in per_test.items():
+        grouped.setdefault((variant_name, config), []).append(entry)
+
+    summaries = []
+    for (variant_name, config), entries in sorted(grouped.items()):
+        variant = variants[variant_name]
+        failed = any(e["failed"] or not e["durations"] for e in entries)
+        duration = sum(median(e["durations"]) for e in entries if e["durations"])
+        peak = max((median(e["peaks"]) for e in entries if e["peaks"]), default=0.0)
+        images = variant.items * len(entries)
+        summaries.append(Summary(variant.resolution, variant.workload, config, images, duration, peak,
+                                 images / duration if duration > 0 else 0.0, failed))
+    return summaries
+
+def pareto_front(summaries, memory_tolerance_mb=1.0):
+    """Passing configurations not beaten on both throughput (higher) and peak memory (lower).
+    Peaks within `memory_tolerance_mb` count as equal, so sampling jitter cannot keep a slower
+    configuration on the front."""
+    candidates = [s for s in summaries if not s.failed]
+    front = []
+    for s in candidates:
+        dominated = any(
+            o.images_per_s >= s.images_per_s and o.peak_mb <= s.peak_mb + memory_tolerance_mb and
+            (o.images_per_s > s.images_per_s or o.peak_mb < s.peak_mb - memory_tolerance_mb)
+            for o in candidates
+        )
+        if not dominated:
+            front.append(s)
+    return sorted(front, key=lambda s: -s.images_per_s)
+
+def report(summaries, csv_path=None):
+    """Prints the Pareto front per resolution/workload; optionally writes every point to CSV."""
+    groups = {}
+    for s in summaries:
+        groups.setdefault((s.resolution, s.workload), []).append(s)
+
+    optimal = set()
+    for (resolution, workload), group in sorted(groups.items()):
+        front = pareto_front(group)
+        optimal.update(front)
+        print(f"\n{resolution} / {workload}: {len(front)} of {len(group)} configurations on the Pareto front")
+        for s in front:
+            print(f"  {s.images_per_s:>9.2f} img/s | {s.peak_mb:>9.2f} MB peak | {s.duration:>8.2f} s | {s.config}")
+        failed = [s.config for s in group if s.failed]
+        if failed:
+            print(f"  failed: {'; '.join(failed)}")
+
+    if csv_path:
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Resolution", "Workload", "Config", "Images", "DurationS", "PeakMB", "ImagesPerS", "Failed", "Pareto"])
+            for s in summaries:
+                writer.writerow([s.resolution, s.workload, s.config, s.images, round(s.duration, 4), round(s.peak_mb, 2),
+                                 round(s.images_per_s, 3), s.failed, s in optimal])
@@ -0,0 +1,200 @@
+"""Per-thread CPU sampling of the testhost (Linux).
+
+Every `interval` the profiler reads each testhost thread's CPU time, preferably
+from /proc/<pid>/task/<tid>/schedstat (nanoseconds) and otherwise from the
+clock-tick counters in .../stat, and keeps the per-thread deltas. Only threads
+that ran during a tick produce a row, so the timeline stays small while most of
+the pool waits (which is exactly the behaviour this is meant to expose).
+
+The timeline is an .iatrace file in long format: columns timestamp, tid and cpu
+(seconds of CPU the thread used since the previous tick), with thread names,
+the interval and the testhost pids in the header meta. It is written when the
+launch ends, because the thread list is only known then.
+
+`summarize()` turns a timeline (or a time window of it, e.g. one test of a
+warm-host batch) into average busy threads, idle gaps and the hottest threads.
+"""
+import asyncio
+import os
+import time
+
+from testtools import procmem, timeseries
+
+THREAD_COLUMNS = [("timestamp", "d"), ("tid", "I"), ("cpu", "f")]
+SUFFIX = ".threads.iatrace"
+# Below this many cores' worth of CPU the host counts as idle...
+IDLE_BUSY_THREADS = 0.1
+# ...and only idle stretches at least this long are reported as gaps
+MIN_GAP = 0.05
+HOT_THREADS = 3
+
+class _ThreadEntry:
+    __slots__ = ("fd", "schedstat", "last", "name")
+
+    def __init__(self, pid, tid):
+        self.name = ""
+        self.last = None
+        base = f"/proc/{pid}/task/{tid}"
+        try:
+            with open(f"{base}/comm", "r") as f:
+                self.name = f.read().strip()
+        except OSError:
+            pass
+        try:
+            self.fd = os.open(f"{base}/schedstat", os.O_RDONLY)
+            self.schedstat = True
+        except OSError:
+            self.schedstat = False
+            self.fd = os.open(f"{base}/stat", os.O_RDONLY)
+
+    def read(self):
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        data = os.read(self.fd, 4096)
+        if not data:
+            raise OSError("thread exited")
+        if self.schedstat:
+            return int(data.split()[0]) / 1e9
+        fields = data[data.rindex(b")") + 2:].split()
+        return (int(fields[11]) + int(fields[12])) / procmem.CLOCK_TICKS
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+class ThreadProfiler:
+    """Samples the threads of every testhost below `root_pid`; feed it to orchestrator.RunState.thread_profiler."""
+
+    def __init__(self, interval=0.01, host_refresh=0.25):
+        self.interval = max(procmem.MIN_INTERVAL, interval)
+        self.host_refresh = host_refresh
+        self.hosts = set()
+        self.seen_hosts = set()
+        self.names = {}
+        self.times = []
+        self.tids = []
+        self.cpu = []
+        self._threads = {}
+
+    def _find_hosts(self, root_pid):
+        queue = [root_pid]
+        while queue:
+            pid = queue.pop()
+            try:
+                with open(f"/proc/{pid}/cmdline", "rb") as f:
+                    cmdline = f.read().decode("utf-8", "replace").split("\0")
+                if procmem.classify(cmdline) == procmem.ROLE_TESTHOST:
+                    self.hosts.add(pid)
+                    self.seen_hosts.add(pid)
+                for tid in os.listdir(f"/proc/{pid}/task"):
+                    with open(f"/proc/{pid}/task/{tid}/children", "r") as f:
+                        queue.extend(int(c) for c in f.read().split())
+            except (OSError, ValueError):
+                continue
+
+    def sample(self, timestamp):
+        for pid in list(self.hosts):
+            try:
+                tids = os.listdir(f"/proc/{pid}/task")
+            except OSError:
+                self.hosts.discard(pid)
+                continue
+            for tid in tids:
+                key = int(tid)
+                entry = self._threads.get(key)
+                if entry is None:
+                    try:
+                        entry = self._threads[key] = _ThreadEntry(pid, tid)
+                    except OSError:
+                        continue
+                    self.names[key] = entry.name
+                try:
+                    now = entry.read()
+                except (OSError, ValueError, IndexError):
+                    self._threads.pop(key).close()
+                    continue
+                if entry.last is not None and now > entry.last:
+                    self.times.append(timestamp)
+                    self.tids.append(key)
+                    self.cpu.append(now - entry.last)
+                entry.last = now
+
+    async def run(self, root_pid, stop):
+        loop = asyncio.get_running_loop()
+        last_search = None
+        try:
+            next_tick = loop.time()
+            while not stop.is_set():
+                if last_search is None or loop.time() - last_search >= self.host_refresh:
+                    self._find_hosts(root_pid)
+                    last_search = loop.time()
+                self.sample(time.time())
+                next_tick += self.interval
+                delay = next_tick - loop.time()
+                if delay < 0:
+                    next_tick = loop.time()
+                    delay = 0
+                try:
+                    await asyncio.wait_for(stop.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for entry in self._threads.values():
+                entry.close()
+            self._threads.clear()
+
+    def write(self, path, meta=None):
+        header = dict(meta or {}, interval=self.interval, hosts=sorted(self.seen_hosts),
+                      threads={str(tid): name for tid, name in self.names.items()})
+        with timeseries.TraceWriter(path, THREAD_COLUMNS, header) as trace:
+            for row in zip(self.times, self.tids, self.cpu):
+                trace.append(row)
+
+    def timeline(self):
+        return {"timestamp": self.times, "tid": self.tids, "cpu": self.cpu,
+                "meta": {"interval": self.interval, "threads": {str(t): n for t, n in self.names.items()}}}
+
+def summarize(timeline, start=None, end=None):
+    """
+    {'busy_threads', 'peak_busy', 'idle_gaps', 'idle_total', 'longest_gap', 'hot'} over
+    [start, end] (defaults: the whole timeline). `timeline` is ThreadProfiler.timeline()
+    or timeseries.load_trace() of a written file.
+    """
+    interval = timeline["meta"].get("interval", 0.01)
+    names = timeline["meta"].get("threads", {})
+    per_tick = {}
+    per_thread = {}
+    for t, tid, cpu in zip(timeline["timestamp"], timeline["tid"], timeline["cpu"]):
+        if (start is not None and t < start) or (end is not None and t > end):
+            continue
+        per_tick[t] = per_tick.get(t, 0.0) + cpu
+        per_thread[int(tid)] = per_thread.get(int(tid), 0.0) + cpu
+
+    if start is None or end is None:
+        if not per_tick:
+            return None
+        start = min(per_tick) if start is None else start
+        end = max(per_tick) if end is None else end
+    span = max(end - start, interval)
+
+    # Ticks without rows were fully idle, so idle time is what lies between busy ticks
+    busy_ticks = sorted(t for t, cpu in per_tick.items() if cpu / interval >= IDLE_BUSY_THREADS)
+    edges = [start] + busy_ticks + [end]
+    # A row at t reports CPU used during the interval before t; the window edges cover nothing
+    gaps = [b - a - (interval if i < len(busy_ticks) else 0.0) for i, (a, b) in enumerate(zip(edges, edges[1:]))]
+    gaps = [gap for gap in gaps if gap >= MIN_GAP]
+    peak_busy = max(per_tick.values(), default=0.0) / interval
+
+    total = sum(per_thread.values())
+    hot = sorted(per_thread.items(), key=lambda item: -item[1])[:HOT_THREADS]
+    return {
+        "busy_threads": total / span,
+        "peak_busy": peak_busy,
+        "idle_gaps": len(gaps),
+        "idle_total": sum(gaps),
+        "longest_gap": max(gaps, default=0.0),
+        "hot": [(names.get(str(tid), "?"), tid, cpu, cpu / total if total else 0.0) for tid, cpu in hot],
+    }
+
+def format_hot(hot):
+    return "; ".join(f"{name or '?'}#{tid} {share:.0%}" for name, tid, _, share in hot)
@@ -0,0 +1,206 @@
+"""Compact on-disk memory traces (.iatrace).
+
+A trace is a small self-describing columnar file:
+
+    b"IATRACE1" | u32 header length | JSON header {"columns": [[name, typecode], ...], "meta": {...}}
+    then chunks of: u32 rows | f64 first timestamp | f64 last timestamp | one packed array per column
+
+Samples are buffered in `array` columns and flushed a chunk at a time, so a writer
+uses a fixed amount of memory however long the run is. The per-chunk time range
+lets the loader skip whole chunks when slicing by time.
+"""
+import argparse
+import array
+import json
+import os
+import re
+import struct
+import sys
+
+from testtools import procmem
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAGIC = b"IATRACE1"
+_CHUNK_HEADER = struct.Struct("<Idd")
+_SWAP = sys.byteorder != "little"
+
+MEMORY_COLUMNS = [("timestamp", "d"), ("rss", "f"), ("pss", "f"), ("uss", "f")] + \
+    [(f"pss_{role}", "f") for role in procmem.ROLES]
+
+class TraceWriter:
+    def __init__(self, path, columns=MEMORY_COLUMNS, meta=None, chunk_rows=4096):
+        self.path = path
+        self.columns = list(columns)
+        self.chunk_rows = chunk_rows
+        self._buffers = [array.array(code) for _, code in self.columns]
+        self._file = open(path, "wb")
+        header = json.dumps({"columns": self.columns, "meta": meta or {}}).encode("utf-8")
+        self._file.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+    def append(self, row):
+        for buffer, value in zip(self._buffers, row):
+            buffer.append(value)
+        if len(self._buffers[0]) >= self.chunk_rows:
+            self.flush()
+
+    def append_sample(self, sample):
+        """Appends a procmem.MemorySample using the MEMORY_COLUMNS layout."""
+        self.append((sample.timestamp, sample.rss, sample.pss, sample.uss) +
+                    tuple(sample.roles.get(role, 0.0) for role in procmem.ROLES))
+
+    def flush(self):
+        rows = len(self._buffers[0])
+        if not rows:
+            return
+        times = self._buffers[0]
+        self._file.write(_CHUNK_HEADER.pack(rows, float(times[0]), float(times[-1])))
+        for buffer in self._buffers:
+            if _SWAP:
+                buffer.byteswap()
+            self._file.write(buffer.tobytes())
+        self._buffers = [array.array(code) for _, code in self.columns]
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_header(f):
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not an .iatrace file")
+    (length,) = struct.unpack("<I", f.read(4))
+    return json.loads(f.read(length).decode("utf-8"))
+
+def load_trace(path, columns=None, start=None, end=None, max_points=None):
+    """
+    Loads a trace as {"meta": ..., name: array} restricted to `columns` (first column
+    always included) and to timestamps within [start, end]. With `max_points`, series
+    are reduced by min/max bucketing, which keeps short spikes visible.
+    """
+    with open(path, "rb") as f:
+        header = read_header(f)
+        layout = [tuple(c) for c in header["columns"]]
+        names = [name for name, _ in layout]
+        wanted = [names[0]] + [c for c in (columns or names[1:]) if c != names[0]]
+        parts = {name: array.array(code) for name, code in layout if name in wanted}
+        sizes = [array.array(code).itemsize for _, code in layout]
+
+        while True:
+            head = f.read(_CHUNK_HEADER.size)
+            if len(head) < _CHUNK_HEADER.size:
+                break
+            rows, first, last = _CHUNK_HEADER.unpack(head)
+            chunk_bytes = rows * sum(sizes)
+            if (start is not None and last < start) or (end is not None and first > end):
+                f.seek(chunk_bytes, os.SEEK_CUR)
+                continue
+            for (name, code), size in zip(layout, sizes):
+                if name not in parts:
+                    f.seek(rows * size, os.SEEK_CUR)
+                    continue
+                column = array.array(code)
+                column.frombytes(f.read(rows * size))
+                if _SWAP:
+                    column.byteswap()
+                parts[name].extend(column)
+
+    trace = {name: (np.frombuffer(parts[name], dtype=parts[name].typecode) if np is not None else parts[name])
+             for name in wanted}
+    if start is not None or end is not None:
+        trace = _slice(trace, names[0], start, end)
+    if max_points:
+        trace = downsample(trace, names[0], max_points)
+    trace["meta"] = header.get("meta", {})
+    return trace
+
+def _slice(trace, time_column, start, end):
+    times = trace[time_column]
+    if np is not None:
+        mask = np.ones(len(times), dtype=bool)
+        if start is not None:
+            mask &= times >= start
+        if end is not None:
+            mask &= times <= end
+        return {name: values[mask] for name, values in trace.items()}
+    keep = [i for i, t in enumerate(times) if (start is None or t >= start) and (end is None or t <= end)]
+    return {name: array.array(values.typecode, (values[i] for i in keep)) for name, values in trace.items()}
+
+def downsample(trace, time_column, max_points):
+    """Keeps, per bucket, the rows holding each value column's min and max."""
+    count = len(trace[time_column])
+    if count <= max_points:
+        return trace
+
+    buckets = max(1, max_points // 2)
+    size = -(-count // buckets)
+    value_columns = [name for name in trace if name != time_column] or [time_column]
+
+    if np is not None:
+        starts = np.arange(buckets) * size
+        keep = []
+        for name in value_columns:
+            values = trace[name]
+            # Pad with the last value so every bucket has the same width, then argmin/argmax per row
+            padded = np.concatenate([values, np.repeat(values[-1:], buckets * size - count)]).reshape(buckets, size)
+            keep.append(starts + padded.argmin(axis=1))
+            keep.append(starts + padded.argmax(axis=1))
+        index = np.unique(np.minimum(np.concatenate(keep), count - 1))
+        return {name: values[index] for name, values in trace.items()}
+
+    keep = set()
+    for lo in range(0, count, size):
+        hi = min(lo + size, count)
+        for name in value_columns:
+            segment = trace[name]
+            keep.add(min(range(lo, hi), key=segment.__getitem__))
+            keep.add(max(range(lo, hi), key=segment.__getitem__))
+    index = sorted(keep)
+    return {name: array.array(values.typecode, (values[i] for i in index)) for name, values in trace.items()}
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+def trace_path(directory, label, run_number, suffix=".iatrace"):
+    name = _UNSAFE.sub("_", label)[-120:]
+    return os.path.join(directory, f"{name}__run{run_number}{suffix}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect .iatrace memory traces")
+    parser.add_argument('trace', help='Path to an .iatrace file')
+    parser.add_argument('--columns', type=str, default='', help='Comma-separated columns to print (default: all)')
+    parser.add_argument('--start', type=float, default=None, help='Seconds from the first sample to start at')
+    parser.add_argument('--end', type=float, default=None, help='Seconds from the first sample to stop at')
+    parser.add_argument('--max-points', type=int, default=0, help='Downsample to about this many rows')
+    args = parser.parse_args()
+
+    with open(args.trace, "rb") as f:
+        read_header(f)
+        head = f.read(_CHUNK_HEADER.size)
+    origin = _CHUNK_HEADER.unpack(head)[1] if len(head) == _CHUNK_HEADER.size else 0.0
+
+    columns = [c for c in args.columns.split(",") if c] or None
+    trace = load_trace(
+        args.trace, columns,
+        start=origin + args.start if args.start is not None else None,
+        end=origin + args.end if args.end is not None else None,
+        max_points=args.max_points or None,
+    )
+    meta = trace.pop("meta")
+    print(f"# {json.dumps(meta)}", file=sys.stderr)
+    names = list(trace)
+    print(",".join(names))
+    for i in range(len(trace[names[0]])):
+        print(",".join(f"{trace[names[0]][i] - origin:.4f}" if n == names[0] else f"{trace[n][i]:.2f}" for n in names))
+
+if __name__ == "__main__":
+    main()
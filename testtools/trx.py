@@ -0,0 +1,158 @@
+"""Streaming TRX (VSTest results) parser.
+
+TRX files list every UnitTestResult (including captured stdout) before the
+UnitTest definitions that carry the class name. Rather than loading the whole
+tree, the file is read twice with iterparse: a first pass keeps only the
+testId -> class name map of the definitions, and the second yields each result
+as it is read. Every processed element is dropped straight away, so memory is
+bounded by the largest single entry plus that map.
+
+A source that cannot be re-read (a pipe) gets a single pass. Its results then
+wait in a pending table until their definitions arrive, which for real TRX
+files means holding every result until the end.
+"""
+import os
+import re
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from datetime import datetime
+
+UNKNOWN_CONTAINER = "UnknownContainer"
+
+TrxResult = namedtuple("TrxResult", [
+    "test_id", "class_name", "test_name", "outcome",
+    "start", "end", "duration", "message", "stack_trace",
+])
+
+_FRACTION = re.compile(r"(\.\d{6})\d+")
+
+def parse_trx_time(value):
+    """Converts a TRX timestamp (7 fractional digits, UTC offset) to epoch seconds."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(_FRACTION.sub(r"\1", value)).timestamp()
+    except ValueError:
+        return None
+
+def parse_duration(value):
+    """Converts a TRX duration ('hh:mm:ss.fffffff') to seconds."""
+    if not value:
+        return None
+    try:
+        hours, minutes, seconds = value.split(":")
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except ValueError:
+        return None
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+def _error_info(result_elem):
+    message = ""
+    stack_trace = ""
+    for child in result_elem.iter():
+        name = _local(child.tag)
+        if name == "Message" and not message:
+            message = child.text or ""
+        elif name == "StackTrace" and not stack_trace:
+            stack_trace = child.text or ""
+    return message, stack_trace
+
+def _read_result(elem):
+    outcome = elem.get("outcome")
+    message = stack_trace = ""
+    if outcome != "Passed":
+        message, stack_trace = _error_info(elem)
+    return TrxResult(
+        test_id=elem.get("testId"),
+        class_name=None,
+        test_name=elem.get("testName"),
+        outcome=outcome,
+        start=parse_trx_time(elem.get("startTime")),
+        end=parse_trx_time(elem.get("endTime")),
+        duration=parse_duration(elem.get("duration")),
+        message=message,
+        stack_trace=stack_trace,
+    )
+
+def _read_class_name(elem):
+    for child in elem:
+        if _local(child.tag) == "TestMethod":
+            return child.get("className")
+    return "Unknown"
+
+def _entries(source):
+    """Yields (name, element) for each entry of the top-level sections (Results/*, TestDefinitions/*, ...)
+    and drops the element once the caller moves on; anything deeper is read as part of its entry."""
+    stack = []
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            continue
+        stack.pop()
+        if len(stack) != 2:
+            continue
+        yield _local(elem.tag), elem
+        stack[-1].remove(elem)
+        elem.clear()
+
+def read_class_names(source):
+    """{testId: class name} from the UnitTest definitions; whatever was read if the file is malformed."""
+    class_by_id = {}
+    try:
+        for name, elem in _entries(source):
+            if name == "UnitTest" and elem.get("id"):
+                class_by_id[elem.get("id")] = _read_class_name(elem)
+    except ET.ParseError:
+        pass
+    return class_by_id
+
+def _rereadable(source):
+    if isinstance(source, (str, bytes, os.PathLike)):
+        return True
+    try:
+        return source.seekable()
+    except (AttributeError, ValueError):
+        return False
+
+def iter_results(source):
+    """
+    Yields a TrxResult per UnitTestResult in `source` (path or file object) with
+    class_name resolved. Raises xml.etree.ElementTree.ParseError on malformed
+    input after yielding everything read up to that point.
+    """
+    class_by_id = {}
+    if _rereadable(source):
+        position = None if isinstance(source, (str, bytes, os.PathLike)) else source.tell()
+        class_by_id = read_class_names(source)
+        if position is not None:
+            source.seek(position)
+    pending = {}  # testId -> [TrxResult] seen before their UnitTest definition
+
+    try:
+        for name, elem in _entries(source):
+            if name == "UnitTestResult":
+                result = _read_result(elem)
+                class_name = class_by_id.get(result.test_id)
+                if class_name is None:
+                    pending.setdefault(result.test_id, []).append(result)
+                else:
+                    yield result._replace(class_name=class_name)
+            elif name == "UnitTest" and pending:
+                test_id = elem.get("id")
+                if test_id in pending:
+                    class_name = _read_class_name(elem)
+                    for result in pending.pop(test_id):
+                        yield result._replace(class_name=class_name)
+    except ET.ParseError:
+        yield from _unresolved(pending)
+        raise
+
+    yield from _unresolved(pending)
+
+def _unresolved(pending):
+    # Results whose definition never showed up (e.g. truncated file)
+    for results in pending.values():
+        for result in results:
+            yield result._replace(class_name=UNKNOWN_CONTAINER)
@@ -0,0 +1,59 @@
+"""Reads the test matrix out of MemoryAndAccessTests/TestVariants.cs.
+
+Each variant class there fixes a resolution, an item count and a batch size:
+
+    public class HighRes_Extreme : PerformanceTestBase
+    {
+        protected override int ExpectedTotalItems => 500;
+        protected override int BatchSize => 100;
+        protected override LargeSource CreateSource(string name) => new LargeSource(name, 1920, 1080, ExpectedTotalItems);
+    }
+
+Parsing the source keeps the runners in step with the matrix without a second copy of it.
+"""
+import os
+import re
+from collections import namedtuple
+
+VARIANTS_FILE = "ImageAutomate/ImageAutomate.Execution.MemoryAndAccessTests/TestVariants.cs"
+
+Variant = namedtuple("Variant", ["name", "resolution", "workload", "width", "height", "items", "batch_size"])
+
+_CLASS = re.compile(r"class\s+(\w+)\s*:\s*PerformanceTestBase\s*\{(.*?)\n\}", re.S)
+_ITEMS = re.compile(r"ExpectedTotalItems\s*=>\s*(\d+)")
+_BATCH = re.compile(r"BatchSize\s*=>\s*(\d+)")
+_SOURCE = re.compile(r"new\s+LargeSource\(\s*\w+\s*,\s*(\d+)\s*,\s*(\d+)")
+
+def parse_variants(text):
+    """{class name: Variant} for every PerformanceTestBase subclass with literal sizes."""
+    variants = {}
+    for name, body in _CLASS.findall(text):
+        items, batch, source = _ITEMS.search(body), _BATCH.search(body), _SOURCE.search(body)
+        if not (items and batch and source):
+            continue
+        resolution, _, workload = name.partition("_")
+        variants[name] = Variant(name, resolution, workload or name, int(source.group(1)), int(source.group(2)),
+                                 int(items.group(1)), int(batch.group(1)))
+    return variants
+
+def load_variants(path=None):
+    path = path or VARIANTS_FILE
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return parse_variants(f.read())
+
+def variant_for_test(test_name, variants):
+    """Looks up 'Namespace.HighRes_Extreme.Topology_Chain' by its class segment."""
+    parts = test_name.split(".")
+    return variants.get(parts[-2]) if len(parts) >= 2 else None
+
+def variant_for_class(class_name, variants):
+    return variants.get(class_name.rsplit(".", 1)[-1])
+
+def throughput(variant, seconds):
+    """(images/s, megapixels/s) for one pass over the variant's source images, or (None, None)."""
+    if variant is None or not seconds or seconds <= 0:
+        return None, None
+    images = variant.items / seconds
+    return images, images * variant.width * variant.height / 1e6